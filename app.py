@@ -1,22 +1,45 @@
 # Enhanced app.py with user upload features
 
-from flask import Flask, render_template, request, redirect, url_for, g, flash, jsonify
+import time
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, g, flash, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 import os
-import requests
 import markdown
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
 from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader
+from werkzeug.exceptions import RequestEntityTooLarge
 import uuid
 import sqlite3
 from datetime import datetime
-from bs4 import BeautifulSoup  
-import urllib.request
 import urllib.parse
+import hashlib
 import secrets
 import json
+import atexit
+import queue
+import asyncio
+from src.db import connect as connect_db, enable_wal, apply_migrations, WriteBehindWriter
+from src.ingest import iter_page_chunks, iter_section_chunks, ingest_chunks, format_stats
+from src.jobs import JobQueue, init_jobs_table
+from src.cache import SemanticCache
+from src.vector_store import get_vector_store
+from src.keyword_index import KeywordIndex, init_keyword_table
+from src.ledger import ChunkLedger, chunk_id, init_ledger_table, prune_document
+from src.crawler import Crawler, is_sitemap
+from src.html_extract import extract_html, page_text, charset
+from src.retrieval import hybrid_search
+from src.context_packer import CONTEXT_CANDIDATES, candidate_vectors, pack_context, format_pack_stats
+from src.llm_client import OpenRouterClient
+from src.pagination import keyset_page, page_size
+from src.events import StatsBroadcaster, read_counters
+from src.startup import LazyResource, Warmup
+from src.memory import ConversationMemory, MEMORY_SUMMARY_TOKENS
+from src.singleflight import SingleFlight, flight_key
+from src.embedding_service import EmbeddingService
+from src.chat_pipeline import ChatPipeline
+from src.metrics import Metrics, StageTimings
+from src.pdf_extract import MAX_UPLOAD_BYTES, UploadTooLarge, save_upload, iter_pdf_pages_parallel
 
 # Load environment variables
 load_dotenv()
@@ -29,16 +52,36 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "testbot")
 
-# Embedding model
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+WARMUP_ON_BOOT = os.getenv("WARMUP_ON_BOOT", "true").lower() not in ("0", "false", "no")
+
+# Embedding model (loaded on first use or by the boot warm-up)
+def load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+embedding_model = LazyResource("embedding_model", load_embedding_model)
+
+# Concurrent encode calls are batched into shared forward passes; ingestion
+# goes through embedding_service.bulk so it yields to chat queries
+embedding_service = EmbeddingService(embedding_model.get)
+
+# Semantic answer cache (invalidated whenever the knowledge base changes)
+answer_cache = SemanticCache()
+
+# Per-stage latency histograms and counters, exposed on /metrics
+metrics = Metrics()
 
 # SQLite config
 DATABASE = 'chat_logs.db'
 
+# Single poller fanning dashboard updates out to every open admin tab
+stats_broadcaster = StatsBroadcaster(DATABASE, extra_stats=lambda: {"cache": answer_cache.stats()})
+
 def get_db():
+    database.get()
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
+        db = g._database = connect_db(DATABASE)
     return db
 
 @app.teardown_appcontext
@@ -47,9 +90,85 @@ def close_connection(exception):
     if db is not None:
         db.close()
 
+# Schema migrations applied in order on top of the CREATE TABLE statements below
+SCHEMA_MIGRATIONS = [
+    # 1: indexes for the admin list APIs and hot-path lookups.
+    # sessions.session_id is already covered by its UNIQUE constraint.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_chat_logs_timestamp ON chat_logs (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_logs_session ON chat_logs (session_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions (last_activity)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status, last_activity)",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_base_added_at ON knowledge_base (added_at)",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_base_status ON knowledge_base (status, added_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_uploads_session_file ON user_uploads (session_id, filename)",
+        "CREATE INDEX IF NOT EXISTS idx_api_keys_status ON api_keys (status)"
+    ],
+    # 2: dashboard counters, seeded once and kept current by triggers on every write path
+    [
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        "INSERT OR REPLACE INTO counters VALUES ('total_chats', (SELECT COUNT(*) FROM chat_logs))",
+        "INSERT OR REPLACE INTO counters VALUES ('active_sessions', (SELECT COUNT(*) FROM sessions WHERE status = 'active'))",
+        "INSERT OR REPLACE INTO counters VALUES ('knowledge_items', (SELECT COUNT(*) FROM knowledge_base))",
+        "INSERT OR REPLACE INTO counters VALUES ('api_keys', (SELECT COUNT(*) FROM api_keys WHERE status = 'active'))",
+        """CREATE TRIGGER IF NOT EXISTS trg_chat_logs_insert AFTER INSERT ON chat_logs BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'total_chats'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_chat_logs_delete AFTER DELETE ON chat_logs BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'total_chats'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_sessions_insert AFTER INSERT ON sessions WHEN NEW.status = 'active' BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'active_sessions'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_sessions_delete AFTER DELETE ON sessions WHEN OLD.status = 'active' BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'active_sessions'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_sessions_status AFTER UPDATE OF status ON sessions
+            WHEN (OLD.status = 'active') != (NEW.status = 'active') BEGIN
+            UPDATE counters SET value = value + (CASE WHEN NEW.status = 'active' THEN 1 ELSE -1 END)
+            WHERE name = 'active_sessions'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_knowledge_base_insert AFTER INSERT ON knowledge_base BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'knowledge_items'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_knowledge_base_delete AFTER DELETE ON knowledge_base BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'knowledge_items'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_api_keys_insert AFTER INSERT ON api_keys WHEN NEW.status = 'active' BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'api_keys'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_api_keys_delete AFTER DELETE ON api_keys WHEN OLD.status = 'active' BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'api_keys'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_api_keys_status AFTER UPDATE OF status ON api_keys
+            WHEN (OLD.status = 'active') != (NEW.status = 'active') BEGIN
+            UPDATE counters SET value = value + (CASE WHEN NEW.status = 'active' THEN 1 ELSE -1 END)
+            WHERE name = 'api_keys'; END"""
+    ],
+    # 3: HTTP validators and content hash per crawled URL, for conditional refresh
+    [
+        "ALTER TABLE knowledge_base ADD COLUMN etag TEXT",
+        "ALTER TABLE knowledge_base ADD COLUMN last_modified TEXT",
+        "ALTER TABLE knowledge_base ADD COLUMN content_hash TEXT",
+        "ALTER TABLE knowledge_base ADD COLUMN fetched_at TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_base_url ON knowledge_base (type, content)"
+    ],
+    # 4: per-stage timings (JSON, milliseconds) and OpenRouter token usage per chat
+    [
+        "ALTER TABLE chat_logs ADD COLUMN timings TEXT",
+        "ALTER TABLE chat_logs ADD COLUMN prompt_tokens INTEGER",
+        "ALTER TABLE chat_logs ADD COLUMN completion_tokens INTEGER"
+    ],
+    # 5: job leases; the owner/lease_until columns are created by init_jobs_table
+    # so a JobQueue works on any database, not only one set up here
+    [],
+    # 6: keyset pagination orders by COALESCE(column, '') so rows with a NULL
+    # timestamp stay reachable; these keep those pages on an index
+    [
+        "CREATE INDEX IF NOT EXISTS idx_chat_logs_timestamp_key ON chat_logs (COALESCE(timestamp, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_chat_logs_session_key ON chat_logs (session_id, COALESCE(timestamp, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_last_activity_key ON sessions (COALESCE(last_activity, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_status_key ON sessions (status, COALESCE(last_activity, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_base_added_at_key ON knowledge_base (COALESCE(added_at, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_base_status_key ON knowledge_base (status, COALESCE(added_at, ''))"
+    ]
+]
+
 def init_db():
-    with app.app_context():
-        db = get_db()
+    db = connect_db(DATABASE)
+    try:
+        enable_wal(db)
         cursor = db.cursor()
         
         # Chat logs table
@@ -71,6 +190,11 @@ def init_db():
         except sqlite3.OperationalError:
             pass
         
+        try:
+            cursor.execute('ALTER TABLE chat_logs ADD COLUMN first_token_time REAL')
+        except sqlite3.OperationalError:
+            pass
+        
         # API keys table
         cursor.execute('''CREATE TABLE IF NOT EXISTS api_keys (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -113,40 +237,56 @@ def init_db():
             error_message TEXT
         )''')
         
+        # Background ingestion jobs
+        init_jobs_table(cursor)
+        
+        # Full-text index of chunk text for keyword retrieval
+        init_keyword_table(cursor)
+        
+        # Content-addressed chunk ids already embedded, per vector store
+        init_ledger_table(cursor)
+        
         db.commit()
+        
+        apply_migrations(db, SCHEMA_MIGRATIONS)
+    finally:
+        db.close()
+
+database = LazyResource("database", init_db)
 
-init_db()
+# Session and chat log writes are batched off the request path
+write_behind = WriteBehindWriter(
+    DATABASE, on_batch=lambda size, seconds: metrics.observe("sqlite.write_batch", seconds))
+atexit.register(write_behind.close)
 
-# Function to get active API key from database
-def get_active_api_key():
-    """Get an active API key from the database, fallback to env variable"""
+# Function to get active API keys from database
+def load_api_keys():
+    """Get all active API keys from the database (the client falls back to the env variable)"""
+    db = connect_db(DATABASE)
     try:
-        db = get_db()
         cursor = db.cursor()
-        cursor.execute("SELECT api_key FROM api_keys WHERE status = 'active' LIMIT 1")
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-    except Exception as e:
-        print(f"Error getting API key from database: {e}")
-    
-    return OPENROUTER_API_KEY
-
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
-try:
-    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
-        pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=384,
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-        print(f"Created new Pinecone index: {PINECONE_INDEX_NAME}")
-    else:
-        print(f"Using existing Pinecone index: {PINECONE_INDEX_NAME}")
-except Exception as e:
-    print(f"Error initializing Pinecone: {e}")
+        cursor.execute("SELECT api_key FROM api_keys WHERE status = 'active' ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        db.close()
+
+# Shared OpenRouter client (pooled connections, retries, key rotation)
+llm_client = OpenRouterClient(
+    load_keys=load_api_keys,
+    fallback_key=OPENROUTER_API_KEY,
+    extra_headers={
+        "HTTP-Referer": "https://github.com/keerthanab2201/IT-Helpdesk-Chatbot",
+        "X-Title": "IT Helpdesk Chatbot"
+    }
+)
+
+# Initialize vector store (Pinecone by default, VECTOR_STORE=local for the on-disk index)
+vector_store = LazyResource("vector_store", get_vector_store)
+keyword_index = KeywordIndex(DATABASE)
+
+def get_chunk_ledger():
+    store = vector_store.get()
+    return ChunkLedger(DATABASE, store.store_key) if store.store_key else None
 
 # Home route - Enhanced chat interface
 @app.route("/")
@@ -168,50 +308,91 @@ def admin():
 def get_stats():
     try:
         db = get_db()
-        cursor = db.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM chat_logs")
-        total_chats = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM sessions WHERE status = 'active'")
-        active_sessions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM knowledge_base")
-        knowledge_items = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM api_keys WHERE status = 'active'")
-        api_keys = cursor.fetchone()[0]
+        stats = read_counters(db.cursor())
         
         return jsonify({
-            "total_chats": total_chats,
-            "active_sessions": active_sessions,
-            "knowledge_items": knowledge_items,
-            "api_keys": api_keys
+            **stats,
+            "cache": answer_cache.stats(),
+            "memory": conversation_memory.stats(),
+            "embedding": embedding_service.stats(),
+            "chat_pipeline": chat_pipeline.stats(),
+            "coalescing": {flight.name: flight.stats() for flight in (embed_flight, retrieval_flight, chat_flight)}
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def list_filters(session_column=None, date_column=None, status_column=None):
+    """Build SQL filters from the session_id / since / until / status query params"""
+    filters, params = [], []
+    if session_column and request.args.get("session_id"):
+        filters.append(f"{session_column} = ?")
+        params.append(request.args["session_id"])
+    if date_column and request.args.get("since"):
+        filters.append(f"{date_column} >= ?")
+        params.append(request.args["since"])
+    if date_column and request.args.get("until"):
+        filters.append(f"{date_column} < ?")
+        params.append(request.args["until"])
+    if status_column and request.args.get("status"):
+        filters.append(f"{status_column} = ?")
+        params.append(request.args["status"])
+    return filters, params
+
+def paged_response(items, next_cursor):
+    """JSON list response; the next page's cursor travels in the X-Next-Cursor header"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+# Push stats and new activity to the admin dashboard (Server-Sent Events)
+@app.route("/api/stats/stream")
+def stream_stats():
+    subscriber = stats_broadcaster.subscribe()
+
+    def generate():
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=15)
+                    yield sse_event(data, event=event)
+                except queue.Empty:
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+        finally:
+            stats_broadcaster.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # API to get chat logs
 @app.route("/api/chat-logs")
 def get_chat_logs():
     try:
         db = get_db()
         cursor = db.cursor()
-        cursor.execute("""
-            SELECT timestamp, session_id, user_message, bot_response, response_time 
-            FROM chat_logs 
-            ORDER BY timestamp DESC 
-            LIMIT 50
-        """)
-        logs = cursor.fetchall()
+        filters, params = list_filters(session_column="session_id", date_column="timestamp")
+        logs, next_cursor = keyset_page(
+            cursor, "chat_logs",
+            ["timestamp", "session_id", "user_message", "bot_response", "response_time", "first_token_time",
+             "timings", "prompt_tokens", "completion_tokens"],
+            sort_column="timestamp", filters=filters, params=params,
+            after=request.args.get("cursor"), limit=page_size(request.args.get("limit"))
+        )
         
-        return jsonify([{
+        return paged_response([{
             "timestamp": log[0],
             "session_id": log[1],
             "user_message": log[2][:100] + "..." if len(log[2]) > 100 else log[2],
             "bot_response": log[3][:100] + "..." if len(log[3]) > 100 else log[3],
-            "response_time": f"{log[4]:.1f}s" if log[4] else "N/A"
-        } for log in logs])
+            "response_time": f"{log[4]:.1f}s" if log[4] else "N/A",
+            "first_token_time": f"{log[5]:.1f}s" if log[5] else "N/A",
+            "timings": json.loads(log[6]) if log[6] else None,
+            "prompt_tokens": log[7],
+            "completion_tokens": log[8]
+        } for log in logs], next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -221,20 +402,24 @@ def get_sessions():
     try:
         db = get_db()
         cursor = db.cursor()
-        cursor.execute("""
-            SELECT session_id, started_at, last_activity, message_count, status 
-            FROM sessions 
-            ORDER BY last_activity DESC
-        """)
-        sessions = cursor.fetchall()
+        filters, params = list_filters(session_column="session_id", date_column="last_activity",
+                                       status_column="status")
+        sessions, next_cursor = keyset_page(
+            cursor, "sessions",
+            ["session_id", "started_at", "last_activity", "message_count", "status"],
+            sort_column="last_activity", filters=filters, params=params,
+            after=request.args.get("cursor"), limit=page_size(request.args.get("limit"), default=100)
+        )
         
-        return jsonify([{
+        return paged_response([{
             "session_id": session[0],
             "started_at": session[1],
             "last_activity": session[2],
             "message_count": session[3],
             "status": session[4]
-        } for session in sessions])
+        } for session in sessions], next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -244,59 +429,107 @@ def get_knowledge_base():
     try:
         db = get_db()
         cursor = db.cursor()
-        cursor.execute("""
-            SELECT type, name, added_at, status, source 
-            FROM knowledge_base 
-            ORDER BY added_at DESC
-        """)
-        items = cursor.fetchall()
+        filters, params = list_filters(date_column="added_at", status_column="status")
+        if request.args.get("source"):
+            filters.append("source = ?")
+            params.append(request.args["source"])
+        items, next_cursor = keyset_page(
+            cursor, "knowledge_base",
+            ["type", "name", "added_at", "status", "source"],
+            sort_column="added_at", filters=filters, params=params,
+            after=request.args.get("cursor"), limit=page_size(request.args.get("limit"), default=100)
+        )
         
-        return jsonify([{
+        return paged_response([{
             "type": item[0],
             "name": item[1],
             "added_at": item[2],
             "status": item[3],
             "source": item[4] if len(item) > 4 else "admin"
-        } for item in items])
+        } for item in items], next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Enhanced chat response with session management
-@app.route("/get", methods=["POST"])
-def get_bot_response():
-    try:
-        start_time = datetime.now()
-        user_message = request.form.get("msg")
-        session_id = request.form.get("session_id", str(uuid.uuid4()))
-        
-        if not user_message.strip():
-            return "Please enter a valid message."
-
-        # Update or create session
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("SELECT session_id FROM sessions WHERE session_id = ?", (session_id,))
-        if cursor.fetchone():
-            cursor.execute("""
-                UPDATE sessions 
-                SET last_activity = ?, message_count = message_count + 1 
-                WHERE session_id = ?
-            """, (datetime.utcnow().isoformat(), session_id))
-        else:
-            cursor.execute("""
-                INSERT INTO sessions (session_id, started_at, last_activity, message_count, status) 
-                VALUES (?, ?, ?, 1, 'active')
-            """, (session_id, datetime.utcnow().isoformat(), datetime.utcnow().isoformat()))
-
-        # Get context from vector database
-        embedding = embedding_model.encode(user_message).tolist()
-        index = pc.Index(PINECONE_INDEX_NAME)
-        query_response = index.query(vector=embedding, top_k=3, include_metadata=True)
-
-        context = "\n".join([m.metadata.get("text", "") for m in query_response.matches])
-
-        # Enhanced system prompt
-        system_prompt = f"""You are an IT helpdesk assistant. You are helpful, knowledgeable, and professional.
+CHAT_MODEL = "qwen/qwen-2.5-72b-instruct"
+
+def touch_session(session_id):
+    """Update or create a chat session (applied by the write-behind writer)"""
+    now = datetime.utcnow().isoformat()
+    write_behind.submit("""
+        INSERT INTO sessions (session_id, started_at, last_activity, message_count, status) 
+        VALUES (?, ?, ?, 1, 'active')
+        ON CONFLICT(session_id) DO UPDATE SET 
+            last_activity = excluded.last_activity, message_count = message_count + 1
+    """, (session_id, now, now))
+
+def summarize_turns(previous_summary, turns):
+    """Fold older conversation turns into the rolling session summary"""
+    transcript = "\n".join(f"User: {user}\nAssistant: {bot}" for user, bot in turns)
+    payload = {
+        "model": CHAT_MODEL,
+        "messages": [
+            {"role": "system", "content": "Summarize this IT helpdesk conversation for the assistant's memory. "
+                                          "Keep the user's devices, systems, problems, steps already tried and "
+                                          "open questions. Be brief; use short bullet points."},
+            {"role": "user", "content": f"Summary so far:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        "temperature": 0.2,
+        "max_tokens": MEMORY_SUMMARY_TOKENS
+    }
+    with metrics.timer("memory.summarize"):
+        response = llm_client.chat(payload)
+    record_usage(response.get("usage"), "summary")
+    return response["choices"][0]["message"]["content"].strip()
+
+# Recent turns per session (LRU, reloaded from chat_logs), compacted into a summary past the token budget
+conversation_memory = ConversationMemory(DATABASE, summarize=summarize_turns)
+
+# Identical requests in flight at the same time (e.g. everyone asking about the
+# same outage) share one embedding, one retrieval and one LLM call
+embed_flight = SingleFlight("embed")
+retrieval_flight = SingleFlight("retrieval")
+chat_flight = SingleFlight("chat")
+
+def embed_query(user_message):
+    return embed_flight.do(flight_key(user_message),
+                           lambda: embedding_service.encode(user_message).tolist())
+
+def record_context(stats):
+    """Count what the context packer kept and dropped for one request"""
+    metrics.incr("context.requests")
+    for key in ("candidates", "chunks", "below_floor", "redundant", "over_budget", "tokens", "baseline_tokens"):
+        metrics.incr(f"context.{key}", stats[key])
+    # Counters only grow: savings and the (rarer) extra tokens from merged passages are kept apart
+    metrics.incr("context.saved_tokens", max(stats["saved_tokens"], 0))
+    metrics.incr("context.added_tokens", max(-stats["saved_tokens"], 0))
+    print(f"Context: {format_pack_stats(stats)}")
+
+def retrieve_context(embedding, user_message, timings=None):
+    """Get context from the vector and keyword indexes, packed into the prompt token budget"""
+    def search():
+        store = vector_store.get()
+        matches = hybrid_search(embedding, user_message, store, keyword_index, top_k=CONTEXT_CANDIDATES,
+                                timings=timings, include_values=True)
+        t0 = time.perf_counter()
+        vectors = candidate_vectors(matches, store)
+        context, stats = pack_context(embedding, matches, vectors)
+        if timings is not None:
+            timings.add("pack", time.perf_counter() - t0)
+        record_context(stats)
+        return context
+
+    return retrieval_flight.do(flight_key(user_message), search)
+
+def chat_key(user_message, context, summary, turns):
+    """Coalescing key: the normalized message plus everything else that shapes the answer"""
+    return flight_key(user_message, context, summary, turns)
+
+def build_chat_request(user_message, context, summary="", turns=()):
+    """Build the OpenRouter payload for a chat turn, including the session's memory"""
+    # Enhanced system prompt
+    system_prompt = f"""You are an IT helpdesk assistant. You are helpful, knowledgeable, and professional.
 
 Key capabilities:
 - Answer IT support questions
@@ -311,49 +544,591 @@ If users mention uploading documents or adding URLs, remind them they can use th
 Use this context if relevant to the user's question:
 {context}
 
-Be concise and polite but thorough. Use markdown formatting for better readability."""
+Be concise and polite but thorough. Use markdown formatting for better readability.
+Keep the earlier conversation in mind: short messages like "iOS" are follow-ups to the previous question."""
+
+    if summary:
+        system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
+
+    messages = [{"role": "system", "content": system_prompt}]
+    for previous_message, previous_response in turns:
+        messages.append({"role": "user", "content": previous_message})
+        messages.append({"role": "assistant", "content": previous_response})
+    messages.append({"role": "user", "content": user_message})
+
+    payload = {
+        "model": CHAT_MODEL,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 1000
+    }
+
+    return payload
+
+def record_usage(usage, kind="chat"):
+    """Count the tokens an OpenRouter response reports; returns (prompt, completion)"""
+    if not usage:
+        return None, None
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    metrics.incr(f"openrouter.{kind}.requests")
+    metrics.incr(f"openrouter.{kind}.prompt_tokens", prompt_tokens)
+    metrics.incr(f"openrouter.{kind}.completion_tokens", completion_tokens)
+    return prompt_tokens, completion_tokens
+
+def log_chat(session_id, user_message, content, timings, first_token_time=None, usage=(None, None)):
+    """Store chat in logs with its stage timings (applied by the write-behind writer)"""
+    with timings.stage("log"):
+        response_time = timings.elapsed()
+        prompt_tokens, completion_tokens = usage
+        write_behind.submit("""
+            INSERT INTO chat_logs (session_id, timestamp, user_message, bot_response, response_time, first_token_time,
+                                   timings, prompt_tokens, completion_tokens)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (session_id, datetime.utcnow().isoformat(), user_message, content, response_time, first_token_time,
+              json.dumps(timings.as_dict()), prompt_tokens, completion_tokens))
+    metrics.record("chat", timings)
+    return response_time
+
+def sse_event(data, event=None):
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+# Chat turns run as coroutines on the chat pipeline's event loop
+chat_pipeline = ChatPipeline()
+
+async def prepare_turn(session_id, user_message, timings):
+    """Session bookkeeping, memory, embedding and retrieval for one turn, overlapped"""
+    call = chat_pipeline.call
+    touch = asyncio.ensure_future(timings.timed("session", call(touch_session, session_id)))
+    memory = asyncio.ensure_future(timings.timed("memory", call(conversation_memory.context, session_id)))
+    # Most messages are their own retrieval query, so embed while the memory loads
+    speculative = asyncio.ensure_future(timings.timed("embed", call(embed_query, user_message)))
+
+    summary, turns = await memory
+    query = conversation_memory.retrieval_query(user_message, turns)
+    cacheable = query == user_message
+    if cacheable:
+        embedding = await speculative
+    else:
+        # Follow-ups are retrieved together with the previous question and bypass
+        # the answer cache, since their answer depends on the conversation
+        _, embedding = await asyncio.gather(speculative, timings.timed("embed", call(embed_query, query)))
+
+    content = None
+    if cacheable:
+        with timings.stage("cache"):
+            content = answer_cache.get(embedding)
+    context = None
+    if content is None:
+        context = await timings.timed("retrieval", call(retrieve_context, embedding, query, timings))
+    else:
+        metrics.incr("chat.cache_hits")
+    await touch
 
-        payload = {
-            "model": "qwen/qwen-2.5-72b-instruct",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
+    return {"summary": summary, "turns": turns, "query": query, "cacheable": cacheable,
+            "embedding": embedding, "content": content, "context": context}
 
-        headers = {
-            "Authorization": f"Bearer {get_active_api_key()}",
-            "HTTP-Referer": "https://github.com/keerthanab2201/IT-Helpdesk-Chatbot",
-            "X-Title": "IT Helpdesk Chatbot",
-            "Content-Type": "application/json"
-        }
+async def answer_turn(session_id, user_message, timings):
+    turn = await prepare_turn(session_id, user_message, timings)
+    content = turn["content"]
+    usage = (None, None)
+
+    if content is None:
+        payload = build_chat_request(user_message, turn["context"], turn["summary"], turn["turns"])
+
+        async def complete():
+            nonlocal usage
+            # Only the leader of a coalesced call reaches OpenRouter, so only it reports tokens
+            # and caches the answer
+            response = await llm_client.achat(payload)
+            usage = record_usage(response.get("usage"))
+            answer = response["choices"][0]["message"]["content"]
+            if turn["cacheable"]:
+                answer_cache.put(turn["embedding"], user_message, answer)
+            return answer
 
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
-        response.raise_for_status()
-        content = response.json()["choices"][0]["message"]["content"]
+        content = await timings.timed("llm", chat_flight.ado(
+            chat_key(user_message, turn["context"], turn["summary"], turn["turns"]), complete))
+
+    conversation_memory.append(session_id, user_message, content)
+
+    with timings.stage("markdown"):
         html_response = markdown.markdown(content)
 
-        # Calculate response time
-        response_time = (datetime.now() - start_time).total_seconds()
+    log_chat(session_id, user_message, content, timings, usage=usage)
 
-        # Store chat in logs
-        cursor.execute("""
-            INSERT INTO chat_logs (session_id, timestamp, user_message, bot_response, response_time) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (session_id, datetime.utcnow().isoformat(), user_message, content, response_time))
-        db.commit()
+    return html_response
+
+async def stream_turn(session_id, user_message, timings):
+    """Async generator of SSE frames for one streamed turn"""
+    try:
+        turn = await prepare_turn(session_id, user_message, timings)
+        content = turn["content"]
+        usage = (None, None)
 
-        return html_response
+        if content is not None:
+            first_token_time = timings.elapsed()
+            yield sse_event({"token": content})
+        else:
+            key = chat_key(user_message, turn["context"], turn["summary"], turn["turns"])
+            flight, leader = chat_flight.begin(key)
+
+            if not leader:
+                # An identical request is already streaming; send its full answer at once
+                content = await timings.timed("llm", asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(flight)), chat_flight.timeout))
+                first_token_time = timings.elapsed()
+                yield sse_event({"token": content})
+            else:
+                error = None
+                llm_started = timings.elapsed()
+                try:
+                    payload = build_chat_request(user_message, turn["context"], turn["summary"], turn["turns"])
+                    # Ask OpenRouter to report token usage in the final chunk
+                    payload["usage"] = {"include": True}
+
+                    parts = []
+                    first_token_time = None
+                    async for line in llm_client.astream_lines(payload):
+                        # OpenRouter sends "data: {...}" lines plus ": keep-alive" comments
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            usage = record_usage(chunk["usage"])
+                        choices = chunk.get("choices") or [{}]
+                        token = (choices[0].get("delta") or {}).get("content")
+                        if not token:
+                            continue
+                        if first_token_time is None:
+                            first_token_time = timings.elapsed()
+                            timings.add("llm_first_token", first_token_time - llm_started)
+                        parts.append(token)
+                        yield sse_event({"token": token})
+
+                    content = "".join(parts)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    # Also runs when the client disconnects mid-stream, so followers never hang
+                    if content is None:
+                        error = error or RuntimeError("Streaming request was cancelled")
+                    chat_flight.end(key, flight, result=content, error=error)
+                    timings.add("llm", timings.elapsed() - llm_started)
+
+                if content and turn["cacheable"]:
+                    answer_cache.put(turn["embedding"], user_message, content)
+
+        conversation_memory.append(session_id, user_message, content)
+
+        with timings.stage("markdown"):
+            html_response = markdown.markdown(content)
+
+        response_time = log_chat(session_id, user_message, content, timings, first_token_time, usage)
+
+        yield sse_event({
+            "html": html_response,
+            "response_time": response_time,
+            "first_token_time": first_token_time
+        }, event="done")
+
+    except Exception as e:
+        print("Chat stream error:", e)
+        metrics.incr("chat.errors")
+        yield sse_event({"error": "Sorry, I encountered an error. Please try again."}, event="error")
+
+# Enhanced chat response with session management
+@app.route("/get", methods=["POST"])
+def get_bot_response():
+    try:
+        timings = StageTimings()
+        user_message = request.form.get("msg")
+        session_id = request.form.get("session_id", str(uuid.uuid4()))
+        
+        if not user_message.strip():
+            return "Please enter a valid message."
+
+        metrics.incr("chat.requests")
+        return chat_pipeline.run(answer_turn(session_id, user_message, timings))
 
     except Exception as e:
         print("Chat error:", e)
+        metrics.incr("chat.errors")
         return "Sorry, I encountered an error. Please try again."
 
+# Streaming chat response (Server-Sent Events)
+@app.route("/get/stream", methods=["POST"])
+def get_bot_response_stream():
+    timings = StageTimings()
+    user_message = request.form.get("msg") or ""
+    session_id = request.form.get("session_id", str(uuid.uuid4()))
+
+    if not user_message.strip():
+        return Response(sse_event({"error": "Please enter a valid message."}, event="error"),
+                        mimetype="text/event-stream")
+
+    metrics.incr("chat.requests")
+    metrics.incr("chat.streams")
+    return Response(stream_with_context(chat_pipeline.iterate(stream_turn(session_id, user_message, timings))),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Background ingestion job handlers
+def record_ingest(stats):
+    """Fold an ingest_chunks run into the ingestion histograms and counters"""
+    metrics.observe("ingest.embed", stats["embed_time"])
+    metrics.observe("ingest.upsert", stats["upsert_time"])
+    metrics.observe("ingest.document", stats["total_time"])
+    metrics.incr("ingest.chunks", stats["chunks"])
+    metrics.incr("ingest.skipped", stats["skipped"])
+    metrics.incr("ingest.errors", stats["errors"])
+
+def timed_job(kind, handler):
+    """Wrap a job handler so each run lands in the ``job.<kind>`` histogram"""
+    def run(payload, progress):
+        try:
+            with metrics.timer(f"job.{kind}"):
+                return handler(payload, progress)
+        except Exception:
+            metrics.incr(f"job.{kind}.failed")
+            raise
+    return run
+
+def pdf_doc_key(source, filename, session_id=None):
+    """Chunk ledger key of an uploaded PDF"""
+    if source == "admin":
+        return f"pdf:{filename}"
+    return f"upload:{session_id or 'anonymous'}:{filename}"
+
+def process_pdf_job(payload, progress):
+    """Extract, chunk and index a saved PDF"""
+    filepath = payload["filepath"]
+    filename = payload["filename"]
+    source = payload["source"]
+
+    try:
+        # Pages are extracted in parallel and stream in order into chunking and embedding
+        pages = iter_pdf_pages_parallel(filepath, on_page=lambda n: progress.update(pages_extracted=n))
+        chunks = iter_page_chunks(pages)
+
+        # Ids hash the document key and chunk text, so re-uploads skip unchanged chunks.
+        # Admin uploads are saved into data/ and share the directory indexer's key for
+        # that file; chat uploads are keyed per session so same-named files never collide
+        doc_key = pdf_doc_key(source, filename, payload.get("session_id"))
+        current = set()
+
+        def make_id(chunk):
+            chunk_key = chunk_id(doc_key, chunk)
+            current.add(chunk_key)
+            return chunk_key
+
+        ledger = get_chunk_ledger()
+        stats = ingest_chunks(
+            chunks, vector_store.get(), embedding_service.bulk,
+            make_id=make_id,
+            make_metadata=lambda chunk: {"text": chunk, "source": source, "filename": filename},
+            on_progress=lambda s: progress.update(chunks_embedded=s["chunks"], chunks_upserted=s["vectors_upserted"]),
+            keyword_index=keyword_index,
+            ledger=ledger,
+            doc_key=doc_key
+        )
+        if stats["chunks"] + stats["skipped"] == 0:
+            raise Exception("No readable text found in PDF")
+        # A new version of the same document replaces the old one; keep its vectors if anything failed
+        stats["removed"] = 0
+        if not stats["errors"] and ledger is not None:
+            stats["removed"] = prune_document(ledger, vector_store.get(), keyword_index, doc_key, current)
+        progress.update(chunks_total=stats["chunks"] + stats["skipped"])
+        record_ingest(stats)
+
+        print(f"Ingested '{filename}': {format_stats(stats)}")
+        answer_cache.invalidate()
+        return stats
+
+    finally:
+        # Clean up temporary file
+        if payload.get("remove_file") and os.path.exists(filepath):
+            os.remove(filepath)
+
+# Web pages: fetched concurrently with per-host limits, timeouts and a size cap,
+# and re-fetched conditionally (ETag / Last-Modified) by the scheduled refresh
+crawler = Crawler()
+CRAWL_REFRESH_INTERVAL = int(os.getenv("CRAWL_REFRESH_INTERVAL", "86400"))
+
+def update_knowledge_item(kb_id, **fields):
+    if not kb_id or not fields:
+        return
+    db = connect_db(DATABASE)
+    try:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        db.execute(f"UPDATE knowledge_base SET {columns} WHERE id = ?", (*fields.values(), kb_id))
+        db.commit()
+    finally:
+        db.close()
+
+def index_page(item, result, on_progress=None):
+    """Index a fetched page for its knowledge_base row.
+
+    Returns None when the page is unchanged (304, or the same extracted
+    text), otherwise the ingest stats. Only chunks that changed are embedded;
+    chunks the page no longer has are deleted.
+    """
+    now = datetime.utcnow().isoformat()
+    if result.not_modified:
+        update_knowledge_item(item["kb_id"], fetched_at=now)
+        return None
+
+    # Main content only (no nav/footer/cookie banners), split into sections at headings
+    with metrics.timer("ingest.extract_html"):
+        page = extract_html(result.body, encoding=charset(result.content_type))
+    text = page_text(page)
+    if not text.strip():
+        raise Exception("No content found at URL")
+
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    fields = {"etag": result.etag, "last_modified": result.last_modified,
+              "content_hash": content_hash, "fetched_at": now}
+    if content_hash == item.get("content_hash"):
+        update_knowledge_item(item["kb_id"], **fields)
+        return None
+
+    url, title, source = item["url"], item["title"], item["source"]
+    if source == "user_url":
+        make_metadata = lambda chunk: {"text": chunk, "source": source, "url": url, "title": title}
+    else:
+        make_metadata = lambda chunk: {"text": chunk, "source": source, "url": url}
+
+    doc_key = f"url:{url}"
+    current = set()
+
+    def make_id(chunk):
+        chunk_key = chunk_id(doc_key, chunk)
+        current.add(chunk_key)
+        return chunk_key
+
+    ledger = get_chunk_ledger()
+    stats = ingest_chunks(
+        iter_section_chunks(page.sections), vector_store.get(), embedding_service.bulk,
+        make_id=make_id,
+        make_metadata=make_metadata,
+        on_progress=on_progress,
+        keyword_index=keyword_index,
+        ledger=ledger,
+        doc_key=doc_key
+    )
+    if stats["errors"]:
+        # Keep the old chunks and force a full re-fetch next time
+        fields.update(etag=None, last_modified=None, content_hash=None)
+    elif ledger is not None:
+        stats["removed"] = prune_document(ledger, vector_store.get(), keyword_index, doc_key, current)
+    update_knowledge_item(item["kb_id"], **fields)
+    record_ingest(stats)
+    print(f"Ingested '{url}': {format_stats(stats)}")
+    return stats
+
+def crawl_items(items, progress, conditional=True):
+    """Fetch knowledge_base URL items concurrently and index each as it arrives"""
+    summary = {"pages": len(items), "changed": 0, "unchanged": 0, "failed": 0, "chunks": 0, "skipped": 0}
+    by_url = {item["url"]: item for item in items}
+    fetch_items = [(item["url"], item.get("etag") if conditional else None,
+                    item.get("last_modified") if conditional else None) for item in items]
+
+    done = 0
+    for (url, _, _), result, error in crawler.fetch_many(fetch_items):
+        item = by_url[url]
+        try:
+            if error is not None:
+                raise error
+            stats = index_page(item, result)
+            if stats is None:
+                summary["unchanged"] += 1
+            else:
+                summary["changed"] += 1
+                summary["chunks"] += stats["chunks"]
+                summary["skipped"] += stats["skipped"]
+            update_knowledge_item(item["kb_id"], status="processed")
+        except Exception as e:
+            print(f"Error crawling {url}: {e}")
+            summary["failed"] += 1
+            update_knowledge_item(item["kb_id"], status="failed")
+        done += 1
+        progress.update(pages_extracted=done, chunks_embedded=summary["chunks"])
+
+    if summary["changed"]:
+        answer_cache.invalidate()
+    return summary
+
+def add_sitemap_pages(page_urls, source):
+    """Create knowledge_base rows for sitemap pages not already known; returns the new items"""
+    items = []
+    db = connect_db(DATABASE)
+    try:
+        for page_url in page_urls:
+            if db.execute("SELECT 1 FROM knowledge_base WHERE type = 'URL' AND content = ?", (page_url,)).fetchone():
+                continue
+            parsed = urllib.parse.urlparse(page_url)
+            title = (parsed.netloc + parsed.path).rstrip("/")
+            cursor = db.execute("""
+                INSERT INTO knowledge_base (type, name, content, added_at, status, source)
+                VALUES ('URL', ?, ?, ?, 'queued', ?)
+            """, (title, page_url, datetime.utcnow().isoformat(), "user" if source == "user_url" else "admin"))
+            items.append({"kb_id": cursor.lastrowid, "url": page_url, "title": title, "source": source})
+        db.commit()
+    finally:
+        db.close()
+    return items
+
+def process_url_job(payload, progress):
+    """Fetch, chunk and index a web page, or every page listed by a sitemap"""
+    url = payload["url"]
+    item = {"kb_id": payload.get("kb_id"), "url": url, "title": payload["title"], "source": payload["source"]}
+
+    with metrics.timer("ingest.fetch"):
+        result = crawler.fetch(url)
+
+    if is_sitemap(result):
+        update_knowledge_item(item["kb_id"], type="Sitemap", fetched_at=datetime.utcnow().isoformat())
+        page_urls = crawler.expand_sitemap(url, result)
+        items = add_sitemap_pages(page_urls, payload["source"])
+        summary = crawl_items(items, progress, conditional=False)
+        print(f"Crawled sitemap '{url}': {summary}")
+        return summary
+
+    progress.update(pages_extracted=1)
+    stats = index_page(item, result, on_progress=lambda s: progress.update(
+        chunks_total=s["chunks"] + s["skipped"], chunks_embedded=s["chunks"], chunks_upserted=s["vectors_upserted"]))
+    if stats is not None:
+        answer_cache.invalidate()
+    return stats
+
+def process_refresh_job(payload, progress):
+    """Re-crawl every indexed URL, re-embedding only pages whose content changed"""
+    db = connect_db(DATABASE)
+    try:
+        rows = db.execute("""
+            SELECT id, type, name, content, source, etag, last_modified, content_hash
+            FROM knowledge_base
+            WHERE type IN ('URL', 'Sitemap') AND status IN ('processed', 'failed')
+        """).fetchall()
+    finally:
+        db.close()
+
+    items = []
+    for kb_id, kind, name, url, source, etag, last_modified, content_hash in rows:
+        source = "user_url" if source == "user" else "admin"
+        if kind == "Sitemap":
+            # Pick up pages added to the sitemap since the last crawl
+            try:
+                items += add_sitemap_pages(crawler.expand_sitemap(url), source)
+            except Exception as e:
+                print(f"Error refreshing sitemap {url}: {e}")
+            continue
+        items.append({"kb_id": kb_id, "url": url, "title": name, "source": source, "etag": etag,
+                      "last_modified": last_modified, "content_hash": content_hash})
+
+    summary = crawl_items(items, progress)
+    print(f"Refreshed {summary['pages']} URLs: {summary['changed']} changed, "
+          f"{summary['unchanged']} unchanged, {summary['failed']} failed")
+    return summary
+
+job_queue = JobQueue(DATABASE)
+job_queue.register("pdf", timed_job("pdf", process_pdf_job))
+job_queue.register("url", timed_job("url", process_url_job))
+job_queue.register("refresh", timed_job("refresh", process_refresh_job))
+if CRAWL_REFRESH_INTERVAL > 0:
+    job_queue.schedule("refresh", CRAWL_REFRESH_INTERVAL)
+
+# Reject oversized uploads from the declared Content-Length before reading the body
+# (multipart framing adds a little on top of the file itself)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024
+
+@app.errorhandler(413)
+def request_too_large(error):
+    message = f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
+    if request.path == "/user_upload":
+        return jsonify({"error": message}), 413
+    return message, 413
+
+def start_background_services():
+    database.get()
+    job_queue.start()
+
+background_services = LazyResource("background_services", start_background_services)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def ensure_initialized():
+    """Create the schema and start the job workers before the first real request"""
+    if request.endpoint in ("healthz", "readyz", "metrics_endpoint", "static"):
+        return
+    background_services.get()
+
+@app.after_request
+def record_request_time(response):
+    # Handler time per route; streamed bodies are timed by their own stages
+    started = getattr(g, "request_started", None)
+    if started is not None and request.endpoint not in (None, "static"):
+        metrics.observe(f"http.{request.endpoint}", time.perf_counter() - started)
+        if response.status_code >= 500:
+            metrics.incr(f"http.{request.endpoint}.errors")
+    return response
+
+# Warm-up: build everything the first chat needs, then run one dummy encode
+warmup = Warmup(BOOT_STARTED)
+warmup.add_step("database", database.get)
+warmup.add_step("background_services", background_services.get)
+warmup.add_step("embedding_model", embedding_model.get)
+warmup.add_step("warmup_encode", lambda: embedding_service.encode("warm up"))
+warmup.add_step("vector_store", vector_store.get)
+
+# Liveness: the process is up and serving requests
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok", "uptime": round(time.perf_counter() - BOOT_STARTED, 1)})
+
+# Readiness: the model, vector store and database are initialized
+@app.route("/readyz")
+def readyz():
+    components = {
+        "database": database.status(),
+        "embedding_model": embedding_model.status(),
+        "vector_store": vector_store.status()
+    }
+    ready = all(component["ready"] for component in components.values())
+    body = {"ready": ready, "components": components, "warmup": warmup.status()}
+    return jsonify(body), 200 if ready else 503
+
+# Latency percentiles per stage, counters and token usage (?format=prometheus for scrapers)
+@app.route("/metrics")
+def metrics_endpoint():
+    if request.args.get("format") == "prometheus":
+        return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+    return jsonify({
+        **metrics.snapshot(),
+        "components": {
+            "cache": answer_cache.stats(),
+            "embedding": embedding_service.stats(),
+            "chat_pipeline": chat_pipeline.stats(),
+            "write_behind": write_behind.stats(),
+            "llm_keys": llm_client.stats(),
+            "coalescing": {flight.name: flight.stats() for flight in (embed_flight, retrieval_flight, chat_flight)}
+        }
+    })
+
 # User document upload endpoint
 @app.route("/user_upload", methods=["POST"])
 def user_upload_document():
+    if request.content_length and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+        return request_too_large(None)
     try:
         session_id = request.form.get("session_id", str(uuid.uuid4()))
         
@@ -367,95 +1142,53 @@ def user_upload_document():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({"error": "Only PDF files are supported"}), 400
 
-        # File size check (10MB limit)
-        if len(file.read()) > 10 * 1024 * 1024:
-            return jsonify({"error": "File too large. Maximum size is 10MB"}), 400
-        
-        file.seek(0)  # Reset file pointer after reading for size check
-
         filename = secure_filename(file.filename)
         timestamp = datetime.utcnow().isoformat()
         
-        # Save file temporarily
+        # Stream the file to disk for the ingestion job, enforcing the size limit as bytes arrive
         upload_dir = "user_uploads"
         os.makedirs(upload_dir, exist_ok=True)
         filepath = os.path.join(upload_dir, f"{session_id}_{timestamp}_{filename}")
-        file.save(filepath)
+        try:
+            file_size = save_upload(file, filepath)
+        except UploadTooLarge as e:
+            return jsonify({"error": str(e)}), 400
 
         # Record upload in database
         db = get_db()
         cursor = db.cursor()
         cursor.execute("""
             INSERT INTO user_uploads (session_id, filename, file_type, file_size, uploaded_at, status) 
-            VALUES (?, ?, 'PDF', ?, ?, 'processing')
-        """, (session_id, filename, os.path.getsize(filepath), timestamp))
+            VALUES (?, ?, 'PDF', ?, ?, 'queued')
+        """, (session_id, filename, file_size, timestamp))
+        user_upload_id = cursor.lastrowid
         
         cursor.execute("""
             INSERT INTO knowledge_base (type, name, content, added_at, status, source) 
-            VALUES ('PDF', ?, ?, ?, 'processing', 'user')
+            VALUES ('PDF', ?, ?, ?, 'queued', 'user')
         """, (filename, filepath, timestamp))
         
         upload_id = cursor.lastrowid
         db.commit()
 
-        # Process PDF in background (simplified for demo)
-        try:
-            reader = PdfReader(filepath)
-            full_text = ""
-
-            for page in reader.pages:
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        full_text += page_text + "\n"
-                except Exception as e:
-                    print(f"Error reading page: {e}")
-
-            if not full_text.strip():
-                raise Exception("No readable text found in PDF")
-
-            # Chunk and index
-            chunks = [full_text[i:i+500] for i in range(0, len(full_text), 500)]
-            index = pc.Index(PINECONE_INDEX_NAME)
-
-            for chunk in chunks:
-                try:
-                    embedding = embedding_model.encode(chunk).tolist()
-                    index.upsert(vectors=[{
-                        "id": f"user_{session_id}_{str(uuid.uuid4())}",
-                        "values": embedding,
-                        "metadata": {"text": chunk, "source": "user_upload", "filename": filename}
-                    }])
-                except Exception as e:
-                    print(f"Error embedding chunk: {e}")
-
-            # Update status to processed
-            cursor.execute("UPDATE knowledge_base SET status = 'processed' WHERE id = ?", (upload_id,))
-            cursor.execute("UPDATE user_uploads SET status = 'processed' WHERE session_id = ? AND filename = ?", (session_id, filename))
-            db.commit()
-
-            # Clean up temporary file
-            os.remove(filepath)
-
-            return jsonify({
-                "success": True, 
-                "message": f"Document '{filename}' processed successfully!",
-                "filename": filename
-            })
-
-        except Exception as processing_error:
-            # Update status to failed
-            cursor.execute("UPDATE knowledge_base SET status = 'failed' WHERE id = ?", (upload_id,))
-            cursor.execute("UPDATE user_uploads SET status = 'failed', error_message = ? WHERE session_id = ? AND filename = ?", 
-                         (str(processing_error), session_id, filename))
-            db.commit()
-            
-            # Clean up temporary file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            
-            return jsonify({"error": f"Error processing document: {str(processing_error)}"}), 500
+        job_id = job_queue.enqueue("pdf", {
+            "filepath": filepath,
+            "filename": filename,
+            "source": "user_upload",
+            "session_id": session_id,
+            "remove_file": True
+        }, kb_id=upload_id, upload_id=user_upload_id)
 
+        return jsonify({
+            "success": True, 
+            "message": f"Document '{filename}' queued for processing.",
+            "filename": filename,
+            "job_id": job_id,
+            "status": "queued"
+        }), 202
+
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
     except Exception as e:
         print(f"Upload error: {e}")
         return jsonify({"error": "Upload failed. Please try again."}), 500
@@ -488,60 +1221,27 @@ def user_add_url():
         cursor = db.cursor()
         cursor.execute("""
             INSERT INTO knowledge_base (type, name, content, added_at, status, source) 
-            VALUES ('URL', ?, ?, ?, 'processing', 'user')
+            VALUES ('URL', ?, ?, ?, 'queued', 'user')
         """, (title, url, timestamp))
         
         url_id = cursor.lastrowid
         db.commit()
 
-        try:
-            # Fetch and process URL content
-            with urllib.request.urlopen(url) as response:
-                html_content = response.read()
-
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            text = soup.get_text(separator='\n', strip=True)
-            
-            if not text.strip():
-                raise Exception("No content found at URL")
-
-            # Chunk and index
-            chunks = [text[i:i + 500] for i in range(0, len(text), 500)]
-            index = pc.Index(PINECONE_INDEX_NAME)
-            
-            for chunk in chunks:
-                try:
-                    embedding = embedding_model.encode(chunk).tolist()
-                    if embedding:
-                        index.upsert(vectors=[{
-                            "id": f"user_url_{session_id}_{str(uuid.uuid4())}",
-                            "values": embedding,
-                            "metadata": {"text": chunk, "source": "user_url", "url": url, "title": title}
-                        }])
-                except Exception as e:
-                    print(f"Error embedding chunk: {e}")
+        job_id = job_queue.enqueue("url", {
+            "url": url,
+            "title": title,
+            "source": "user_url",
+            "session_id": session_id,
+            "kb_id": url_id
+        }, kb_id=url_id)
 
-            # Update status to processed
-            cursor.execute("UPDATE knowledge_base SET status = 'processed' WHERE id = ?", (url_id,))
-            db.commit()
-
-            return jsonify({
-                "success": True,
-                "message": f"Content from {title} added successfully!",
-                "title": title
-            })
-
-        except Exception as processing_error:
-            # Update status to failed
-            cursor.execute("UPDATE knowledge_base SET status = 'failed' WHERE id = ?", (url_id,))
-            db.commit()
-            
-            return jsonify({"error": f"Error processing URL: {str(processing_error)}"}), 500
+        return jsonify({
+            "success": True,
+            "message": f"Content from {title} queued for processing.",
+            "title": title,
+            "job_id": job_id,
+            "status": "queued"
+        }), 202
 
     except Exception as e:
         print(f"URL addition error: {e}")
@@ -560,6 +1260,8 @@ def add_url():
 
 def admin_upload_document():
     """Original admin upload functionality"""
+    if request.content_length and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+        return request_too_large(None)
     if 'pdf_file' not in request.files:
         return "No file part in the request.", 400
 
@@ -572,51 +1274,26 @@ def admin_upload_document():
         filepath = os.path.join("data", filename)
         
         os.makedirs("data", exist_ok=True)
-        file.save(filepath)
+        try:
+            save_upload(file, filepath)
+        except UploadTooLarge as e:
+            return str(e), 400
 
         try:
             db = get_db()
             cursor = db.cursor()
             cursor.execute("""
                 INSERT INTO knowledge_base (type, name, content, added_at, status, source) 
-                VALUES ('PDF', ?, ?, ?, 'processing', 'admin')
+                VALUES ('PDF', ?, ?, ?, 'queued', 'admin')
             """, (filename, filepath, datetime.utcnow().isoformat()))
+            kb_id = cursor.lastrowid
             db.commit()
 
-            # Process PDF (same logic as before)
-            reader = PdfReader(filepath)
-            full_text = ""
-
-            for page_num, page in enumerate(reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        full_text += page_text + "\n"
-                except Exception as e:
-                    print(f"Error reading page {page_num}: {e}")
-
-            if not full_text.strip():
-                cursor.execute("UPDATE knowledge_base SET status = 'failed' WHERE name = ? AND source = 'admin'", (filename,))
-                db.commit()
-                return "Uploaded PDF has no readable text.", 400
-
-            # Chunk and index
-            chunks = [full_text[i:i+500] for i in range(0, len(full_text), 500)]
-            index = pc.Index(PINECONE_INDEX_NAME)
-
-            for chunk in chunks:
-                try:
-                    embedding = embedding_model.encode(chunk).tolist()
-                    index.upsert(vectors=[{
-                        "id": str(uuid.uuid4()),
-                        "values": embedding,
-                        "metadata": {"text": chunk, "source": "admin", "filename": filename}
-                    }])
-                except Exception as e:
-                    print(f"Error embedding chunk: {e}")
-
-            cursor.execute("UPDATE knowledge_base SET status = 'processed' WHERE name = ? AND source = 'admin'", (filename,))
-            db.commit()
+            job_queue.enqueue("pdf", {
+                "filepath": filepath,
+                "filename": filename,
+                "source": "admin"
+            }, kb_id=kb_id)
 
             return redirect(url_for("admin"))
 
@@ -639,31 +1316,17 @@ def admin_add_url():
         cursor = db.cursor()
         cursor.execute("""
             INSERT INTO knowledge_base (type, name, content, added_at, status, source) 
-            VALUES ('URL', ?, ?, ?, 'processing', 'admin')
+            VALUES ('URL', ?, ?, ?, 'queued', 'admin')
         """, (title, url, datetime.utcnow().isoformat()))
+        kb_id = cursor.lastrowid
         db.commit()
 
-        # Process URL (same logic as before)
-        with urllib.request.urlopen(url) as response:
-            html_content = response.read()
-
-        soup = BeautifulSoup(html_content, 'html.parser')
-        text = soup.get_text(separator='\n', strip=True)
-
-        chunks = [text[i:i + 500] for i in range(0, len(text), 500)]
-        index = pc.Index(PINECONE_INDEX_NAME)
-        
-        for chunk in chunks:
-            embedding = embedding_model.encode(chunk).tolist()
-            if embedding:
-                index.upsert(vectors=[{
-                    "id": str(uuid.uuid4()),
-                    "values": embedding,
-                    "metadata": {"text": chunk, "source": "admin", "url": url}
-                }])
-
-        cursor.execute("UPDATE knowledge_base SET status = 'processed' WHERE name = ? AND content = ? AND source = 'admin'", (title, url))
-        db.commit()
+        job_queue.enqueue("url", {
+            "url": url,
+            "title": title,
+            "source": "admin",
+            "kb_id": kb_id
+        }, kb_id=kb_id)
 
         return redirect(url_for("admin"))
 
@@ -671,6 +1334,36 @@ def admin_add_url():
         print("Error processing URL:", e)
         return redirect(url_for("admin"))
 
+@app.route("/api/knowledge-base/refresh", methods=["POST"])
+def refresh_knowledge_base():
+    """Queue a conditional re-crawl of every indexed URL now"""
+    try:
+        if job_queue.has_pending("refresh"):
+            return jsonify({"message": "A refresh is already queued or running."}), 409
+        job_id = job_queue.enqueue("refresh", {})
+        return jsonify({"success": True, "job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Ingestion job status endpoints
+@app.route("/api/jobs")
+def get_jobs():
+    try:
+        limit = min(int(request.args.get("limit", 50)), 200)
+        return jsonify(job_queue.list(limit=limit, status=request.args.get("status")))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/jobs/<int:job_id>")
+def get_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Additional API endpoints for the enhanced features
 @app.route("/api/add-api-key", methods=["POST"])
 def add_api_key():
@@ -688,6 +1381,7 @@ def add_api_key():
             VALUES (?, ?, ?, 'active')
         """, (key_name, api_key, datetime.utcnow().isoformat()))
         db.commit()
+        llm_client.invalidate_keys()
         
         return jsonify({
             "key_name": key_name,
@@ -709,6 +1403,7 @@ def delete_api_key():
         cursor = db.cursor()
         cursor.execute("UPDATE api_keys SET status = 'deleted' WHERE api_key = ?", (api_key,))
         db.commit()
+        llm_client.invalidate_keys()
         
         return jsonify({"success": True})
     except Exception as e:
@@ -772,5 +1467,10 @@ def end_session():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+print(f"App module loaded in {time.perf_counter() - BOOT_STARTED:.2f}s")
+# Spawned PDF extraction workers re-import this module as __mp_main__; they must not warm up
+if WARMUP_ON_BOOT and __name__ != "__mp_main__":
+    warmup.start()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,118 @@
+# Micro-benchmark: BeautifulSoup get_text() vs the streaming main-content extractor
+#
+#   python benchmarks/bench_html_extract.py [--repeat 5] [page.html ...]
+#
+# Without arguments it runs on generated helpdesk-style pages with the usual
+# chrome (nav, cookie banner, sidebar, footer, scripts) in three sizes.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from src.html_extract import extract_html
+from src.ingest import chunk_text, iter_section_chunks
+
+WORDS = ("reset password account vpn client outlook mailbox sync laptop driver printer queue "
+         "network adapter restart settings install update policy ticket support admin access "
+         "browser cache certificate wifi proxy firewall license activation backup restore").split()
+
+# Phrases that only occur in page chrome; any of them in the output is leaked boilerplate
+CHROME_MARKERS = ("Accept all cookies", "Site navigation", "Related articles", "All rights reserved",
+                  "Subscribe to our newsletter")
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+
+def make_page(sections, seed=0):
+    rng = random.Random(seed)
+    nav = "".join(f'<li><a href="/kb/{i}">Site navigation item {i}</a></li>' for i in range(40))
+    related = "".join(f'<li><a href="/kb/r{i}">Related articles {i}</a></li>' for i in range(15))
+    body = []
+    for s in range(sections):
+        body.append(f"<h2>Section {s}: {sentence(rng)}</h2>")
+        for _ in range(rng.randint(2, 5)):
+            body.append(f"<p>{' '.join(sentence(rng) for _ in range(rng.randint(2, 6)))}</p>")
+        if s % 3 == 0:
+            body.append("<ul>" + "".join(f"<li>{sentence(rng)}</li>" for _ in range(4)) + "</ul>")
+    return f"""<!DOCTYPE html><html><head><title>IT Helpdesk KB</title>
+<style>{'body{margin:0} ' * 200}</style><script>{'var x = 1; ' * 500}</script></head>
+<body><header class="site-header"><nav><ul>{nav}</ul></nav></header>
+<div class="cookie-banner">We use cookies. <button>Accept all cookies</button></div>
+<div class="layout"><aside class="sidebar"><ul>{related}</ul></aside>
+<main><article><h1>Knowledge base article</h1>{''.join(body)}</article></main></div>
+<div class="newsletter">Subscribe to our newsletter for IT tips</div>
+<footer><p>Copyright 2024. All rights reserved.</p><ul>{nav}</ul></footer>
+<script>{'track(); ' * 1000}</script></body></html>"""
+
+
+def baseline(html):
+    """The original URL path: html.parser tree, drop script/style, get_text, fixed chunks"""
+    soup = BeautifulSoup(html, "html.parser")
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text(separator="\n", strip=True)
+    return text, chunk_text(text)
+
+
+def streaming(html):
+    page = extract_html(html)
+    chunks = [chunk for chunk, _ in iter_section_chunks(page.sections)]
+    return "\n".join(chunks), chunks
+
+
+def run(name, extract, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            text, chunks = extract(html)
+    elapsed = time.perf_counter() - start
+
+    chunk_count = chars = leaked = 0
+    for html in pages:
+        text, chunks = extract(html)
+        chunk_count += len(chunks)
+        chars += len(text)
+        leaked += sum(text.count(marker) for marker in CHROME_MARKERS)
+    return {
+        "name": name,
+        "pages_per_sec": len(pages) * repeat / elapsed,
+        "chunks": chunk_count,
+        "chars": chars,
+        "leaked": leaked,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML text extraction")
+    parser.add_argument("files", nargs="*", help="HTML files to benchmark instead of generated pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.files:
+        suites = {"files": [open(path, "rb").read() for path in args.files]}
+    else:
+        suites = {
+            "small": [make_page(6, seed).encode() for seed in range(20)],
+            "medium": [make_page(120, seed).encode() for seed in range(5)],
+            "large": [make_page(1200, 0).encode()],
+        }
+
+    print(f"{'pages':<18}{'extractor':<12}{'pages/s':>10}{'chunks':>9}{'chars':>11}{'chrome hits':>13}")
+    for suite, pages in suites.items():
+        suite = f"{suite} ({sum(map(len, pages)) // len(pages) // 1024}KB)"
+        for name, extract in (("bs4", baseline), ("streaming", streaming)):
+            result = run(name, extract, pages, args.repeat)
+            print(f"{suite:<18}{name:<12}{result['pages_per_sec']:>10.1f}{result['chunks']:>9}"
+                  f"{result['chars']:>11}{result['leaked']:>13}")
+
+
+if __name__ == "__main__":
+    main()
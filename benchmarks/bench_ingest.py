@@ -0,0 +1,181 @@
+# Ingestion benchmark over the PDFs in data/: extraction, chunking, embedding and upsert
+#
+#   python benchmarks/bench_ingest.py [--data data/] [--repeat 3] [--vector-store local|pinecone]
+#                                     [--batch-size 64] [--fake-embeddings] [--vector-latency 0.02]
+#
+# Every file goes through the same path as an upload job (parallel page extraction,
+# iter_page_chunks, ingest_chunks with content-addressed ids) into a scratch vector
+# store, then once more with the chunk ledger filled to time the unchanged re-upload
+# path. --fake-embeddings swaps the model for a hashing encoder, isolating everything
+# but the forward pass. Results are written as JSON for compare.py.
+
+import argparse
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from common import save_results, summarize
+from fake_services import FakePinecone
+
+from src.db import connect
+from src.ingest import ingest_chunks, iter_page_chunks
+from src.ledger import ChunkLedger, chunk_id, init_ledger_table
+from src.pdf_extract import iter_pdf_pages_parallel
+from src.vector_store import EMBEDDING_DIMENSION, LocalVectorStore, PineconeStore
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words vectors; costs next to nothing compared to the model"""
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        vectors = np.zeros((len(texts), EMBEDDING_DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % EMBEDDING_DIMENSION] += 1
+        return vectors
+
+
+class TimedPages:
+    """Wraps a page iterator, adding up the time the consumer waits on extraction"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.count = 0
+        self.seconds = 0.0
+
+    def __iter__(self):
+        iterator = iter(self.pages)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                page = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - t0
+                return
+            self.seconds += time.perf_counter() - t0
+            self.count += 1
+            yield page
+
+
+def ingest_file(path, vector_store, encoder, ledger, batch_size):
+    doc_key = f"pdf:{os.path.basename(path)}"
+    pages = TimedPages(iter_pdf_pages_parallel(path))
+    stats = ingest_chunks(
+        iter_page_chunks(pages), vector_store, encoder,
+        make_id=lambda chunk: chunk_id(doc_key, chunk),
+        make_metadata=lambda chunk: {"text": chunk, "source": "benchmark", "filename": os.path.basename(path)},
+        embed_batch_size=batch_size,
+        ledger=ledger,
+        doc_key=doc_key
+    )
+    stats["pages"] = pages.count
+    stats["extract_time"] = pages.seconds
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF ingestion over a directory")
+    parser.add_argument("--data", default="data/", help="directory of PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh-index runs per file")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding batch")
+    parser.add_argument("--vector-store", choices=("local", "pinecone"), default="local",
+                        help="scratch local index, or the fake Pinecone server through the Pinecone client")
+    parser.add_argument("--vector-latency", type=float, default=0.02, help="seconds per fake Pinecone call")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing encoder instead of the model")
+    parser.add_argument("--label", help="free-form note stored with the results")
+    parser.add_argument("--output", help="results file (default benchmarks/results/ingest-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.data, "*.pdf")))
+    if not pdfs:
+        raise SystemExit(f"No PDFs in {args.data}")
+
+    t0 = time.perf_counter()
+    if args.fake_embeddings:
+        encoder = HashingEncoder()
+    else:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer("all-MiniLM-L6-v2")
+    model_load = time.perf_counter() - t0
+
+    workdir = tempfile.mkdtemp(prefix="helpdesk-ingest-")
+    pinecone = FakePinecone(args.vector_latency).start() if args.vector_store == "pinecone" else None
+    database = os.path.join(workdir, "bench.db")
+    db = connect(database)
+    init_ledger_table(db.cursor())
+    db.commit()
+    db.close()
+
+    files = {}
+    try:
+        print(f"{'file':<28}{'pages':>7}{'chunks':>8}{'extract':>10}{'embed':>9}{'upsert':>9}"
+              f"{'total':>9}{'chunks/s':>10}{'re-upload':>11}")
+        for path in pdfs:
+            name = os.path.basename(path)
+            runs = []
+            for run in range(args.repeat):
+                # A fresh store and ledger per run, so every chunk is embedded
+                store_key = f"bench:{name}:{run}"
+                if pinecone is not None:
+                    pinecone.delete(delete_all=True)
+                    vector_store = PineconeStore("bench", "bench", host=pinecone.url)
+                else:
+                    vector_store = LocalVectorStore(os.path.join(workdir, f"index-{name}-{run}"))
+                ledger = ChunkLedger(database, store_key)
+                runs.append(ingest_file(path, vector_store, encoder, ledger, args.batch_size))
+
+            # Same file again into the last run's store: everything is already in the ledger
+            rerun = ingest_file(path, vector_store, encoder, ledger, args.batch_size)
+
+            total = summarize([stats["total_time"] for stats in runs])
+            files[name] = {
+                "bytes": os.path.getsize(path),
+                "pages": runs[0]["pages"],
+                "chunks": runs[0]["chunks"],
+                "runs": [{key: round(value, 4) if isinstance(value, float) else value
+                          for key, value in stats.items()} for stats in runs],
+                "total": total,
+                "extract": summarize([stats["extract_time"] for stats in runs]),
+                "embed": summarize([stats["embed_time"] for stats in runs]),
+                "upsert": summarize([stats["upsert_time"] for stats in runs]),
+                "chunks_per_sec": round(runs[0]["chunks"] / total["p50_ms"] * 1000, 1) if total["p50_ms"] else 0.0,
+                "reupload": {"skipped": rerun["skipped"], "embedded": rerun["chunks"],
+                             "total_ms": round(rerun["total_time"] * 1000, 2)}
+            }
+            entry = files[name]
+            print(f"{name[:27]:<28}{entry['pages']:>7}{entry['chunks']:>8}"
+                  f"{entry['extract']['p50_ms']:>8.0f}ms{entry['embed']['p50_ms']:>7.0f}ms"
+                  f"{entry['upsert']['p50_ms']:>7.0f}ms{entry['total']['p50_ms']:>7.0f}ms"
+                  f"{entry['chunks_per_sec']:>10.1f}{entry['reupload']['total_ms']:>9.0f}ms")
+    finally:
+        if pinecone is not None:
+            pinecone.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    chunks = sum(entry["chunks"] for entry in files.values())
+    pages = sum(entry["pages"] for entry in files.values())
+    median_total = sum(entry["total"]["p50_ms"] for entry in files.values()) / 1000
+    results = {
+        "model_load_s": round(model_load, 3),
+        "files": files,
+        "totals": {
+            "files": len(files),
+            "pages": pages,
+            "chunks": chunks,
+            "pages_per_sec": round(pages / median_total, 1) if median_total else 0.0,
+            "chunks_per_sec": round(chunks / median_total, 1) if median_total else 0.0
+        }
+    }
+    print(f"\n{len(files)} files, {pages} pages, {chunks} chunks: "
+          f"{results['totals']['pages_per_sec']} pages/s, {results['totals']['chunks_per_sec']} chunks/s (median run)")
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "label")}
+    save_results("ingest", config, results, args.output, args.label)
+
+
+if __name__ == "__main__":
+    main()
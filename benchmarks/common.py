@@ -0,0 +1,67 @@
+# Shared helpers for the benchmarks: latency summaries and JSON result files
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+sys.path.insert(0, ROOT)
+
+from src.metrics import PERCENTILES, percentile
+
+
+def summarize(seconds):
+    """count/mean/max and p50/p95/p99 of a list of durations, in milliseconds"""
+    values = sorted(seconds)
+    summary = {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+    return summary
+
+
+def git_revision():
+    """Current commit and whether the tree has local changes, or None outside git"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                             stderr=subprocess.DEVNULL, text=True).strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(kind, config, results, output=None, label=None):
+    """Write one run to ``output`` (default benchmarks/results/<kind>-<commit>-<time>.json)"""
+    revision = git_revision()
+    timestamp = datetime.now()
+    document = {
+        "benchmark": kind,
+        "label": label,
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "git": revision,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "config": config,
+        "results": results
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = revision["commit"] + ("-dirty" if revision["dirty"] else "") if revision else "nogit"
+        output = os.path.join(RESULTS_DIR, f"{kind}-{commit}-{timestamp:%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {output}")
+    return output
@@ -0,0 +1,67 @@
+# Compare two benchmark result files (load_test.py / bench_ingest.py / eval_retrieval.py output)
+#
+#   python benchmarks/compare.py benchmarks/results/load-abc123-....json benchmarks/results/load-def456-....json
+#
+# Prints every latency percentile, throughput, recall/MRR and index size figure present
+# in both runs with the change between them. --all includes the app's /metrics snapshot and every other number.
+
+import argparse
+import json
+
+HEADLINE = ("_ms", "per_sec", "errors", "_bytes", "mrr")
+HEADLINE_PREFIXES = ("recall@",)
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def headline(key):
+    leaf = key.rsplit(".", 1)[-1]
+    return leaf.endswith(HEADLINE) or leaf.startswith(HEADLINE_PREFIXES)
+
+
+def describe(document):
+    git = document.get("git") or {}
+    commit = git.get("commit", "nogit") + ("-dirty" if git.get("dirty") else "")
+    label = f" ({document['label']})" if document.get("label") else ""
+    return f"{commit} {document.get('timestamp', '')}{label}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--all", action="store_true", help="show every number, including server metrics")
+    parser.add_argument("--match", help="only show keys containing this text")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get("benchmark") != after.get("benchmark"):
+        print(f"Warning: comparing a {before.get('benchmark')} run with a {after.get('benchmark')} run")
+
+    old = dict(flatten(before.get("results", {})))
+    new = dict(flatten(after.get("results", {})))
+    print(f"before: {describe(before)}")
+    print(f"after:  {describe(after)}\n")
+    print(f"{'metric':<60}{'before':>12}{'after':>12}{'change':>10}")
+    for key, value in new.items():
+        if key not in old:
+            continue
+        if not args.all and (key.startswith("server_metrics.") or not headline(key)):
+            continue
+        if args.match and args.match not in key:
+            continue
+        change = f"{(value - old[key]) / old[key] * 100:+.1f}%" if old[key] else "-"
+        print(f"{key[:59]:<60}{old[key]:>12g}{value:>12g}{change:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# Retrieval quality vs. latency across chunking, top_k, hybrid/vector-only and int8/float
+#
+#   python benchmarks/eval_retrieval.py [--data data/] [--database chat_logs.db]
+#                                       [--chunk-sizes 300,500,800] [--overlaps 0,20,100]
+#                                       [--top-k 1,3,5,10] [--save-set set.jsonl | --questions set.jsonl]
+#
+# Labels are character spans of the documents in data/, not chunk ids, so one question
+# set scores every chunking: a retrieved chunk is relevant when it covers at least half
+# of the question's answer span. recall@k is the share of questions with a relevant chunk
+# in the top k; MRR is taken over the top max(--top-k). Questions come from two places:
+#   synthetic  a sentence of a document, reduced to a keyword-style query
+#   chat_log   a logged user message, labeled with the document sentence that the
+#              logged answer overlaps most (logs whose answer matches nothing are skipped)
+# Synthetic queries share their words with the answer and flatter keyword search, so
+# results are also broken down per source. --save-set writes the set as JSONL for review
+# or hand-labeling; --questions reads such a file back.
+#
+# Everything runs offline against scratch local indexes (float or int8) and an SQLite
+# FTS5 table, through the app's hybrid_search. Index size is the logical size of the
+# vectors and metadata, plus the FTS5 database for hybrid configurations. Chunk and
+# query embeddings are computed once and shared by every configuration that needs them.
+
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from bench_ingest import HashingEncoder
+from common import save_results, summarize
+
+from src.db import connect
+from src.keyword_index import KeywordIndex, init_keyword_table
+from src.pdf_extract import iter_pdf_pages
+from src.retrieval import hybrid_search
+from src.vector_store import EMBEDDING_DIMENSION, LocalVectorStore
+
+STOPWORDS = set("""a about after all also an and any are as at be because been before being but by can
+could did do does for from had has have how if in into is it its may more most must no not of on or
+other our out over should so some such than that the their them then there these they this those to
+under up use used using was we were what when where which while who will with would you your""".split())
+
+SENTENCE = re.compile(r"[^.!?\n]+[.!?]?")
+MIN_OVERLAP = 0.5
+
+
+def content_words(text):
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+def load_documents(directory):
+    """Document text as the upload path builds it: non-empty pages, each followed by a newline"""
+    documents = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.pdf"))):
+        documents[os.path.basename(path)] = "".join(text + "\n" for _, text in iter_pdf_pages(path) if text)
+    return documents
+
+
+def sentences(text, min_chars=60, max_chars=300):
+    """(start, end) spans of the sentences of ``text`` that are long enough to ask about"""
+    for match in SENTENCE.finditer(text):
+        start, end = match.span()
+        while start < end and text[start].isspace():
+            start += 1
+        if min_chars <= end - start <= max_chars and len(content_words(text[start:end])) >= 6:
+            yield start, end
+
+
+def synthetic_questions(documents, count, rng):
+    """Keyword-style queries made from randomly chosen document sentences"""
+    candidates = [(name, span) for name, text in documents.items() for span in sentences(text)]
+    questions = []
+    for name, (start, end) in rng.sample(candidates, min(count, len(candidates))):
+        words = content_words(documents[name][start:end])
+        keep = sorted(rng.sample(range(len(words)), max(4, min(10, int(len(words) * 0.6)))))
+        questions.append({"source": "synthetic", "question": " ".join(words[i] for i in keep),
+                          "doc": name, "start": start, "end": end})
+    return questions
+
+
+def chat_log_questions(documents, database, count, min_shared=5, min_fraction=0.6):
+    """Logged questions labeled with the sentence their logged answer overlaps most"""
+    if not database or not os.path.exists(database):
+        return []
+    db = sqlite3.connect(database)
+    try:
+        rows = db.execute("""
+            SELECT user_message, bot_response FROM chat_logs
+            WHERE user_message IS NOT NULL AND bot_response IS NOT NULL
+            ORDER BY id DESC LIMIT ?
+        """, (count * 10,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Could not read chat logs from {database}: {e}")
+        return []
+    finally:
+        db.close()
+
+    spans = [(name, start, end, set(content_words(text[start:end])))
+             for name, text in documents.items() for start, end in sentences(text)]
+    questions, seen = [], set()
+    for user_message, bot_response in rows:
+        key = " ".join(user_message.lower().split())
+        if key in seen or len(questions) >= count:
+            continue
+        seen.add(key)
+        answer = set(content_words(bot_response))
+        best, best_score = None, 0.0
+        for name, start, end, words in spans:
+            shared = len(words & answer)
+            if shared >= min_shared and shared / len(words) > best_score:
+                best, best_score = (name, start, end), shared / len(words)
+        if best and best_score >= min_fraction:
+            questions.append({"source": "chat_log", "question": user_message,
+                              "doc": best[0], "start": best[1], "end": best[2]})
+    return questions
+
+
+def window_chunks(text, size, overlap):
+    """(start, end) spans of fixed-size chunks; overlap 0 matches the upload routes' chunking"""
+    step = max(1, size - overlap)
+    spans = []
+    for start in range(0, len(text), step):
+        spans.append((start, min(start + size, len(text))))
+        if start + size >= len(text):
+            break
+    return spans
+
+
+def recursive_chunks(text, size, overlap):
+    """(start, end) spans from the LangChain splitter used by src/helper.text_split"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap, add_start_index=True)
+    return [(doc.metadata["start_index"], doc.metadata["start_index"] + len(doc.page_content))
+            for doc in splitter.create_documents([text])]
+
+
+def relevant(chunk, question):
+    """The chunk covers at least MIN_OVERLAP of the answer span"""
+    doc, start, end = chunk
+    if doc != question["doc"]:
+        return False
+    covered = min(end, question["end"]) - max(start, question["start"])
+    return covered >= MIN_OVERLAP * (question["end"] - question["start"])
+
+
+class EmbeddingCache:
+    """Embeds each distinct text once across all configurations"""
+
+    def __init__(self, encoder, batch_size=64):
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.vectors = {}
+        self.seconds = 0.0
+
+    def get(self, texts):
+        missing = list(dict.fromkeys(text for text in texts if text not in self.vectors))
+        if missing:
+            t0 = time.perf_counter()
+            for i in range(0, len(missing), self.batch_size):
+                batch = missing[i:i + self.batch_size]
+                for text, vector in zip(batch, self.encoder.encode(batch, batch_size=self.batch_size)):
+                    self.vectors[text] = np.asarray(vector, dtype=np.float32)
+            self.seconds += time.perf_counter() - t0
+        return [self.vectors[text] for text in texts]
+
+
+def build_chunks(documents, splitter, size, overlap):
+    chunk_spans = recursive_chunks if splitter == "recursive" else window_chunks
+    chunks = []
+    for name, text in documents.items():
+        for start, end in chunk_spans(text, size, overlap):
+            if text[start:end].strip():
+                chunks.append((name, start, end))
+    return chunks
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def evaluate(questions, query_vectors, store, keyword_index, hybrid, chunk_spans, ks):
+    """Ranks of the first relevant chunk per question, plus per-query latency and context size"""
+    max_k = max(ks)
+    first_relevant, latencies, context_chars = [], [], {k: [] for k in ks}
+    for question, vector in zip(questions, query_vectors):
+        t0 = time.perf_counter()
+        matches = hybrid_search(vector.tolist(), question["question"], store, keyword_index,
+                                top_k=max_k, hybrid=hybrid)
+        latencies.append(time.perf_counter() - t0)
+        rank = next((i for i, match in enumerate(matches, start=1)
+                     if relevant(chunk_spans[match.id], question)), None)
+        first_relevant.append(rank)
+        for k in ks:
+            context_chars[k].append(sum(len(match.metadata.get("text", "")) for match in matches[:k]))
+    return first_relevant, latencies, context_chars
+
+
+def scores(first_relevant, ks):
+    count = len(first_relevant) or 1
+    result = {f"recall@{k}": round(sum(1 for rank in first_relevant if rank and rank <= k) / count, 4) for k in ks}
+    result["mrr"] = round(sum(1.0 / rank for rank in first_relevant if rank) / count, 4)
+    return result
+
+
+def int_list(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality against latency and index size")
+    parser.add_argument("--data", default="data/", help="directory of PDFs to index and ask about")
+    parser.add_argument("--database", default="chat_logs.db", help="chat log database for logged questions")
+    parser.add_argument("--questions", help="JSONL question set to use instead of building one")
+    parser.add_argument("--save-set", help="write the question set to this JSONL file")
+    parser.add_argument("--synthetic", type=int, default=200, help="synthetic questions to generate")
+    parser.add_argument("--chat-log-questions", type=int, default=200, help="logged questions to label at most")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--splitter", choices=("fixed", "recursive"), default="fixed",
+                        help="upload-route windows, or the LangChain splitter of src/helper.py")
+    parser.add_argument("--chunk-sizes", type=int_list, default=[300, 500, 800])
+    parser.add_argument("--overlaps", type=int_list, default=[0, 20, 100])
+    parser.add_argument("--top-k", type=int_list, default=[1, 3, 5, 10])
+    parser.add_argument("--modes", default="vector,hybrid", help="comma-separated: vector, hybrid")
+    parser.add_argument("--quantize", default="float,int8", help="comma-separated: float, int8")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing encoder instead of the model")
+    parser.add_argument("--label", help="free-form note stored with the results")
+    parser.add_argument("--output", help="results file (default benchmarks/results/retrieval-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    documents = load_documents(args.data)
+    if not documents:
+        raise SystemExit(f"No PDFs in {args.data}")
+
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [json.loads(line) for line in f if line.strip()]
+    else:
+        rng = random.Random(args.seed)
+        questions = synthetic_questions(documents, args.synthetic, rng)
+        questions += chat_log_questions(documents, args.database, args.chat_log_questions)
+    questions = [q for q in questions if q["doc"] in documents]
+    if not questions:
+        raise SystemExit("No questions to evaluate")
+    if args.save_set:
+        with open(args.save_set, "w") as f:
+            for question in questions:
+                f.write(json.dumps({**question, "answer": documents[question["doc"]][question["start"]:question["end"]]})
+                        + "\n")
+        print(f"Wrote {len(questions)} questions to {args.save_set}")
+    sources = sorted({q["source"] for q in questions})
+    print(f"{len(questions)} questions (" +
+          ", ".join(f"{sum(q['source'] == s for q in questions)} {s}" for s in sources) + ")")
+
+    if args.fake_embeddings:
+        encoder = HashingEncoder()
+    else:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer("all-MiniLM-L6-v2")
+    embeddings = EmbeddingCache(encoder)
+    query_vectors = embeddings.get([q["question"] for q in questions])
+    query_embed_seconds = embeddings.seconds
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    quantize_options = [q.strip() == "int8" for q in args.quantize.split(",") if q.strip()]
+    ks = sorted(set(args.top_k))
+
+    workdir = tempfile.mkdtemp(prefix="helpdesk-eval-")
+    configs = {}
+    header = (f"{'config':<34}{'chunks':>7}" + "".join(f"{'R@' + str(k):>7}" for k in ks) +
+              f"{'MRR':>7}{'p50':>9}{'p95':>9}{'index':>10}{'ctx@3':>8}")
+    print(header)
+    try:
+        for size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= size:
+                    continue
+                chunks = build_chunks(documents, args.splitter, size, overlap)
+                texts = [documents[name][start:end] for name, start, end in chunks]
+                vectors = embeddings.get(texts)
+                ids = [f"c{i}" for i in range(len(chunks))]
+                chunk_spans = dict(zip(ids, chunks))
+                items = [{"id": chunk_id, "values": vector.tolist(), "metadata": {"text": text, "filename": chunk[0]}}
+                         for chunk_id, vector, text, chunk in zip(ids, vectors, texts, chunks)]
+
+                keyword_db = os.path.join(workdir, f"fts-{size}-{overlap}.db")
+                if "hybrid" in modes:
+                    db = connect(keyword_db)
+                    init_keyword_table(db.cursor())
+                    db.commit()
+                    db.close()
+                    keyword_index = KeywordIndex(keyword_db)
+                    keyword_index.add(items)
+                    keyword_bytes = os.path.getsize(keyword_db)
+                else:
+                    keyword_index, keyword_bytes = None, 0
+
+                for quantize in quantize_options:
+                    path = os.path.join(workdir, f"index-{size}-{overlap}-{int(quantize)}")
+                    store = LocalVectorStore(path, quantize=quantize)
+                    t0 = time.perf_counter()
+                    for i in range(0, len(items), 500):
+                        store.upsert(items[i:i + 500])
+                    upsert_seconds = time.perf_counter() - t0
+                    # Logical size: the memory maps are preallocated past the last row
+                    vector_bytes = len(items) * (EMBEDDING_DIMENSION * (1 if quantize else 4) + (4 if quantize else 0))
+                    metadata_bytes = os.path.getsize(store.meta_path)
+
+                    for mode in modes:
+                        name = f"{args.splitter}{size}/o{overlap}/{mode}/{'int8' if quantize else 'float'}"
+                        first_relevant, latencies, context_chars = evaluate(
+                            questions, query_vectors, store, keyword_index if mode == "hybrid" else None,
+                            mode == "hybrid", chunk_spans, ks)
+                        result = {
+                            "splitter": args.splitter, "chunk_size": size, "overlap": overlap,
+                            "mode": mode, "quantize": "int8" if quantize else "float",
+                            "chunks": len(chunks),
+                            **scores(first_relevant, ks),
+                            "by_source": {source: scores([rank for rank, q in zip(first_relevant, questions)
+                                                          if q["source"] == source], ks) for source in sources},
+                            "query": summarize(latencies),
+                            "index_bytes": vector_bytes + metadata_bytes + (keyword_bytes if mode == "hybrid" else 0),
+                            "index_breakdown": {
+                                "vectors": vector_bytes,
+                                "metadata": metadata_bytes,
+                                "keyword": keyword_bytes if mode == "hybrid" else 0
+                            },
+                            "upsert_ms": round(upsert_seconds * 1000, 2),
+                            "context_chars": {f"@{k}": round(sum(values) / len(values), 1)
+                                              for k, values in context_chars.items()}
+                        }
+                        configs[name] = result
+                        context = result["context_chars"].get("@3", 0)
+                        print(f"{name:<34}{len(chunks):>7}" +
+                              "".join(f"{result[f'recall@{k}']:>7.3f}" for k in ks) +
+                              f"{result['mrr']:>7.3f}{result['query']['p50_ms']:>7.2f}ms"
+                              f"{result['query']['p95_ms']:>7.2f}ms{result['index_bytes'] / 1024:>8.0f}KB{context:>8.0f}")
+                    shutil.rmtree(path, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "questions": {source: sum(q["source"] == source for q in questions) for source in sources},
+        "embedding_cache": {"texts": len(embeddings.vectors), "embed_s": round(embeddings.seconds, 3),
+                            "query_embed_ms": round(query_embed_seconds / len(questions) * 1000, 3)},
+        "configs": configs
+    }
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "label")}
+    save_results("retrieval", config, results, args.output, args.label)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# Local stand-ins for OpenRouter, the Pinecone data plane and a website, for offline load tests
+#
+#   python benchmarks/fake_services.py [--llm-latency 0.8] [--ttft 0.3] [--tokens-per-sec 60]
+#                                      [--vector-latency 0.02] [--openrouter-port 8081] ...
+#
+# Point the app at them with OPENROUTER_URL=http://127.0.0.1:8081/api/v1/chat/completions,
+# PINECONE_HOST=http://127.0.0.1:8082 and any OPENROUTER_API_KEY / PINECONE_API_KEY.
+# load_test.py starts them itself; this entry point is for running the app by hand.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ANSWER_WORDS = ("Try restarting the **VPN client**, then sign in again. If the error persists, clear the "
+                "cached credentials under Settings > Accounts, reinstall the latest driver and open a ticket "
+                "with the error code so the service desk can check the account policy.").split()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeService:
+    """Runs a handler on a ThreadingHTTPServer in a daemon thread"""
+
+    handler = _Handler
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self, host="127.0.0.1", port=0):
+        handler = type(self.handler.__name__, (self.handler,), {"service": self})
+        self._server = _Server((host, port), handler)
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _OpenRouterHandler(_Handler):
+    def do_POST(self):
+        service = self.service
+        body = self.read_json()
+        service.count()
+        if service.error_rate and random.random() < service.error_rate:
+            time.sleep(service.latency / 4)
+            return self.send_json({"error": {"message": "Provider overloaded", "code": 503}}, status=503)
+
+        words = ANSWER_WORDS[:service.answer_tokens]
+        usage = {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in body.get("messages", [])),
+                 "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            time.sleep(service.latency)
+            return self.send_json({
+                "id": "gen-bench", "model": body.get("model"), "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}]
+            })
+
+        # Connection-delimited SSE body: first token after ttft, then tokens_per_sec
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        time.sleep(service.ttft)
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1.0 / service.tokens_per_sec)
+            chunk = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if body.get("usage"):
+            self.wfile.write(f"data: {json.dumps({'choices': [{'index': 0, 'delta': {}}], 'usage': usage})}\n\n"
+                             .encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenRouter(FakeService):
+    """Chat completions with a fixed latency (or time to first token plus a
+    token rate when streaming), usage blocks, and an optional 503 rate"""
+
+    handler = _OpenRouterHandler
+
+    def __init__(self, latency=0.8, ttft=0.3, tokens_per_sec=60.0, answer_tokens=40, error_rate=0.0):
+        super().__init__()
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+
+    @property
+    def chat_url(self):
+        return self.url + "/api/v1/chat/completions"
+
+
+class _PineconeHandler(_Handler):
+    def do_POST(self):
+        service = self.service
+        body = self.read_json()
+        service.count()
+        time.sleep(service.latency)
+        path = self.path.split("?")[0]
+        if path == "/query":
+            return self.send_json(service.query(body))
+        if path == "/vectors/upsert":
+            return self.send_json({"upsertedCount": service.upsert(body.get("vectors", []))})
+        if path == "/vectors/delete":
+            service.delete(body.get("ids"), body.get("deleteAll"))
+            return self.send_json({})
+        if path == "/describe_index_stats":
+            return self.send_json(service.describe())
+        self.send_json({"error": f"Unknown path {path}"}, status=404)
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path == "/describe_index_stats":
+            return self.send_json(self.service.describe())
+        if path == "/vectors/fetch":
+            self.service.count()
+            time.sleep(self.service.latency)
+            return self.send_json(self.service.fetch(urllib.parse.parse_qs(query).get("ids", [])))
+        self.send_json({"error": "Not found"}, status=404)
+
+
+class FakePinecone(FakeService):
+    """In-memory Pinecone data plane (query / fetch / upsert / delete) with brute-force
+    cosine search and a fixed per-call latency. Metadata filters are ignored."""
+
+    handler = _PineconeHandler
+
+    def __init__(self, latency=0.02, dimension=384):
+        super().__init__()
+        self.latency = latency
+        self.dimension = dimension
+        self.vectors = {}
+        self._matrix = None
+        self._ids = []
+        self._data_lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._data_lock:
+            for vector in vectors:
+                self.vectors[vector["id"]] = (np.asarray(vector["values"], dtype=np.float32),
+                                              vector.get("metadata") or {})
+            self._matrix = None
+        return len(vectors)
+
+    def delete(self, ids=None, delete_all=False):
+        with self._data_lock:
+            if delete_all:
+                self.vectors.clear()
+            for vector_id in ids or ():
+                self.vectors.pop(vector_id, None)
+            self._matrix = None
+
+    def query(self, body):
+        top_k = int(body.get("topK") or body.get("top_k") or 3)
+        query = np.asarray(body.get("vector") or [], dtype=np.float32)
+        with self._data_lock:
+            if self._matrix is None:
+                self._ids = list(self.vectors)
+                matrix = np.stack([self.vectors[i][0] for i in self._ids]) if self._ids else \
+                    np.zeros((0, self.dimension), dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._matrix = matrix / np.where(norms == 0, 1, norms)
+            matrix, ids, vectors = self._matrix, self._ids, self.vectors
+        if not ids or not query.size:
+            return {"matches": [], "namespace": body.get("namespace", "")}
+        norm = np.linalg.norm(query)
+        scores = matrix @ (query / norm if norm else query)
+        best = np.argsort(-scores)[:top_k]
+        include = body.get("includeMetadata", body.get("include_metadata", False))
+        values = body.get("includeValues", body.get("include_values", False))
+        matches = []
+        for i in best:
+            match = {"id": ids[i], "score": float(scores[i]),
+                     "values": vectors[ids[i]][0].tolist() if values else []}
+            if include:
+                match["metadata"] = vectors[ids[i]][1]
+            matches.append(match)
+        return {"matches": matches, "namespace": body.get("namespace", "")}
+
+    def fetch(self, ids):
+        with self._data_lock:
+            found = {i: self.vectors[i] for i in ids if i in self.vectors}
+        return {"vectors": {i: {"id": i, "values": values.tolist(), "metadata": metadata}
+                            for i, (values, metadata) in found.items()}, "namespace": ""}
+
+    def describe(self):
+        return {"dimension": self.dimension, "indexFullness": 0.0, "totalVectorCount": len(self.vectors),
+                "namespaces": {"": {"vectorCount": len(self.vectors)}}}
+
+
+class _SiteHandler(_Handler):
+    def do_GET(self):
+        self.service.count()
+        match = re.match(r"^/kb/(\d+)", self.path)
+        if not match:
+            return self.send_json({"error": "Not found"}, status=404)
+        time.sleep(self.service.latency)
+        html = self.service.page(int(match.group(1))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+
+class FakeSite(FakeService):
+    """Helpdesk-style article pages at /kb/<n>, generated deterministically per n"""
+
+    handler = _SiteHandler
+
+    def __init__(self, latency=0.05, sections=12):
+        super().__init__()
+        self.latency = latency
+        self.sections = sections
+
+    def page(self, number):
+        from bench_html_extract import make_page
+        return make_page(self.sections, seed=number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake OpenRouter, Pinecone and website servers")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per non-streamed completion")
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds to the first streamed token")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions answered with 503")
+    parser.add_argument("--vector-latency", type=float, default=0.02, help="seconds per Pinecone call")
+    parser.add_argument("--site-latency", type=float, default=0.05, help="seconds per web page")
+    parser.add_argument("--openrouter-port", type=int, default=8081)
+    parser.add_argument("--pinecone-port", type=int, default=8082)
+    parser.add_argument("--site-port", type=int, default=8083)
+    args = parser.parse_args()
+
+    openrouter = FakeOpenRouter(args.llm_latency, args.ttft, args.tokens_per_sec, args.answer_tokens,
+                                args.error_rate).start(port=args.openrouter_port)
+    pinecone = FakePinecone(args.vector_latency).start(port=args.pinecone_port)
+    site = FakeSite(args.site_latency).start(port=args.site_port)
+    print(f"OPENROUTER_URL={openrouter.chat_url}")
+    print(f"PINECONE_HOST={pinecone.url}")
+    print(f"Pages at {site.url}/kb/<n>")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
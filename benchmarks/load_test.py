@@ -0,0 +1,360 @@
+# Offline load test of the chat and ingestion routes against local OpenRouter / Pinecone stand-ins
+#
+#   python benchmarks/load_test.py [--scenario chat,stream,upload,url] [--concurrency 16]
+#                                  [--requests 200 | --duration 30] [--llm-latency 0.8] ...
+#
+# By default the app is started in a scratch directory (its own SQLite database and
+# uploads) with OPENROUTER_URL and PINECONE_HOST pointed at the fakes from
+# fake_services.py, the PDFs in data/ are uploaded to seed the index, and the load is
+# run. --target http://host:port runs against an app that is already up instead
+# (configure it with fake_services.py yourself). Results, including the app's
+# /metrics after the run, are written as JSON for compare.py.
+
+import argparse
+import glob
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from common import ROOT, save_results, summarize
+from fake_services import FakeOpenRouter, FakePinecone, FakeSite
+
+SCENARIOS = ("chat", "stream", "upload", "url")
+
+QUESTIONS = [
+    "How do I reset my domain password?",
+    "Outlook keeps asking for my credentials after the update",
+    "VPN client fails with error 809 when working from home",
+    "My laptop cannot see the office printer on floor 3",
+    "How do I request access to the finance shared drive?",
+    "Teams calls drop every few minutes on wifi",
+    "BitLocker is asking for a recovery key after a BIOS update",
+    "How can I install software that needs admin rights?",
+    "Email to external partners bounces with a 550 error",
+    "My second monitor stays black after docking",
+    "How do I set up MFA on a new phone?",
+    "OneDrive shows a sync conflict on every file",
+]
+
+
+class Recorder:
+    """Thread-safe per-scenario latency, time-to-first-byte and error samples"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.job_ids = {}
+        self._lock = threading.Lock()
+
+    def add(self, scenario, seconds, ok, first_byte=None, job_id=None, error=None):
+        with self._lock:
+            entry = self.samples.setdefault(scenario, {"latency": [], "first_byte": []})
+            if ok:
+                entry["latency"].append(seconds)
+                if first_byte is not None:
+                    entry["first_byte"].append(first_byte)
+                if job_id is not None:
+                    self.job_ids.setdefault(scenario, []).append(job_id)
+            else:
+                errors = self.errors.setdefault(scenario, {})
+                errors[error] = errors.get(error, 0) + 1
+
+
+class LoadGenerator:
+    """Issues requests for the chosen scenarios from ``concurrency`` threads"""
+
+    def __init__(self, base_url, scenarios, pdfs, site_url=None, turns=1, first=0):
+        self.base_url = base_url.rstrip("/")
+        self.scenarios = scenarios
+        self.pdfs = [(os.path.basename(path), open(path, "rb").read()) for path in pdfs]
+        self.site_url = site_url
+        self.turns = max(1, turns)
+        self.recorder = Recorder()
+        # Request numbers name the uploads, URLs and sessions, so runs sharing an app must not overlap
+        self._sequence = itertools.count(first)
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _chat(self, n, stream):
+        # Consecutive requests of one worker share a session for --turns messages
+        session_id = f"bench-{threading.get_ident()}-{n // self.turns}"
+        data = {"msg": QUESTIONS[n % len(QUESTIONS)], "session_id": session_id}
+        if not stream:
+            response = self._session().post(f"{self.base_url}/get", data=data, timeout=120)
+            ok = response.ok and not response.text.startswith("Sorry")
+            return ok, None, None, None if ok else f"HTTP {response.status_code}: {response.text[:60]}"
+
+        started = time.perf_counter()
+        first_byte = None
+        ok = False
+        error = None
+        with self._session().post(f"{self.base_url}/get/stream", data=data, timeout=120, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if first_byte is None and line.startswith("data:"):
+                    first_byte = time.perf_counter() - started
+                if line.startswith("event: done"):
+                    ok = True
+                elif line.startswith("event: error"):
+                    error = "stream error event"
+        return ok, first_byte, None, error if not ok else None
+
+    def _upload(self, n):
+        name, content = self.pdfs[n % len(self.pdfs)]
+        # A fresh filename per request, so every upload is embedded rather than skipped by the ledger
+        filename = f"{os.path.splitext(name)[0]}-bench{n}.pdf"
+        response = self._session().post(f"{self.base_url}/user_upload", timeout=120,
+                                        files={"file": (filename, content, "application/pdf")},
+                                        data={"session_id": f"bench-upload-{n}"})
+        ok = response.status_code == 202
+        return ok, None, response.json().get("job_id") if ok else None, None if ok else f"HTTP {response.status_code}"
+
+    def _add_url(self, n):
+        response = self._session().post(f"{self.base_url}/user_add_url", timeout=60,
+                                        json={"url": f"{self.site_url}/kb/{n}", "session_id": f"bench-url-{n}"})
+        ok = response.status_code == 202
+        return ok, None, response.json().get("job_id") if ok else None, None if ok else f"HTTP {response.status_code}"
+
+    def one(self):
+        n = next(self._sequence)
+        scenario = self.scenarios[n % len(self.scenarios)]
+        started = time.perf_counter()
+        try:
+            if scenario in ("chat", "stream"):
+                ok, first_byte, job_id, error = self._chat(n, scenario == "stream")
+            elif scenario == "upload":
+                ok, first_byte, job_id, error = self._upload(n)
+            else:
+                ok, first_byte, job_id, error = self._add_url(n)
+        except requests.RequestException as e:
+            ok, first_byte, job_id, error = False, None, None, type(e).__name__
+        self.recorder.add(scenario, time.perf_counter() - started, ok, first_byte, job_id, error)
+
+    def run(self, concurrency, total=None, duration=None):
+        """Run until ``total`` requests were issued or ``duration`` seconds passed"""
+        deadline = time.perf_counter() + duration if duration else None
+        issued = itertools.count()
+
+        def worker():
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if total is not None and next(issued) >= total:
+                    return
+                self.one()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        return time.perf_counter() - started
+
+
+def wait_for_jobs(base_url, job_ids, timeout):
+    """Poll the ingestion jobs until they finish; returns their queue-to-done durations"""
+    pending = set(job_ids)
+    durations, failed = [], 0
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        for job_id in list(pending):
+            job = requests.get(f"{base_url}/api/jobs/{job_id}", timeout=30).json()
+            if job.get("status") in ("done", "failed"):
+                pending.discard(job_id)
+                if job["status"] == "failed":
+                    failed += 1
+                elif job.get("finished_at") and job.get("created_at"):
+                    durations.append((datetime.fromisoformat(job["finished_at"]) -
+                                      datetime.fromisoformat(job["created_at"])).total_seconds())
+        if pending:
+            time.sleep(0.25)
+    return durations, failed, len(pending)
+
+
+def start_app(workdir, env, port, timeout):
+    """Start the Flask app (threaded dev server) in ``workdir`` and wait for /readyz"""
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); import app; "
+            f"app.app.run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)")
+    log = open(os.path.join(workdir, "app.log"), "w")
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"App exited during startup, see {log.name}")
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"App not ready after {timeout}s, see {log.name}")
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat and ingestion routes offline")
+    parser.add_argument("--scenario", default="chat",
+                        help=f"comma-separated mix of {', '.join(SCENARIOS)} (requests alternate between them)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead of a request count")
+    parser.add_argument("--warmup", type=int, default=10, help="unrecorded requests before the measured run")
+    parser.add_argument("--turns", type=int, default=1, help="chat messages per session (exercises memory)")
+    parser.add_argument("--target", help="base URL of an already running app; skips starting one")
+    parser.add_argument("--data", default=os.path.join(ROOT, "data"), help="PDFs to seed the index and upload")
+    parser.add_argument("--no-seed", action="store_true", help="don't upload --data before the chat load")
+    parser.add_argument("--wait-jobs", action="store_true",
+                        help="after the load, wait for upload/url ingestion jobs and report their durations")
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--cache", action="store_true",
+                        help="leave the semantic answer cache on (off by default so every chat reaches the LLM)")
+    parser.add_argument("--vector-store", choices=("pinecone", "local"), default="pinecone",
+                        help="fake Pinecone server, or the app's local memory-mapped index")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--vector-latency", type=float, default=0.02)
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory (database, app.log)")
+    parser.add_argument("--label", help="free-form note stored with the results")
+    parser.add_argument("--output", help="results file (default benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenario.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown or not scenarios:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown)) or '(none)'}")
+    pdfs = sorted(glob.glob(os.path.join(args.data, "*.pdf")))
+    if "upload" in scenarios and not pdfs:
+        parser.error(f"no PDFs in {args.data} for the upload scenario")
+
+    openrouter = FakeOpenRouter(args.llm_latency, args.ttft, args.tokens_per_sec, args.answer_tokens,
+                                args.llm_error_rate).start()
+    pinecone = FakePinecone(args.vector_latency).start()
+    site = FakeSite(args.site_latency).start()
+
+    workdir = process = None
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            workdir = tempfile.mkdtemp(prefix="helpdesk-load-")
+            env = dict(os.environ,
+                       OPENROUTER_URL=openrouter.chat_url, OPENROUTER_API_KEY="bench",
+                       PINECONE_HOST=pinecone.url, PINECONE_API_KEY="bench",
+                       VECTOR_STORE=args.vector_store, LOCAL_INDEX_DIR=os.path.join(workdir, "vector_index"),
+                       CRAWL_REFRESH_INTERVAL="0")
+            if not args.cache:
+                env["SEMANTIC_CACHE_THRESHOLD"] = "2"  # cosine similarity never reaches it
+            t0 = time.perf_counter()
+            process, base_url = start_app(workdir, env, free_port(), args.startup_timeout)
+            print(f"App ready in {time.perf_counter() - t0:.1f}s (scratch dir {workdir})")
+
+        if pdfs and not args.no_seed and set(scenarios) & {"chat", "stream"}:
+            seeder = LoadGenerator(base_url, ["upload"], pdfs, first=-len(pdfs))
+            seeder.run(1, total=len(pdfs))
+            durations, failed, _ = wait_for_jobs(base_url, seeder.recorder.job_ids.get("upload", []), args.job_timeout)
+            print(f"Seeded the index with {len(durations)} PDFs ({failed} failed)")
+
+        if args.warmup:
+            warmup = LoadGenerator(base_url, scenarios, pdfs, site.url, args.turns)
+            warmup.run(min(args.concurrency, args.warmup), total=args.warmup)
+            # Don't let warm-up ingestion jobs queue ahead of the measured ones
+            wait_for_jobs(base_url, [job_id for ids in warmup.recorder.job_ids.values() for job_id in ids],
+                          args.job_timeout)
+
+        generator = LoadGenerator(base_url, scenarios, pdfs, site.url, args.turns, first=args.warmup)
+        upstream_before = openrouter.requests
+        elapsed = generator.run(args.concurrency, total=None if args.duration else args.requests,
+                                duration=args.duration)
+        load_finished = time.perf_counter()
+
+        results = {"elapsed": round(elapsed, 3), "scenarios": {}}
+        recorder = generator.recorder
+        print(f"\n{'scenario':<10}{'ok':>7}{'errors':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ttfb p50':>10}")
+        for scenario in scenarios:
+            samples = recorder.samples.get(scenario, {"latency": [], "first_byte": []})
+            errors = recorder.errors.get(scenario, {})
+            summary = summarize(samples["latency"])
+            entry = {
+                "ok": len(samples["latency"]),
+                "errors": sum(errors.values()),
+                "error_kinds": errors,
+                "requests_per_sec": round(len(samples["latency"]) / elapsed, 2),
+                "latency": summary
+            }
+            if samples["first_byte"]:
+                entry["first_byte"] = summarize(samples["first_byte"])
+            results["scenarios"][scenario] = entry
+            first_byte = f"{entry['first_byte']['p50_ms']:.0f}ms" if "first_byte" in entry else "-"
+            print(f"{scenario:<10}{entry['ok']:>7}{entry['errors']:>8}{entry['requests_per_sec']:>9.1f}"
+                  f"{summary['p50_ms']:>7.0f}ms{summary['p95_ms']:>7.0f}ms{summary['p99_ms']:>7.0f}ms{first_byte:>10}")
+
+        if args.wait_jobs:
+            for scenario in ("upload", "url"):
+                job_ids = recorder.job_ids.get(scenario)
+                if not job_ids:
+                    continue
+                durations, failed, unfinished = wait_for_jobs(base_url, job_ids, args.job_timeout)
+                # From the start of the load until this scenario's jobs were all finished
+                drained = elapsed + time.perf_counter() - load_finished
+                results["scenarios"][scenario]["jobs"] = {
+                    "done": len(durations), "failed": failed, "unfinished": unfinished,
+                    "jobs_per_sec": round(len(durations) / drained, 2),
+                    "queue_to_done": summarize(durations)
+                }
+                print(f"{scenario} jobs: {len(durations)} done, {failed} failed, {unfinished} unfinished, "
+                      f"{len(durations) / drained:.2f} jobs/s")
+
+        results["upstream"] = {
+            "openrouter_requests": openrouter.requests - upstream_before,
+            "pinecone_requests": pinecone.requests,
+            "site_requests": site.requests
+        }
+        try:
+            results["server_metrics"] = requests.get(f"{base_url}/metrics", timeout=10).json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not read {base_url}/metrics: {e}")
+
+        config = {key: value for key, value in vars(args).items() if key not in ("output", "label")}
+        config["scenarios"] = scenarios
+        save_results("load", config, results, args.output, args.label)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for service in (openrouter, pinecone, site):
+            service.stop()
+        if workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Semantic answer cache keyed on query embeddings
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+
+
+class SemanticCache:
+    """LRU cache of answers looked up by cosine similarity of the question.
+
+    A lookup returns the cached answer of the most similar question when its
+    similarity is at least ``threshold`` and the entry is younger than
+    ``ttl`` seconds. ``invalidate`` drops everything, e.g. when the
+    knowledge base changes.
+
+    Question vectors live in one preallocated ``max_size`` x dimension
+    matrix, so a lookup is a single matrix-vector product; entries are
+    written into free rows on ``put`` and their rows freed on expiry or
+    eviction. A question already answered by a live entry is not stored
+    again.
+    """
+
+    def __init__(self, threshold=CACHE_THRESHOLD, ttl=CACHE_TTL, max_size=CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()   # row -> entry, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.duplicates = 0
+        self._vectors = None           # allocated on the first put, once the dimension is known
+        self._created = np.zeros(max_size, dtype=np.float64)
+        self._alive = np.zeros(max_size, dtype=bool)
+        self._free = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _release(self, row):
+        del self.entries[row]
+        self._alive[row] = False
+        self._free.append(row)
+
+    def _expire(self, now):
+        for row in np.flatnonzero(self._alive & (self._created < now - self.ttl)).tolist():
+            self._release(row)
+
+    def _best(self, query):
+        # (row, score) of the most similar live entry, or (None, -inf)
+        if self._vectors is None or not self.entries:
+            return None, float("-inf")
+        scores = self._vectors @ query
+        scores[~self._alive] = -np.inf
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def get(self, vector):
+        """Return the cached answer for a similar question, or None"""
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire(time.time())
+            row, score = self._best(query)
+            if row is None or score < self.threshold:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(row)
+            self.hits += 1
+            return self.entries[row]["answer"]
+
+    def put(self, vector, question, answer):
+        if self.max_size <= 0:
+            return
+        vector = self._normalize(vector)
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if self._best(vector)[1] >= self.threshold:
+                # Lookups already reach an answer for this question
+                self.duplicates += 1
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            if not self._free:
+                self._release(next(iter(self.entries)))
+                self.evictions += 1
+
+            row = self._free.pop()
+            self._vectors[row] = vector
+            self._created[row] = now
+            self._alive[row] = True
+            self.entries[row] = {"question": question, "answer": answer}
+
+    def invalidate(self):
+        with self._lock:
+            self.entries.clear()
+            self._alive[:] = False
+            self._free = list(range(self.max_size - 1, -1, -1))
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "duplicates": self.duplicates,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+                "ttl": self.ttl
+            }
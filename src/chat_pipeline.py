@@ -0,0 +1,91 @@
+# Event-loop chat pipeline: many chats in flight on one loop, blocking work on a small pool
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CHAT_PIPELINE_WORKERS = int(os.getenv("CHAT_PIPELINE_WORKERS", "16"))
+
+
+class ChatPipeline:
+    """Runs chat turns as coroutines on one background event loop.
+
+    Request threads hand a coroutine to ``run`` (or an async generator to
+    ``iterate``) and block until it finishes, so the WSGI request thread is
+    still held for the whole turn. Only the turn's own fan-out is off that
+    thread: awaiting the LLM holds no pool thread, and blocking steps
+    (SQLite, the embedding service, vector search) go through ``call``,
+    which runs them on a bounded thread pool so independent steps of one
+    turn overlap.
+    """
+
+    def __init__(self, workers=CHAT_PIPELINE_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-pipeline")
+        self.loop = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="chat-loop", daemon=True)
+                self._thread.start()
+        return self.loop
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking function on the pipeline's thread pool"""
+        return await self.loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _tracked(self, awaitable):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            result = await awaitable
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return result
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result from this thread"""
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(self._tracked(coro), loop).result(timeout)
+
+    def iterate(self, agen):
+        """Drive an async generator on the loop, yielding its items to this thread"""
+        loop = self.start()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            while True:
+                try:
+                    item = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    break
+                yield item
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            # Also runs when the client disconnects, so the generator's cleanup happens
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+            self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "failed": self.failed
+        }
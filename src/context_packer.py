@@ -0,0 +1,162 @@
+# Prompt context assembly: similarity floor, MMR diversity, adjacent-chunk merging and a token budget
+
+import os
+
+import numpy as np
+
+from src.memory import estimate_tokens, truncate_tokens
+
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+CONTEXT_MIN_SIMILARITY = float(os.getenv("CONTEXT_MIN_SIMILARITY", "0.25"))
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.95"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+# What the prompt used to get: the top three retrieved chunks, joined as they were
+BASELINE_CHUNKS = 3
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def candidate_vectors(matches, vector_store):
+    """Unit vectors for ``matches``: the values the vector query returned,
+    plus one ``fetch`` for hits that came from keyword search only"""
+    vectors = {match.id: match.values for match in matches if match.values is not None}
+    missing = [match.id for match in matches if match.values is None]
+    if missing:
+        try:
+            vectors.update(vector_store.fetch(missing))
+        except Exception as e:
+            print(f"Error fetching candidate vectors: {e}")
+    return {vector_id: unit(vector) for vector_id, vector in vectors.items()}
+
+
+def mmr(similarities, redundancy, lambda_=CONTEXT_MMR_LAMBDA, max_chunks=CONTEXT_MAX_CHUNKS,
+        duplicate_similarity=CONTEXT_DUPLICATE_SIMILARITY):
+    """Maximal marginal relevance over candidate positions.
+
+    Repeatedly picks the candidate maximizing
+    ``lambda * sim(query, d) - (1 - lambda) * max sim(d, selected)``.
+    Candidates at least ``duplicate_similarity`` to a selected one are
+    dropped outright. Returns (selected positions, dropped count).
+    """
+    remaining = list(range(len(similarities)))
+    selected = []
+    dropped = 0
+    while remaining and len(selected) < max_chunks:
+        def score(i):
+            penalty = max((redundancy[i, j] for j in selected), default=0.0)
+            return lambda_ * similarities[i] - (1 - lambda_) * penalty
+
+        best = max(remaining, key=score)
+        remaining.remove(best)
+        selected.append(best)
+        duplicates = [i for i in remaining if redundancy[i, best] >= duplicate_similarity]
+        for i in duplicates:
+            remaining.remove(i)
+        dropped += len(duplicates)
+    return selected, dropped
+
+
+def document_key(metadata):
+    return metadata.get("source"), metadata.get("filename") or metadata.get("url") or metadata.get("name")
+
+
+def merge_adjacent(matches):
+    """Group matches (in rank order) into passages, joining consecutive chunks
+    of the same document. Returns passage texts in order of their best chunk.
+
+    PDF chunks are contiguous slices of the page text and are joined as-is;
+    section chunks from web pages are joined on a newline.
+    """
+    runs = {}
+    for rank, match in enumerate(matches):
+        index = match.metadata.get("chunk_index")
+        key = document_key(match.metadata)
+        if index is None or key == (None, None):
+            key, index = ("match", match.id), 0
+        runs.setdefault(key, []).append((index, rank, match))
+
+    passages = []
+    for chunks in runs.values():
+        chunks.sort(key=lambda chunk: chunk[0])
+        run = [chunks[0]]
+        for chunk in chunks[1:]:
+            if chunk[0] == run[-1][0] + 1:
+                run.append(chunk)
+            else:
+                passages.append(run)
+                run = [chunk]
+        passages.append(run)
+
+    texts = []
+    for run in sorted(passages, key=lambda run: min(rank for _, rank, _ in run)):
+        separator = "" if "page_start" in run[0][2].metadata else "\n"
+        texts.append((separator.join(match.metadata.get("text", "") for _, _, match in run), len(run)))
+    return texts
+
+
+def pack_context(query_vector, matches, vectors, token_budget=CONTEXT_TOKEN_BUDGET,
+                 min_similarity=CONTEXT_MIN_SIMILARITY, lambda_=CONTEXT_MMR_LAMBDA,
+                 max_chunks=CONTEXT_MAX_CHUNKS, duplicate_similarity=CONTEXT_DUPLICATE_SIMILARITY):
+    """Assemble the prompt context from over-fetched ``matches`` (best first).
+
+    Matches less similar to the query than ``min_similarity`` are dropped,
+    MMR picks up to ``max_chunks`` diverse ones, adjacent chunks of the same
+    document are merged, and passages are packed best first into
+    ``token_budget`` (the first one is truncated if it alone is too long).
+    ``vectors`` maps match ids to unit vectors; matches without one keep
+    their rank but skip the floor. Returns ``(context, stats)``.
+    """
+    matches = [match for match in matches if match.metadata.get("text")]
+    baseline = estimate_tokens("\n".join(match.metadata["text"] for match in matches[:BASELINE_CHUNKS]))
+    stats = {"candidates": len(matches), "below_floor": 0, "redundant": 0, "over_budget": 0,
+             "chunks": 0, "passages": 0, "tokens": 0, "baseline_tokens": baseline, "saved_tokens": baseline}
+    if not matches:
+        return "", stats
+
+    query = unit(query_vector)
+    similarities = [float(vectors[m.id] @ query) if m.id in vectors else None for m in matches]
+    kept = [i for i, similarity in enumerate(similarities) if similarity is None or similarity >= min_similarity]
+    stats["below_floor"] = len(matches) - len(kept)
+    matches = [matches[i] for i in kept]
+    # Without a vector, rank stands in for relevance: just below the weakest scored match
+    scored = [similarities[i] for i in kept if similarities[i] is not None]
+    fallback = min(scored, default=min_similarity)
+    relevance = [similarities[i] if similarities[i] is not None else fallback for i in kept]
+
+    redundancy = np.zeros((len(matches), len(matches)), dtype=np.float32)
+    present = [i for i, match in enumerate(matches) if match.id in vectors]
+    if present:
+        block = np.stack([vectors[matches[i].id] for i in present])
+        redundancy[np.ix_(present, present)] = block @ block.T
+    selected, stats["redundant"] = mmr(relevance, redundancy, lambda_, max_chunks, duplicate_similarity)
+
+    parts = []
+    used = 0
+    for text, count in merge_adjacent([matches[i] for i in selected]):
+        tokens = estimate_tokens(text)
+        if not parts and tokens > token_budget:
+            text, tokens = truncate_tokens(text, token_budget, keep="start"), token_budget
+        elif used + tokens > token_budget:
+            stats["over_budget"] += count
+            continue
+        parts.append(text)
+        used += tokens
+        stats["chunks"] += count
+    context = "\n\n".join(parts)
+
+    stats["passages"] = len(parts)
+    stats["tokens"] = estimate_tokens(context)
+    stats["saved_tokens"] = baseline - stats["tokens"]
+    return context, stats
+
+
+def format_pack_stats(stats):
+    return (f"{stats['tokens']} context tokens ({stats['saved_tokens']} saved vs. top {BASELINE_CHUNKS}): "
+            f"{stats['chunks']} of {stats['candidates']} chunks in {stats['passages']} passages, "
+            f"{stats['below_floor']} below floor, {stats['redundant']} redundant, {stats['over_budget']} over budget")
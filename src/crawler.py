@@ -0,0 +1,157 @@
+# Concurrent, bounded web page fetching with conditional re-fetch and sitemap expansion
+
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+CRAWL_CONNECT_TIMEOUT = float(os.getenv("CRAWL_CONNECT_TIMEOUT", "5"))
+CRAWL_READ_TIMEOUT = float(os.getenv("CRAWL_READ_TIMEOUT", "15"))
+CRAWL_TOTAL_TIMEOUT = float(os.getenv("CRAWL_TOTAL_TIMEOUT", "30"))
+CRAWL_MAX_BYTES = int(os.getenv("CRAWL_MAX_BYTES", str(5 * 1024 * 1024)))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "200"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "IT-Helpdesk-Chatbot/1.0 (+knowledge base crawler)")
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "body", "etag", "last_modified",
+                                         "content_type", "not_modified"])
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def is_sitemap(result):
+    """True for XML sitemaps and sitemap indexes"""
+    if result.not_modified or not result.body:
+        return False
+    head = result.body[:2048].lstrip().lower()
+    return b"<urlset" in head or b"<sitemapindex" in head
+
+
+def parse_sitemap(body, base_url):
+    """Return ``(page_urls, child_sitemap_urls)`` from a sitemap or sitemap index"""
+    root = ET.fromstring(body)
+    pages, sitemaps = [], []
+    for element in root:
+        tag = element.tag.rsplit("}", 1)[-1]
+        loc = next((child.text.strip() for child in element
+                    if child.tag.rsplit("}", 1)[-1] == "loc" and child.text), None)
+        if not loc:
+            continue
+        loc = urljoin(base_url, loc)
+        if tag == "sitemap":
+            sitemaps.append(loc)
+        elif tag == "url":
+            pages.append(loc)
+    return pages, sitemaps
+
+
+class Crawler:
+    """Fetches pages over a shared connection pool.
+
+    At most ``max_workers`` requests run at once and at most ``per_host`` of
+    them against any one host. Every request has connect/read timeouts plus
+    an overall deadline, and bodies are read in blocks and abandoned once
+    they pass ``max_bytes``. Passing a stored ETag/Last-Modified makes the
+    request conditional; a 304 comes back with ``not_modified`` set.
+    """
+
+    def __init__(self, max_workers=CRAWL_WORKERS, per_host=CRAWL_PER_HOST,
+                 connect_timeout=CRAWL_CONNECT_TIMEOUT, read_timeout=CRAWL_READ_TIMEOUT,
+                 total_timeout=CRAWL_TOTAL_TIMEOUT, max_bytes=CRAWL_MAX_BYTES):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = CRAWL_USER_AGENT
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def fetch(self, url, etag=None, last_modified=None):
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        with self._host_slot(url):
+            deadline = time.monotonic() + self.total_timeout
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304:
+                    return FetchResult(url, 304, None, etag, last_modified, None, True)
+                response.raise_for_status()
+
+                declared = response.headers.get("Content-Length")
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    raise ResponseTooLarge(f"{url} is {int(declared)} bytes (limit {self.max_bytes})")
+
+                blocks, size = [], 0
+                for block in response.iter_content(64 * 1024):
+                    size += len(block)
+                    if size > self.max_bytes:
+                        raise ResponseTooLarge(f"{url} exceeds {self.max_bytes} bytes")
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{url} took longer than {self.total_timeout}s")
+                    blocks.append(block)
+
+                return FetchResult(
+                    response.url, response.status_code, b"".join(blocks),
+                    response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                    response.headers.get("Content-Type", ""), False
+                )
+
+    def fetch_many(self, items):
+        """Fetch ``(url, etag, last_modified)`` items concurrently.
+
+        Yields ``(item, result, error)`` as each request finishes, so callers
+        can start processing the first pages while the rest are in flight.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crawl") as pool:
+            futures = {pool.submit(self.fetch, *item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def expand_sitemap(self, url, result=None, max_pages=CRAWL_MAX_PAGES):
+        """Page URLs listed by a sitemap, following sitemap indexes, up to ``max_pages``"""
+        pages, seen = [], {url}
+        pending = [(url, result)]
+        while pending and len(pages) < max_pages:
+            sitemap_url, fetched = pending.pop(0)
+            try:
+                fetched = fetched or self.fetch(sitemap_url)
+                page_urls, child_sitemaps = parse_sitemap(fetched.body, sitemap_url)
+            except Exception as e:
+                print(f"Error reading sitemap {sitemap_url}: {e}")
+                continue
+            for page_url in page_urls:
+                if page_url not in seen:
+                    seen.add(page_url)
+                    pages.append(page_url)
+            for child in child_sitemaps:
+                if child not in seen:
+                    seen.add(child)
+                    pending.append((child, None))
+        return pages[:max_pages]
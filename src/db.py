@@ -0,0 +1,174 @@
+# SQLite connection helpers and the write-behind writer for hot-path writes
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "10000"))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.2"))
+
+
+def connect(database, **kwargs):
+    """Open a connection with the per-connection pragmas the app relies on"""
+    db = sqlite3.connect(database, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, **kwargs)
+    db.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    # Safe with WAL: a crash can lose the last commits but never corrupts the file
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA temp_store = MEMORY")
+    db.execute("PRAGMA cache_size = -16000")
+    return db
+
+
+def enable_wal(db):
+    """Switch the database file to write-ahead logging (persists across connections)"""
+    mode = db.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    db.execute("PRAGMA wal_autocheckpoint = 1000")
+    return mode
+
+
+def apply_migrations(db, migrations):
+    """Run the migrations newer than the database's ``user_version``.
+
+    ``migrations`` is an ordered list of SQL statement lists; migration N
+    (1-based) brings the schema to version N.
+    """
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(migrations, start=1):
+        if number <= version:
+            continue
+        with db:
+            for statement in statements:
+                db.execute(statement)
+            db.execute(f"PRAGMA user_version = {number}")
+        print(f"Applied schema migration {number}")
+
+
+class WriteBehindWriter:
+    """Single writer thread that applies queued statements in batched transactions.
+
+    Request handlers call ``submit`` and return without touching SQLite. The
+    queue is bounded: when it is full ``submit`` blocks for up to
+    ``put_timeout`` seconds before the write is dropped and counted. ``close``
+    drains everything that is still queued. ``on_batch(size, seconds)`` is
+    called after each committed batch.
+    """
+
+    _STOP = object()
+
+    def __init__(self, database, max_queue=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, put_timeout=1.0, on_batch=None):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.on_batch = on_batch
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, sql, params=()):
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put((sql, params), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Write-behind queue full, dropped write: {' '.join(sql.split()[:3])}")
+
+    def flush(self):
+        """Block until everything submitted so far has been committed"""
+        self.queue.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        db = connect(self.database)
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch = []
+            if item is self._STOP:
+                stopping = True
+            else:
+                batch.append(item)
+
+            # Gather whatever else arrives within the flush window
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if stopping:
+                # Drain the rest on shutdown
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not self._STOP:
+                        batch.append(item)
+                    else:
+                        self.queue.task_done()
+
+            if batch:
+                self._write(db, batch)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self.queue.task_done()
+        db.close()
+
+    def _write(self, db, batch):
+        started = time.perf_counter()
+        try:
+            with db:
+                for sql, params in batch:
+                    db.execute(sql, params)
+            self.written += len(batch)
+            self.batches += 1
+            if self.on_batch:
+                self.on_batch(len(batch), time.perf_counter() - started)
+        except sqlite3.Error as e:
+            # Fall back to one transaction per statement so one bad row doesn't lose the batch
+            print(f"Write-behind batch failed ({e}), retrying individually")
+            for sql, params in batch:
+                try:
+                    with db:
+                        db.execute(sql, params)
+                    self.written += 1
+                except sqlite3.Error as e:
+                    self.errors += 1
+                    print(f"Write-behind statement failed: {e}")
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
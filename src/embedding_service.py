@@ -0,0 +1,190 @@
+# Dynamic micro-batching of concurrent embedding requests on one shared model
+
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_BULK_SLICE = int(os.getenv("EMBED_BULK_SLICE", "32"))
+
+INTERACTIVE = 0
+BULK = 1
+
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def bucket_label(value):
+    for bound in HISTOGRAM_BUCKETS:
+        if value <= bound:
+            return f"<={bound}"
+    return f">{HISTOGRAM_BUCKETS[-1]}"
+
+
+class _Request:
+    __slots__ = ("texts", "future", "results", "done", "enqueued_at")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.results = []
+        self.done = 0
+        self.enqueued_at = time.perf_counter()
+
+
+class _PriorityEncoder:
+    """``encode``-compatible view of the service at a fixed priority"""
+
+    def __init__(self, service, priority):
+        self.service = service
+        self.priority = priority
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        return self.service.encode(texts, priority=self.priority)
+
+
+class EmbeddingService:
+    """Runs every embedding request through one worker thread in batches.
+
+    Interactive requests (single chat queries) arriving within
+    ``max_wait_ms`` of each other, up to ``max_batch`` texts, share one
+    forward pass. Bulk requests (ingestion) are encoded ``bulk_slice`` texts
+    at a time and yield to interactive requests between slices, so a large
+    upload never holds chat queries behind it. ``encode`` mirrors
+    ``SentenceTransformer.encode`` for a string or a list of strings.
+    """
+
+    def __init__(self, load_model, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS,
+                 bulk_slice=EMBED_BULK_SLICE):
+        self.load_model = load_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.bulk_slice = bulk_slice
+        self.bulk = _PriorityEncoder(self, BULK)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.errors = 0
+        self.wait_time = 0.0
+        self.encode_time = 0.0
+        self.batch_sizes = {}
+        self.queue_depths = {}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                self._thread.start()
+
+    def encode(self, texts, priority=INTERACTIVE, **kwargs):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._thread is None:
+            self._start()
+        request = _Request(batch)
+        self._queue.put((priority, next(self._seq), request))
+        vectors = request.future.result()
+        return vectors[0] if single else vectors
+
+    def _take_interactive(self, first):
+        """Collect interactive requests that arrive within the batching window"""
+        requests = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] != INTERACTIVE or size + len(item[2].texts) > self.max_batch:
+                self._queue.put(item)
+                break
+            requests.append(item[2])
+            size += len(item[2].texts)
+        return requests
+
+    def _record(self, size, depth, started):
+        with self._stats_lock:
+            self.batches += 1
+            self.texts += size
+            self.encode_time += time.perf_counter() - started
+            label = bucket_label(size)
+            self.batch_sizes[label] = self.batch_sizes.get(label, 0) + 1
+            label = bucket_label(depth) if depth else "0"
+            self.queue_depths[label] = self.queue_depths.get(label, 0) + 1
+
+    def _run(self):
+        model = None
+        while True:
+            priority, seq, request = self._queue.get()
+            depth = self._queue.qsize()
+            try:
+                model = model or self.load_model()
+            except Exception as e:
+                self.errors += 1
+                request.future.set_exception(e)
+                continue
+
+            if priority == INTERACTIVE:
+                requests = self._take_interactive(request)
+                texts = [text for r in requests for text in r.texts]
+                started = time.perf_counter()
+                with self._stats_lock:
+                    self.wait_time += sum(started - r.enqueued_at for r in requests)
+                try:
+                    vectors = np.asarray(model.encode(texts, batch_size=len(texts)))
+                except Exception as e:
+                    self.errors += 1
+                    for r in requests:
+                        r.future.set_exception(e)
+                    continue
+                self._record(len(texts), depth, started)
+                offset = 0
+                for r in requests:
+                    r.future.set_result(vectors[offset:offset + len(r.texts)])
+                    offset += len(r.texts)
+                continue
+
+            # Bulk: one slice, then back in line behind any interactive requests
+            texts = request.texts[request.done:request.done + self.bulk_slice]
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(model.encode(texts, batch_size=len(texts)))
+            except Exception as e:
+                self.errors += 1
+                request.future.set_exception(e)
+                continue
+            self._record(len(texts), depth, started)
+            request.results.append(vectors)
+            request.done += len(texts)
+            if request.done < len(request.texts):
+                self._queue.put((priority, seq, request))
+            else:
+                with self._stats_lock:
+                    self.wait_time += started - request.enqueued_at
+                request.future.set_result(np.concatenate(request.results))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "errors": self.errors,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "avg_encode_ms": round(self.encode_time / self.batches * 1000, 2) if self.batches else 0.0,
+                "batch_size_histogram": dict(self.batch_sizes),
+                "queue_depth_histogram": dict(self.queue_depths)
+            }
@@ -0,0 +1,104 @@
+# Push dashboard stats and new chat activity to connected admin dashboards
+
+import queue
+import threading
+import time
+
+from src.db import connect
+
+STATS_COUNTERS = ("total_chats", "active_sessions", "knowledge_items", "api_keys")
+
+
+def read_counters(cursor):
+    cursor.execute("SELECT name, value FROM counters")
+    values = dict(cursor.fetchall())
+    return {name: values.get(name, 0) for name in STATS_COUNTERS}
+
+
+class StatsBroadcaster:
+    """One background poller shared by every open dashboard.
+
+    The thread reads the ``counters`` table and any ``chat_logs`` rows newer
+    than the last one it saw, and only when something changed pushes a
+    ``stats`` and/or ``activity`` event to each subscriber's queue. Database
+    work per interval is constant no matter how many tabs are connected, and
+    the poller sleeps while there are no subscribers.
+    """
+
+    def __init__(self, database, interval=2.0, extra_stats=None, max_pending=100):
+        self.database = database
+        self.interval = interval
+        self.extra_stats = extra_stats
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_stats = None
+        self._last_log_id = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._last_stats is not None:
+                subscriber.put_nowait(("stats", self._last_stats))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stats-broadcaster", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client misses deltas; it still gets the next stats snapshot
+                pass
+
+    def _poll(self, db):
+        cursor = db.cursor()
+        stats = read_counters(cursor)
+        if self.extra_stats:
+            stats.update(self.extra_stats())
+        if stats != self._last_stats:
+            self._last_stats = stats
+            self._publish("stats", stats)
+
+        if self._last_log_id is None:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat_logs")
+            self._last_log_id = cursor.fetchone()[0]
+            return
+        cursor.execute("""
+            SELECT id, timestamp, session_id, user_message, response_time
+            FROM chat_logs WHERE id > ? ORDER BY id LIMIT 50
+        """, (self._last_log_id,))
+        rows = cursor.fetchall()
+        if rows:
+            self._last_log_id = rows[-1][0]
+            self._publish("activity", [{
+                "timestamp": row[1],
+                "session_id": row[2],
+                "user_message": row[3][:100] + "..." if len(row[3]) > 100 else row[3],
+                "response_time": f"{row[4]:.1f}s" if row[4] else "N/A"
+            } for row in rows])
+
+    def _run(self):
+        db = connect(self.database)
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # Resync from the latest row when a dashboard connects again
+                self._last_log_id = None
+            else:
+                try:
+                    self._poll(db)
+                except Exception as e:
+                    print(f"Stats broadcaster error: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,247 @@
+# Streaming, size-bounded HTML to text extraction that keeps the main content
+
+import codecs
+import os
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+HTML_MAX_PARSE_BYTES = int(os.getenv("HTML_MAX_PARSE_BYTES", str(2 * 1024 * 1024)))
+HTML_FEED_BLOCK = 64 * 1024
+
+# Never content, whatever they contain
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+             "nav", "header", "footer", "aside", "form", "button", "select", "dialog", "menu"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+BLOCK_TAGS = {"address", "article", "blockquote", "dd", "div", "dl", "dt", "figcaption", "figure",
+              "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre", "section",
+              "table", "tbody", "td", "th", "thead", "tr", "ul", "br", "caption", "summary", "details"}
+# Elements whose end tag may be omitted, and the start tags that close them implicitly
+_P_CLOSERS = {"address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset", "figure",
+              "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "menu",
+              "nav", "ol", "p", "pre", "section", "table", "ul"}
+IMPLIED_END = {"li": {"li"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"}, "p": _P_CLOSERS,
+               "tr": {"tr", "tbody", "tfoot"}, "td": {"td", "th", "tr", "tbody", "tfoot"},
+               "th": {"td", "th", "tr", "tbody", "tfoot"}, "option": {"option", "optgroup"}}
+# End tags of the containers that also close an open optional-end child
+IMPLIED_END_PARENTS = BLOCK_TAGS | {"body", "html", "menu", "select", "datalist", "optgroup", "tfoot"}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+MAIN_TAGS = {"main", "article"}
+
+# class/id/role values that mark page chrome rather than content
+BOILERPLATE = re.compile(
+    r"(^|[\s_-])(nav|navbar|navigation|menu|breadcrumbs?|footer|header|masthead|sidebar|"
+    r"cookie|cookies|consent|gdpr|banner|popup|modal|overlay|share|sharing|social|"
+    r"advert|ads?|promo|sponsor|newsletter|subscribe|signup|comments?|related|skip-link)($|[\s_-])",
+    re.IGNORECASE
+)
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alert"}
+
+MAX_LINK_DENSITY = 0.5
+MIN_MAIN_CHARS = 200
+
+Section = namedtuple("Section", ["heading", "text"])
+ExtractedPage = namedtuple("ExtractedPage", ["title", "sections", "truncated"])
+
+
+class _Block:
+    __slots__ = ("parts", "link_chars", "heading", "in_main")
+
+    def __init__(self, heading, in_main):
+        self.parts = []
+        self.link_chars = 0
+        self.heading = heading
+        self.in_main = in_main
+
+    def text(self):
+        return " ".join(" ".join(self.parts).split())
+
+
+class _ContentParser(HTMLParser):
+    """Collects text blocks, dropping skipped subtrees as they stream past"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.title = ""
+        self._in_title = False
+        # Open elements of the subtree being skipped, outermost first
+        self._skip = []
+        self._link_depth = 0
+        self._main_depth = 0
+        self._heading = 0
+        self._block = None
+
+    def _boilerplate(self, tag, attrs):
+        if tag == "header" and self._main_depth:
+            # An article's own header usually holds its title
+            return False
+        if tag in SKIP_TAGS:
+            return True
+        if tag in VOID_TAGS or tag in ("html", "body") or tag in MAIN_TAGS:
+            # Page-level classes ("nav-open", "has-sidebar") say nothing about the content
+            return False
+        values = dict(attrs)
+        if (values.get("role") or "").lower() in BOILERPLATE_ROLES:
+            return True
+        if values.get("aria-hidden") == "true" or "hidden" in values:
+            return True
+        marker = f"{values.get('class') or ''} {values.get('id') or ''}"
+        match = BOILERPLATE.search(marker) if marker.strip() else None
+        if match and self._main_depth and match.group(2).lower() in ("header", "masthead"):
+            return False
+        return match is not None
+
+    def _flush(self):
+        if self._block is not None and self._block.parts:
+            self.blocks.append(self._block)
+        self._block = None
+
+    def _close_implied(self, tag):
+        """Pop skipped elements that ``tag`` closes without an end tag
+        (``<li>`` after an unclosed ``<li>``, a block after a ``<p>``)"""
+        while self._skip and tag in IMPLIED_END.get(self._skip[-1], ()):
+            self._skip.pop()
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip:
+            self._close_implied(tag)
+            if self._skip:
+                if tag not in VOID_TAGS:
+                    self._skip.append(tag)
+                return
+            # The skipped element ended implicitly; this tag is its sibling
+        if tag == "title":
+            self._in_title = True
+            return
+        if self._boilerplate(tag, attrs):
+            if tag not in VOID_TAGS:
+                self._skip = [tag]
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in HEADING_TAGS:
+            self._heading = HEADING_TAGS[tag]
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+        if tag == "a":
+            self._link_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._skip and tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if self._skip:
+            if tag in self._skip:
+                # Also closes any optional-end children left open inside it
+                del self._skip[len(self._skip) - 1 - self._skip[::-1].index(tag):]
+                return
+            if self._skip[0] not in IMPLIED_END or tag not in IMPLIED_END_PARENTS:
+                # A stray end tag inside the skipped subtree
+                return
+            # The parent closed, and with it the unclosed skipped element
+            self._skip = []
+        if tag == "title":
+            self._in_title = False
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in HEADING_TAGS:
+            self._heading = 0
+        if tag in MAIN_TAGS and self._main_depth:
+            self._main_depth -= 1
+        if tag == "a" and self._link_depth:
+            self._link_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        if not data.strip():
+            return
+        if self._block is None:
+            self._block = _Block(self._heading, self._main_depth > 0)
+        self._block.parts.append(data)
+        if self._link_depth:
+            self._block.link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _keep(block, text):
+    if block.heading:
+        return True
+    # Link lists (menus, tag clouds, "related" rails) are mostly anchor text
+    return len(text) >= 3 and block.link_chars <= MAX_LINK_DENSITY * len(text)
+
+
+def extract_html(html, max_bytes=HTML_MAX_PARSE_BYTES, encoding="utf-8"):
+    """Extract the main text of a page as sections split at headings.
+
+    ``html`` (bytes or str) is decoded and fed to the parser in blocks, and
+    parsing stops after ``max_bytes``, so a huge page costs a bounded amount
+    of work. Script/style, page chrome (nav, header, footer, asides, cookie
+    banners and similar class/id/role markers) and link-heavy blocks are
+    dropped. When the page has a ``<main>``/``<article>`` with real text,
+    only that is kept.
+    """
+    parser = _ContentParser()
+    truncated = False
+    if isinstance(html, str):
+        fed = html[:max_bytes]
+        truncated = len(html) > max_bytes
+        for i in range(0, len(fed), HTML_FEED_BLOCK):
+            parser.feed(fed[i:i + HTML_FEED_BLOCK])
+    else:
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        limit = min(len(html), max_bytes)
+        truncated = len(html) > max_bytes
+        for i in range(0, limit, HTML_FEED_BLOCK):
+            parser.feed(decoder.decode(html[i:min(i + HTML_FEED_BLOCK, limit)]))
+        parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+
+    blocks = [(block, block.text()) for block in parser.blocks]
+    blocks = [(block, text) for block, text in blocks if text]
+    kept = [(block, text) for block, text in blocks if _keep(block, text)]
+    main = [(block, text) for block, text in kept if block.in_main]
+    if sum(len(text) for _, text in main) >= MIN_MAIN_CHARS:
+        kept = main
+    if not kept:
+        # Every block looked like a link list; keep them rather than nothing
+        kept = blocks
+
+    sections = []
+    heading, lines = "", []
+    for block, text in kept:
+        if block.heading:
+            if lines:
+                sections.append(Section(heading, "\n".join(lines)))
+            heading, lines = text, []
+        else:
+            lines.append(text)
+    if lines or heading:
+        sections.append(Section(heading, "\n".join(lines)))
+
+    return ExtractedPage(" ".join(parser.title.split()), sections, truncated)
+
+
+def charset(content_type, default="utf-8"):
+    """Charset from a Content-Type header value"""
+    match = re.search(r"charset=[\"']?([\w-]+)", content_type or "", re.IGNORECASE)
+    return match.group(1) if match else default
+
+
+def page_text(page):
+    """Plain text of an extracted page, headings on their own lines"""
+    return "\n".join(filter(None, (part for section in page.sections
+                                   for part in (section.heading, section.text))))
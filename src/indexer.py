@@ -0,0 +1,218 @@
+# Incremental bulk indexing of a directory of PDFs
+
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from src.db import connect
+from src.ingest import iter_page_chunks, ingest_chunks
+from src.keyword_index import init_keyword_table
+from src.ledger import chunk_id, init_ledger_table, prune_document
+from src.pdf_extract import iter_pdf_pages_parallel
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def init_manifest_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS index_manifest (
+        store TEXT,
+        path TEXT,
+        mtime REAL,
+        size INTEGER,
+        sha256 TEXT,
+        chunks INTEGER,
+        indexed_at TEXT,
+        PRIMARY KEY (store, path)
+    )''')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_pdfs(directory):
+    """Map each PDF under ``directory`` (relative, '/'-separated path) to its absolute path"""
+    found = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                found[os.path.relpath(path, directory).replace(os.sep, "/")] = path
+    return found
+
+
+class PoolEncoder:
+    """Spreads ``encode`` calls over a sentence-transformers multi-process pool"""
+
+    def __init__(self, model, processes):
+        self.model = model
+        self.pool = model.start_multi_process_pool(target_devices=["cpu"] * processes)
+
+    def encode(self, texts, batch_size=32):
+        return self.model.encode_multi_process(texts, self.pool, batch_size=batch_size)
+
+    def close(self):
+        self.model.stop_multi_process_pool(self.pool)
+
+
+class DirectoryIndexer:
+    """Keeps a vector store in sync with the PDFs in one directory.
+
+    The ``index_manifest`` table remembers each file's mtime, size and hash
+    per vector store. Unchanged files are skipped without being read; a file
+    whose mtime moved but whose hash did not is only re-stamped. New and changed files go
+    through the same page extraction, chunking and content-addressed ids as
+    admin uploads (doc key ``pdf:<relative path>``), so chunks that survived an
+    edit are found in the chunk ledger and not re-embedded, and ids that no
+    longer occur are deleted. Files removed from the directory have all of
+    their vectors deleted.
+    """
+
+    def __init__(self, database, directory, vector_store, embedding_model, ledger,
+                 keyword_index=None, embed_batch_size=None):
+        self.database = database
+        self.directory = directory
+        self.vector_store = vector_store
+        self.embedding_model = embedding_model
+        self.ledger = ledger
+        self.keyword_index = keyword_index
+        self.embed_batch_size = embed_batch_size
+
+        db = connect(database)
+        try:
+            cursor = db.cursor()
+            init_manifest_table(cursor)
+            init_ledger_table(cursor)
+            init_keyword_table(cursor)
+            db.commit()
+        finally:
+            db.close()
+
+    def _manifest(self):
+        db = connect(self.database)
+        try:
+            rows = db.execute("SELECT path, mtime, size, sha256 FROM index_manifest WHERE store = ?",
+                              (self.ledger.store_key,)).fetchall()
+            return {row[0]: {"mtime": row[1], "size": row[2], "sha256": row[3]} for row in rows}
+        finally:
+            db.close()
+
+    def _save(self, rel_path, stat, sha256, chunks):
+        db = connect(self.database)
+        try:
+            db.execute("""
+                INSERT INTO index_manifest (store, path, mtime, size, sha256, chunks, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(store, path) DO UPDATE SET
+                    mtime = excluded.mtime, size = excluded.size, sha256 = excluded.sha256,
+                    chunks = COALESCE(excluded.chunks, chunks), indexed_at = excluded.indexed_at
+            """, (self.ledger.store_key, rel_path, stat.st_mtime, stat.st_size, sha256, chunks, datetime.utcnow().isoformat()))
+            db.commit()
+        finally:
+            db.close()
+
+    def _forget(self, rel_path):
+        db = connect(self.database)
+        try:
+            db.execute("DELETE FROM index_manifest WHERE store = ? AND path = ?", (self.ledger.store_key, rel_path))
+            db.commit()
+        finally:
+            db.close()
+
+    def _prune(self, doc_key, keep_ids=()):
+        return prune_document(self.ledger, self.vector_store, self.keyword_index, doc_key, keep_ids)
+
+    def index_file(self, rel_path, path):
+        """Index one file; returns the ingest stats plus the number of stale vectors removed"""
+        doc_key = f"pdf:{rel_path}"
+        filename = os.path.basename(rel_path)
+        current = set()
+
+        def make_id(chunk):
+            chunk_key = chunk_id(doc_key, chunk)
+            current.add(chunk_key)
+            return chunk_key
+
+        stats = ingest_chunks(
+            iter_page_chunks(iter_pdf_pages_parallel(path)),
+            self.vector_store, self.embedding_model,
+            make_id=make_id,
+            make_metadata=lambda chunk: {"text": chunk, "source": "admin", "filename": filename},
+            embed_batch_size=self.embed_batch_size,
+            keyword_index=self.keyword_index,
+            ledger=self.ledger,
+            doc_key=doc_key
+        )
+        if stats["errors"]:
+            # Keep old vectors until the file indexes cleanly
+            stats["removed"] = 0
+        else:
+            stats["removed"] = self._prune(doc_key, current)
+        stats["total_chunks"] = len(current)
+        return stats
+
+    def run(self, dry_run=False):
+        """Bring the index up to date; returns a summary dict"""
+        start = time.perf_counter()
+        files = scan_pdfs(self.directory)
+        manifest = self._manifest()
+        summary = {"files": len(files), "new": 0, "changed": 0, "unchanged": 0, "deleted": 0,
+                   "failed": 0, "chunks_embedded": 0, "chunks_skipped": 0, "vectors_removed": 0,
+                   "embed_time": 0.0}
+
+        for rel_path in sorted(set(manifest) - set(files)):
+            print(f"Removed: {rel_path}")
+            summary["deleted"] += 1
+            if not dry_run:
+                summary["vectors_removed"] += self._prune(f"pdf:{rel_path}")
+                self._forget(rel_path)
+
+        for rel_path, path in sorted(files.items()):
+            stat = os.stat(path)
+            known = manifest.get(rel_path)
+            if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                summary["unchanged"] += 1
+                continue
+
+            sha256 = file_sha256(path)
+            if known and known["sha256"] == sha256:
+                summary["unchanged"] += 1
+                if not dry_run:
+                    self._save(rel_path, stat, sha256, None)
+                continue
+
+            kind = "changed" if known else "new"
+            summary[kind] += 1
+            print(f"{kind.capitalize()}: {rel_path}")
+            if dry_run:
+                continue
+
+            file_start = time.perf_counter()
+            try:
+                stats = self.index_file(rel_path, path)
+            except Exception as e:
+                print(f"Error indexing {rel_path}: {e}")
+                summary["failed"] += 1
+                continue
+            elapsed = time.perf_counter() - file_start
+            summary["chunks_embedded"] += stats["chunks"]
+            summary["chunks_skipped"] += stats["skipped"]
+            summary["vectors_removed"] += stats["removed"]
+            summary["embed_time"] += stats["embed_time"]
+            print(f"  {stats['chunks']} embedded, {stats['skipped']} unchanged, {stats['removed']} removed "
+                  f"in {elapsed:.2f}s ({stats['chunks'] / elapsed if elapsed else 0:.1f} chunks/s)")
+            if stats["errors"]:
+                # Leave the manifest entry stale so the next run retries this file
+                summary["failed"] += 1
+            else:
+                self._save(rel_path, stat, sha256, stats["total_chunks"])
+
+        summary["total_time"] = time.perf_counter() - start
+        summary["chunks_per_sec"] = (summary["chunks_embedded"] / summary["total_time"]
+                                     if summary["total_time"] else 0.0)
+        return summary
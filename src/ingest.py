@@ -0,0 +1,215 @@
+# Batched, pipelined ingestion shared by the upload and URL endpoints
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+CHUNK_SIZE = 500
+
+
+# split text into fixed-size character chunks (same as the original routes)
+def chunk_text(text, size=CHUNK_SIZE):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# split a stream of (page_number, text) pairs into the same chunks chunk_text
+# would produce for the newline-joined pages, holding at most one page plus one
+# chunk in memory; yields (chunk, metadata) tuples recording the pages each
+# chunk spans
+def iter_page_chunks(pages, size=CHUNK_SIZE):
+    buffer = ""
+    spans = []  # (end offset in buffer, page number)
+
+    def page_range(length):
+        first = next(page for end, page in spans if end > 0)
+        last = next(page for end, page in spans if end >= length)
+        return {"page_start": first, "page_end": last}
+
+    for page_number, text in pages:
+        if not text:
+            continue
+        buffer += text + "\n"
+        spans.append((len(buffer), page_number))
+        while len(buffer) >= size:
+            yield buffer[:size], page_range(size)
+            buffer = buffer[size:]
+            spans = [(end - size, page) for end, page in spans if end - size > 0]
+    if buffer:
+        yield buffer, page_range(len(buffer))
+
+
+# pack (heading, text) sections into chunks of at most size characters that
+# only break at section boundaries; a section longer than size is split on
+# whitespace. Yields (chunk, metadata) tuples naming the first section
+def iter_section_chunks(sections, size=CHUNK_SIZE):
+    buffer, first_heading = "", None
+    for heading, text in sections:
+        section = "\n".join(part for part in (heading, text) if part).strip()
+        if not section:
+            continue
+        if buffer and len(buffer) + 1 + len(section) > size:
+            yield buffer, ({"section": first_heading} if first_heading else {})
+            buffer, first_heading = "", None
+        if first_heading is None:
+            first_heading = heading
+        if not buffer and len(section) > size:
+            while len(section) > size:
+                cut = section.rfind(" ", size // 2, size)
+                cut = cut if cut > 0 else size
+                yield section[:cut], ({"section": heading} if heading else {})
+                section = section[cut:].lstrip()
+        buffer = f"{buffer}\n{section}" if buffer else section
+    if buffer:
+        yield buffer, ({"section": first_heading} if first_heading else {})
+
+
+def _batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_chunks(chunks, vector_store, embedding_model, make_id, make_metadata,
+                  embed_batch_size=None, upsert_batch_size=None, on_progress=None,
+                  keyword_index=None, ledger=None, doc_key=None):
+    """Embed chunks in batches and upsert them in bulk.
+
+    ``chunks`` may be any iterable, including a generator fed by page-by-page
+    extraction; only one embed batch and one upsert buffer are held at a time.
+    Items are chunk strings or ``(chunk, extra_metadata)`` tuples whose extra
+    metadata (e.g. page numbers) is merged into ``make_metadata(chunk)``,
+    along with ``chunk_index``, the chunk's position in the document.
+
+    Embedding of batch N+1 overlaps with the upsert of batch N: upserts run on
+    a single background thread so the model is never idle waiting on the
+    network. ``make_id(chunk)`` and ``make_metadata(chunk)`` build the vector
+    id and metadata for each chunk. ``on_progress(stats)`` is called after
+    every embed and upsert batch. When ``keyword_index`` is given the chunk
+    text is indexed for BM25 search alongside each upsert. When ``ledger`` is
+    given, chunks whose ids it already records (and repeats within this
+    document) are skipped before embedding, and upserted ids are recorded
+    under ``doc_key``; ids must then be content-addressed. Returns a stats
+    dict for the document.
+    """
+    embed_batch_size = embed_batch_size or EMBED_BATCH_SIZE
+    upsert_batch_size = upsert_batch_size or UPSERT_BATCH_SIZE
+
+    stats = {
+        "chunks": 0,
+        "skipped": 0,
+        "vectors_upserted": 0,
+        "embed_batches": 0,
+        "upsert_batches": 0,
+        "embed_time": 0.0,
+        "upsert_time": 0.0,
+        "total_time": 0.0,
+        "errors": 0,
+    }
+    start = time.perf_counter()
+
+    def upsert(vectors):
+        t0 = time.perf_counter()
+        vector_store.upsert(vectors)
+        if ledger is not None:
+            try:
+                ledger.record([vector["id"] for vector in vectors], doc_key)
+            except Exception as e:
+                print(f"Error recording batch in chunk ledger: {e}")
+        if keyword_index is not None:
+            try:
+                keyword_index.add(vectors)
+            except Exception as e:
+                print(f"Error adding batch to keyword index: {e}")
+        return len(vectors), time.perf_counter() - t0
+
+    def collect(future):
+        try:
+            count, elapsed = future.result()
+            stats["vectors_upserted"] += count
+            stats["upsert_time"] += elapsed
+            stats["upsert_batches"] += 1
+        except Exception as e:
+            print(f"Error upserting batch: {e}")
+            stats["errors"] += 1
+        if on_progress:
+            on_progress(stats)
+
+    def collect_finished(pending, wait=False):
+        while pending and (wait or pending[0].done()):
+            collect(pending.pop(0))
+
+    pending = []
+    buffer = []
+    seen = set()
+
+    with ThreadPoolExecutor(max_workers=1) as upserter:
+        items = ((c, {}) if isinstance(c, str) else c for c in chunks)
+        items = ((text, {**extra, "chunk_index": n})
+                 for n, (text, extra) in enumerate(item for item in items if item[0].strip()))
+        for batch in _batches(items, embed_batch_size):
+            ids = [make_id(text) for text, _ in batch]
+            if ledger is not None:
+                try:
+                    known = ledger.existing(ids)
+                except Exception as e:
+                    print(f"Error reading chunk ledger: {e}")
+                    known = set()
+                fresh = []
+                for chunk_id, item in zip(ids, batch):
+                    if chunk_id in known or chunk_id in seen:
+                        stats["skipped"] += 1
+                    else:
+                        seen.add(chunk_id)
+                        fresh.append((chunk_id, item))
+                if not fresh:
+                    if on_progress:
+                        on_progress(stats)
+                    continue
+                ids = [chunk_id for chunk_id, _ in fresh]
+                batch = [item for _, item in fresh]
+
+            texts = [text for text, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                embeddings = embedding_model.encode(texts, batch_size=embed_batch_size)
+            except Exception as e:
+                print(f"Error embedding batch: {e}")
+                stats["errors"] += 1
+                continue
+            stats["embed_time"] += time.perf_counter() - t0
+            stats["embed_batches"] += 1
+            stats["chunks"] += len(batch)
+
+            for chunk_id, (chunk, extra), embedding in zip(ids, batch, embeddings):
+                buffer.append({
+                    "id": chunk_id,
+                    "values": embedding.tolist(),
+                    "metadata": {**make_metadata(chunk), **extra}
+                })
+
+            while len(buffer) >= upsert_batch_size:
+                pending.append(upserter.submit(upsert, buffer[:upsert_batch_size]))
+                buffer = buffer[upsert_batch_size:]
+
+            collect_finished(pending)
+            if on_progress:
+                on_progress(stats)
+
+        if buffer:
+            pending.append(upserter.submit(upsert, buffer))
+
+        collect_finished(pending, wait=True)
+
+    stats["total_time"] = time.perf_counter() - start
+    return stats
+
+
+def format_stats(stats):
+    return (f"{stats['chunks']} chunks ({stats.get('skipped', 0)} unchanged skipped), embed {stats['embed_time']:.2f}s, "
+            f"upsert {stats['upsert_time']:.2f}s, total {stats['total_time']:.2f}s")
@@ -0,0 +1,303 @@
+# SQLite-backed background job queue for document/URL ingestion
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from src.db import connect
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# A running job whose owner has not renewed its lease for this long is
+# presumed dead and may be claimed again by any process
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+PROGRESS_FIELDS = ("pages_extracted", "chunks_total", "chunks_embedded", "chunks_upserted")
+
+
+def init_jobs_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ingest_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        payload TEXT,
+        status TEXT DEFAULT 'queued',
+        kb_id INTEGER,
+        upload_id INTEGER,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        pages_extracted INTEGER DEFAULT 0,
+        chunks_total INTEGER DEFAULT 0,
+        chunks_embedded INTEGER DEFAULT 0,
+        chunks_upserted INTEGER DEFAULT 0,
+        result TEXT,
+        error_message TEXT,
+        owner TEXT,
+        lease_until REAL
+    )''')
+    # The process working on a job and how long its claim holds without a heartbeat
+    # (tables created before leases existed get the columns added here)
+    for column in ("owner TEXT", "lease_until REAL"):
+        try:
+            cursor.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, id)")
+
+
+def job_to_dict(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
+
+
+class JobProgress:
+    """Handed to job handlers so they can report progress on the job row."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def update(self, **fields):
+        fields = {k: v for k, v in fields.items() if k in PROGRESS_FIELDS}
+        if fields:
+            self.queue._update_job(self.job_id, **fields)
+
+
+class JobQueue:
+    """Durable job queue stored in the app's SQLite database.
+
+    Routes call ``enqueue`` and return immediately; a pool of worker threads
+    claims queued jobs and runs the handler registered for the job kind.
+    When a job carries ``kb_id``/``upload_id`` the matching
+    ``knowledge_base``/``user_uploads`` rows are kept in step with it.
+
+    Several processes (gunicorn workers, the reloader) may share one queue.
+    A claimed job records this queue's ``owner`` and a lease that a
+    heartbeat thread renews every third of ``lease_seconds``; only jobs
+    whose lease has run out are requeued, so live work is never taken over.
+    """
+
+    def __init__(self, database, workers=INGEST_WORKERS, poll_interval=1.0, lease_seconds=JOB_LEASE_SECONDS):
+        self.database = database
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers = {}
+        self._schedules = []
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        db = connect(self.database, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, kb_id=None, upload_id=None):
+        db = self._connect()
+        try:
+            cursor = db.execute("""
+                INSERT INTO ingest_jobs (kind, payload, status, kb_id, upload_id, created_at)
+                VALUES (?, ?, 'queued', ?, ?, ?)
+            """, (kind, json.dumps(payload), kb_id, upload_id, datetime.utcnow().isoformat()))
+            job_id = cursor.lastrowid
+        finally:
+            db.close()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        db = self._connect()
+        try:
+            row = db.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+            return job_to_dict(row) if row else None
+        finally:
+            db.close()
+
+    def list(self, limit=50, status=None):
+        db = self._connect()
+        try:
+            if status:
+                rows = db.execute("SELECT * FROM ingest_jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                  (status, limit)).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM ingest_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            return [job_to_dict(row) for row in rows]
+        finally:
+            db.close()
+
+    def has_pending(self, kind):
+        """True when a job of ``kind`` is queued or running"""
+        db = self._connect()
+        try:
+            row = db.execute("SELECT 1 FROM ingest_jobs WHERE kind = ? AND status IN ('queued', 'running') LIMIT 1",
+                             (kind,)).fetchone()
+            return row is not None
+        finally:
+            db.close()
+
+    def schedule(self, kind, interval, payload=None):
+        """Enqueue ``kind`` every ``interval`` seconds once started, skipping a
+        tick while the previous run is still queued or running"""
+        self._schedules.append((kind, interval, payload or {}))
+
+    def _scheduler(self, kind, interval, payload):
+        while not self._stopping.wait(interval):
+            try:
+                if not self.has_pending(kind):
+                    self.enqueue(kind, payload)
+            except Exception as e:
+                print(f"Error scheduling {kind} job: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            # The lease columns may be missing from a table made by an older version
+            db = self._connect()
+            try:
+                init_jobs_table(db.cursor())
+            finally:
+                db.close()
+            self._requeue_interrupted()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            for kind, interval, payload in self._schedules:
+                thread = threading.Thread(target=self._scheduler, args=(kind, interval, payload),
+                                          name=f"schedule-{kind}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_interrupted(self):
+        # Jobs whose owner stopped renewing the lease (a crashed or killed
+        # process) never finished; jobs other live processes hold keep running
+        db = self._connect()
+        try:
+            db.execute("""
+                UPDATE ingest_jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_until = NULL
+                WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)
+            """, (time.time(),))
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        interval = self.lease_seconds / 3
+        while not self._stopping.wait(interval):
+            try:
+                db = self._connect()
+                try:
+                    db.execute("UPDATE ingest_jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                               (time.time() + self.lease_seconds, self.owner))
+                finally:
+                    db.close()
+            except sqlite3.Error as e:
+                print(f"Job lease renewal failed: {e}")
+
+    def _claim(self, db):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = db.execute("""
+                SELECT * FROM ingest_jobs
+                WHERE status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))
+                ORDER BY id LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            if row["status"] == "running":
+                print(f"Job {row['id']} ({row['kind']}) lease held by {row['owner']} expired; taking it over")
+            db.execute("UPDATE ingest_jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ? "
+                       "WHERE id = ?", (datetime.utcnow().isoformat(), self.owner, now + self.lease_seconds, row["id"]))
+            db.execute("COMMIT")
+            return job_to_dict(row)
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _update_job(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        db = self._connect()
+        try:
+            db.execute(f"UPDATE ingest_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            db.close()
+
+    def _finish(self, job_id, **fields):
+        """Record a job's outcome, unless its lease lapsed and another owner took it over"""
+        fields.update(finished_at=datetime.utcnow().isoformat(), lease_until=None)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        db = self._connect()
+        try:
+            cursor = db.execute(f"UPDATE ingest_jobs SET {columns} WHERE id = ? AND owner = ?",
+                                (*fields.values(), job_id, self.owner))
+            return cursor.rowcount > 0
+        finally:
+            db.close()
+
+    def _set_item_status(self, job, status, error=None):
+        db = self._connect()
+        try:
+            if job.get("kb_id"):
+                db.execute("UPDATE knowledge_base SET status = ? WHERE id = ?", (status, job["kb_id"]))
+            if job.get("upload_id"):
+                db.execute("UPDATE user_uploads SET status = ?, error_message = ? WHERE id = ?",
+                           (status, error, job["upload_id"]))
+        finally:
+            db.close()
+
+    def _worker(self):
+        db = self._connect()
+        while not self._stopping.is_set():
+            try:
+                job = self._claim(db)
+            except sqlite3.OperationalError as e:
+                print(f"Job queue error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(job)
+        db.close()
+
+    def _run(self, job):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise Exception(f"No handler registered for job kind '{job['kind']}'")
+            self._set_item_status(job, "processing")
+            result = handler(job["payload"], JobProgress(self, job["id"]))
+            if self._finish(job["id"], status="done", result=json.dumps(result) if result is not None else None):
+                self._set_item_status(job, "processed")
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            traceback.print_exc()
+            if self._finish(job["id"], status="failed", error_message=str(e)):
+                self._set_item_status(job, "failed", str(e))
@@ -0,0 +1,117 @@
+# SQLite FTS5 keyword index over ingested chunk text
+
+import re
+import sqlite3
+
+from src.db import connect
+from src.vector_store import Match
+
+MAX_QUERY_TERMS = 32
+
+
+def init_keyword_table(cursor):
+    cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text,
+        chunk_id UNINDEXED,
+        source UNINDEXED,
+        name UNINDEXED,
+        tokenize = 'unicode61'
+    )''')
+    # chunk_id is UNINDEXED in the FTS table, so replacing or deleting a chunk
+    # looks its FTS rowid up here instead of scanning every row
+    cursor.execute('''CREATE TABLE IF NOT EXISTS chunks_fts_rowids (
+        chunk_id TEXT PRIMARY KEY,
+        fts_rowid INTEGER NOT NULL
+    )''')
+    # Indexes built before the mapping existed: map their rows once
+    if (cursor.execute("SELECT 1 FROM chunks_fts_rowids LIMIT 1").fetchone() is None
+            and cursor.execute("SELECT 1 FROM chunks_fts LIMIT 1").fetchone() is not None):
+        cursor.execute("""
+            INSERT OR REPLACE INTO chunks_fts_rowids (chunk_id, fts_rowid)
+            SELECT chunk_id, rowid FROM chunks_fts WHERE chunk_id IS NOT NULL ORDER BY rowid
+        """)
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 OR-query of quoted terms"""
+    terms = []
+    for term in re.findall(r"\w+", text.lower()):
+        if term not in terms:
+            terms.append(term)
+    return " OR ".join(f'"{term}"' for term in terms[:MAX_QUERY_TERMS])
+
+
+class KeywordIndex:
+    """BM25 keyword search over chunk text stored in ``chunks_fts``.
+
+    Rows share their id with the vector store so results from both can be
+    fused. Each call opens its own connection, so it is safe to use from the
+    ingestion workers and the retrieval thread pool.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def _connect(self):
+        return connect(self.database)
+
+    def add(self, vectors):
+        """Index Pinecone-style vector dicts by their metadata text"""
+        rows = []
+        for item in vectors:
+            metadata = item.get("metadata") or {}
+            if metadata.get("text"):
+                rows.append((metadata["text"], item["id"], metadata.get("source"),
+                             metadata.get("filename") or metadata.get("url")))
+        if not rows:
+            return
+        db = self._connect()
+        try:
+            for row in rows:
+                self._delete(db, row[1])
+                cursor = db.execute("INSERT INTO chunks_fts (text, chunk_id, source, name) VALUES (?, ?, ?, ?)", row)
+                db.execute("INSERT INTO chunks_fts_rowids (chunk_id, fts_rowid) VALUES (?, ?)",
+                           (row[1], cursor.lastrowid))
+            db.commit()
+        finally:
+            db.close()
+
+    def delete(self, ids):
+        db = self._connect()
+        try:
+            for chunk_id in ids:
+                self._delete(db, chunk_id)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _delete(db, chunk_id):
+        """Remove one chunk's FTS row by rowid (an indexed lookup, not a table scan)"""
+        row = db.execute("SELECT fts_rowid FROM chunks_fts_rowids WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        if row is not None:
+            db.execute("DELETE FROM chunks_fts WHERE rowid = ?", row)
+            db.execute("DELETE FROM chunks_fts_rowids WHERE chunk_id = ?", (chunk_id,))
+
+    def search(self, text, top_k=3):
+        query = fts_query(text)
+        if not query:
+            return []
+        db = self._connect()
+        try:
+            rows = db.execute("""
+                SELECT chunk_id, text, source, name, bm25(chunks_fts) AS rank
+                FROM chunks_fts
+                WHERE chunks_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (query, top_k)).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Keyword search error: {e}")
+            return []
+        finally:
+            db.close()
+
+        # bm25() is lower-is-better; flip the sign so higher scores rank first
+        return [Match(row[0], -row[4], {"text": row[1], "source": row[2], "name": row[3]})
+                for row in rows]
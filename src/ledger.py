@@ -0,0 +1,95 @@
+# Content-addressed chunk ids and the ledger of chunks already embedded
+
+import hashlib
+from datetime import datetime
+
+from src.db import connect
+
+
+def chunk_id(doc_key, text):
+    """Stable id for a chunk: hash of the source document key plus the chunk text"""
+    digest = hashlib.sha256(f"{doc_key}\0{text}".encode("utf-8")).hexdigest()
+    return f"c_{digest[:40]}"
+
+
+def init_ledger_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS chunk_ledger (
+        store TEXT,
+        chunk_id TEXT,
+        doc_key TEXT,
+        created_at TEXT,
+        PRIMARY KEY (store, chunk_id)
+    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_ledger_doc ON chunk_ledger (store, doc_key)")
+
+
+class ChunkLedger:
+    """Records which chunk ids each vector store already holds.
+
+    Keyed by the store's ``store_key`` so switching backends (or Pinecone
+    indexes) never skips chunks the new store has not seen.
+    """
+
+    def __init__(self, database, store_key):
+        self.database = database
+        self.store_key = store_key
+
+    def existing(self, ids):
+        ids = list(ids)
+        if not ids:
+            return set()
+        db = connect(self.database)
+        try:
+            found = set()
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                rows = db.execute(f"""
+                    SELECT chunk_id FROM chunk_ledger
+                    WHERE store = ? AND chunk_id IN ({','.join('?' * len(part))})
+                """, (self.store_key, *part)).fetchall()
+                found.update(row[0] for row in rows)
+            return found
+        finally:
+            db.close()
+
+    def record(self, ids, doc_key):
+        now = datetime.utcnow().isoformat()
+        db = connect(self.database)
+        try:
+            db.executemany("INSERT OR IGNORE INTO chunk_ledger (store, chunk_id, doc_key, created_at) VALUES (?, ?, ?, ?)",
+                           [(self.store_key, chunk_id, doc_key, now) for chunk_id in ids])
+            db.commit()
+        finally:
+            db.close()
+
+    def ids_for_doc(self, doc_key):
+        db = connect(self.database)
+        try:
+            rows = db.execute("SELECT chunk_id FROM chunk_ledger WHERE store = ? AND doc_key = ?",
+                              (self.store_key, doc_key)).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            db.close()
+
+    def forget(self, ids):
+        db = connect(self.database)
+        try:
+            db.executemany("DELETE FROM chunk_ledger WHERE store = ? AND chunk_id = ?",
+                           [(self.store_key, chunk_id) for chunk_id in ids])
+            db.commit()
+        finally:
+            db.close()
+
+
+def prune_document(ledger, vector_store, keyword_index, doc_key, keep_ids=()):
+    """Delete a document's vectors whose ids are not in ``keep_ids``; returns how many"""
+    stale = list(set(ledger.ids_for_doc(doc_key)) - set(keep_ids))
+    if not stale:
+        return 0
+    for i in range(0, len(stale), 1000):
+        vector_store.delete(ids=stale[i:i + 1000])
+    if keyword_index is not None:
+        keyword_index.delete(stale)
+    ledger.forget(stale)
+    return len(stale)
@@ -0,0 +1,325 @@
+# Pooled, retrying OpenRouter client that balances load across API keys
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # the async methods then run the pooled requests session on the client's own threads
+    httpx = None
+
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))
+LLM_ASYNC_MAX_CONNECTIONS = int(os.getenv("LLM_ASYNC_MAX_CONNECTIONS", "256"))
+# Without httpx each in-flight async call (or open stream) occupies one of these threads
+LLM_FALLBACK_THREADS = int(os.getenv("LLM_FALLBACK_THREADS", "128"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class KeyState:
+    """Rate-limit headroom observed for one API key"""
+
+    def __init__(self, key):
+        self.key = key
+        self.remaining = None      # unknown until the first response
+        self.reset_at = 0.0        # epoch seconds when the limit window resets
+        self.cooldown_until = 0.0  # set after a 429
+        self.in_flight = 0
+
+    def headroom(self, now):
+        if now < self.cooldown_until:
+            return -1
+        if self.remaining is None or now >= self.reset_at:
+            return float("inf")
+        return self.remaining - self.in_flight
+
+
+def _parse_reset(value, now):
+    # OpenRouter reports the reset as epoch milliseconds; accept seconds too
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if value > 1e12:
+        return value / 1000
+    if value > 1e9:
+        return value
+    return now + value
+
+
+class OpenRouterClient:
+    """Shared HTTP client for chat completions.
+
+    Requests go through one pooled ``requests.Session`` with connect/read
+    timeouts, and 429/5xx responses are retried with jittered exponential
+    backoff. Each attempt picks the active key with the most rate-limit
+    headroom; ``load_keys`` supplies the key list, which is cached until
+    ``invalidate_keys`` is called. ``achat``/``astream_lines`` are the
+    non-blocking equivalents for the event-loop chat pipeline, sharing the
+    same keys, retries and timeouts over an ``httpx.AsyncClient``. Without
+    httpx they run the requests session on a dedicated pool of
+    ``LLM_FALLBACK_THREADS`` threads rather than the loop's default executor.
+    """
+
+    def __init__(self, load_keys, fallback_key=None, url=OPENROUTER_URL,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, pool_size=LLM_POOL_SIZE, extra_headers=None):
+        self.load_keys = load_keys
+        self.fallback_key = fallback_key
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.extra_headers = extra_headers or {}
+
+        self.session = requests.Session()
+        if httpx is None:
+            # Every fallback thread may hold a connection at once
+            pool_size = max(pool_size, LLM_FALLBACK_THREADS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._async_client = None
+        self._fallback_executor = None
+
+        self._keys = None
+        self._states = {}
+        self._rotation = 0
+        self._lock = threading.Lock()
+
+    def invalidate_keys(self):
+        with self._lock:
+            self._keys = None
+
+    def _active_keys(self):
+        if self._keys is None:
+            try:
+                keys = list(self.load_keys())
+            except Exception as e:
+                print(f"Error loading API keys: {e}")
+                keys = []
+            if not keys and self.fallback_key:
+                keys = [self.fallback_key]
+            self._keys = keys
+            self._states = {key: self._states.get(key) or KeyState(key) for key in keys}
+        return self._keys
+
+    def _acquire_key(self):
+        with self._lock:
+            keys = self._active_keys()
+            if not keys:
+                raise Exception("No OpenRouter API key configured")
+            now = time.time()
+            # Rotate the starting point so equal-headroom keys share the load
+            self._rotation = (self._rotation + 1) % len(keys)
+            ordered = keys[self._rotation:] + keys[:self._rotation]
+            state = max((self._states[key] for key in ordered), key=lambda s: s.headroom(now))
+            state.in_flight += 1
+            return state
+
+    def _release_key(self, state, response=None):
+        with self._lock:
+            state.in_flight -= 1
+            if response is None:
+                return
+            now = time.time()
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            if remaining is not None:
+                try:
+                    state.remaining = int(remaining)
+                    state.reset_at = _parse_reset(response.headers.get("X-RateLimit-Reset"), now) or now + 60
+                except ValueError:
+                    pass
+            if response.status_code == 429:
+                state.cooldown_until = now + self._retry_after(response, 0)
+
+    def _retry_after(self, response, attempt):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    def _post(self, payload, stream=False):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            state = self._acquire_key()
+
+            response = None
+            try:
+                response = self.session.post(self.url, headers=self._headers(state), json=payload,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            finally:
+                self._release_key(state, response)
+
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                last_error = requests.HTTPError(f"{response.status_code} from OpenRouter", response=response)
+                response.close()
+
+            if attempt < self.max_retries:
+                time.sleep(self._retry_after(response, attempt))
+
+        raise last_error
+
+    def chat(self, payload):
+        """Run a completion and return the parsed JSON body"""
+        return self._post(payload).json()
+
+    def stream(self, payload):
+        """Start a streaming completion and return the open response"""
+        payload = dict(payload, stream=True)
+        return self._post(payload, stream=True)
+
+    def _headers(self, state):
+        headers = dict(self.extra_headers)
+        headers["Authorization"] = f"Bearer {state.key}"
+        headers["Content-Type"] = "application/json"
+        return headers
+
+    def _get_async_client(self):
+        # Created on first use so it binds to the pipeline's event loop
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=LLM_ASYNC_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_POOL_SIZE)
+            )
+        return self._async_client
+
+    async def _apost(self, payload, stream=False):
+        client = self._get_async_client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            state = self._acquire_key()
+            request = client.build_request("POST", self.url, headers=self._headers(state), json=payload)
+
+            response = None
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                last_error = e
+            finally:
+                self._release_key(state, response)
+
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES:
+                    if response.is_error:
+                        await response.aclose()
+                    response.raise_for_status()
+                    return response
+                last_error = httpx.HTTPStatusError(f"{response.status_code} from OpenRouter",
+                                                   request=request, response=response)
+                await response.aclose()
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._retry_after(response, attempt))
+
+        raise last_error
+
+    def _get_fallback_executor(self):
+        with self._lock:
+            if self._fallback_executor is None:
+                self._fallback_executor = ThreadPoolExecutor(max_workers=LLM_FALLBACK_THREADS,
+                                                             thread_name_prefix="llm-fallback")
+            return self._fallback_executor
+
+    async def achat(self, payload):
+        """Non-blocking ``chat``"""
+        if httpx is None:
+            return await asyncio.get_running_loop().run_in_executor(self._get_fallback_executor(),
+                                                                    self.chat, payload)
+        response = await self._apost(payload)
+        return response.json()
+
+    async def _fallback_stream_lines(self, payload):
+        # One thread task per stream opens the response and pushes every line onto the loop
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+        done = object()
+        holder = {}
+
+        def push(item):
+            try:
+                loop.call_soon_threadsafe(lines.put_nowait, item)
+            except RuntimeError:  # the loop has shut down
+                holder["closed"] = True
+
+        def read():
+            try:
+                holder["response"] = response = self.stream(payload)
+                for line in response.iter_lines(decode_unicode=True):
+                    if holder.get("closed"):
+                        break
+                    push(line)
+            except Exception as e:
+                if not holder.get("closed"):
+                    push(e)
+            finally:
+                if "response" in holder:
+                    holder["response"].close()
+                push(done)
+
+        reader = loop.run_in_executor(self._get_fallback_executor(), read)
+        try:
+            while True:
+                line = await lines.get()
+                if line is done:
+                    break
+                if isinstance(line, Exception):
+                    raise line
+                yield line
+        finally:
+            # A consumer that stops early (client disconnect) ends the read
+            # and closes the response; the thread notices at its next line
+            holder["closed"] = True
+            if not reader.done() and "response" in holder:
+                holder["response"].close()
+
+    async def astream_lines(self, payload):
+        """Non-blocking ``stream``: yields the decoded SSE lines of the completion"""
+        payload = dict(payload, stream=True)
+        if httpx is None:
+            async for line in self._fallback_stream_lines(payload):
+                yield line
+            return
+
+        response = await self._apost(payload, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                yield line
+        finally:
+            await response.aclose()
+
+    def stats(self):
+        """Per-key rate-limit state; keys share their "sk-or-v1-" prefix, so they are told apart by the tail"""
+        with self._lock:
+            now = time.time()
+            return [{
+                "key": "..." + state.key[-4:],
+                "remaining": state.remaining,
+                "in_flight": state.in_flight,
+                "cooling_down": now < state.cooldown_until
+            } for state in self._states.values()]
@@ -0,0 +1,206 @@
+# Token-budgeted per-session conversation memory with a rolling summary
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.db import connect
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "2"))
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "1000"))
+MEMORY_LOAD_TURNS = int(os.getenv("MEMORY_LOAD_TURNS", "20"))
+FOLLOWUP_MAX_WORDS = int(os.getenv("MEMORY_FOLLOWUP_WORDS", "6"))
+
+# Words that point back at the previous turn ("is it free", "same on Mac", "still failing")
+FOLLOWUP_REFERENCES = {"it", "its", "it's", "that", "this", "those", "these", "them", "they", "there",
+                       "same", "one", "ones", "else", "instead", "too", "also", "again", "still",
+                       "another", "other"}
+# Openings that continue the previous question ("and on Android?", "what about iOS", "for Outlook")
+FOLLOWUP_OPENERS = {"and", "or", "but", "also", "then", "so", "on", "for", "with", "in", "via", "using",
+                    "without", "from"}
+FOLLOWUP_OPENING_PAIRS = {("what", "about"), ("how", "about"), ("what", "if")}
+
+
+def is_followup(message):
+    """True when a short message only makes sense with the previous turn.
+
+    Short standalone questions ("VPN not connecting", "reset password") are
+    not follow-ups; single-word fragments ("iOS?"), back-references ("does
+    it work offline") and continuation openers ("what about Mac") are.
+    """
+    words = [word.strip("?!.,;:\"'()") for word in message.lower().split()]
+    words = [word for word in words if word]
+    if not words or len(words) > FOLLOWUP_MAX_WORDS:
+        return False
+    if len(words) == 1:
+        return True
+    if words[0] in FOLLOWUP_OPENERS or tuple(words[:2]) in FOLLOWUP_OPENING_PAIRS:
+        return True
+    return any(word in FOLLOWUP_REFERENCES for word in words)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text or "") + 3) // 4
+
+
+def turn_tokens(turn):
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1]) + 8
+
+
+def truncate_tokens(text, max_tokens, keep="end"):
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    return "..." + text[-limit:] if keep == "end" else text[:limit] + "..."
+
+
+def extractive_summary(previous, turns, max_tokens=MEMORY_SUMMARY_TOKENS):
+    """Fallback summary: the earlier summary plus one line per compacted question"""
+    lines = [previous] if previous else []
+    for user_message, bot_response in turns:
+        lines.append(f"- User asked: {truncate_tokens(' '.join(user_message.split()), 40, keep='start')}")
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+
+class _Session:
+    __slots__ = ("summary", "turns", "compacting")
+
+    def __init__(self, summary, turns):
+        self.summary = summary
+        self.turns = turns
+        self.compacting = False
+
+
+class ConversationMemory:
+    """Recent turns per session, kept under a token budget.
+
+    Sessions live in an LRU of at most ``max_sessions`` entries; a session
+    that is not cached is reloaded from its latest ``chat_logs`` rows. When a
+    session's turns plus summary exceed ``token_budget``, all but the last
+    ``keep_turns`` turns are folded into the rolling summary by
+    ``summarize(previous_summary, turns)`` on a background thread, so the
+    chat request never waits on it. Until that finishes ``context`` simply
+    drops the oldest turns that do not fit, so prompts stay bounded either way.
+    """
+
+    def __init__(self, database, summarize=None, token_budget=MEMORY_TOKEN_BUDGET,
+                 keep_turns=MEMORY_KEEP_TURNS, max_sessions=MEMORY_MAX_SESSIONS,
+                 load_turns=MEMORY_LOAD_TURNS):
+        self.database = database
+        self.summarize = summarize or extractive_summary
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.max_sessions = max_sessions
+        self.load_turns = load_turns
+        self.sessions = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compact")
+
+    def _load(self, session_id):
+        db = connect(self.database)
+        try:
+            rows = db.execute("""
+                SELECT user_message, bot_response FROM chat_logs
+                WHERE session_id = ? ORDER BY id DESC LIMIT ?
+            """, (session_id, self.load_turns)).fetchall()
+        finally:
+            db.close()
+        return [(row[0] or "", row[1] or "") for row in reversed(rows)]
+
+    def _session(self, session_id):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                return session
+
+        # Load outside the lock; the first of two concurrent loaders wins
+        turns = self._load(session_id)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = _Session("", turns)
+                self.sessions[session_id] = session
+                self.loads += 1
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    self.evictions += 1
+            self._maybe_compact(session)
+        return session
+
+    def _tokens(self, session):
+        return estimate_tokens(session.summary) + sum(turn_tokens(turn) for turn in session.turns)
+
+    def _maybe_compact(self, session):
+        # Caller holds self._lock
+        if (session.compacting or len(session.turns) <= self.keep_turns
+                or self._tokens(session) <= self.token_budget):
+            return
+        session.compacting = True
+        old_turns = session.turns[:len(session.turns) - self.keep_turns]
+        self._compactor.submit(self._compact, session, session.summary, old_turns)
+
+    def _compact(self, session, previous, old_turns):
+        try:
+            summary = self.summarize(previous, old_turns)
+        except Exception as e:
+            print(f"Conversation summary failed, using extractive summary: {e}")
+            summary = extractive_summary(previous, old_turns)
+        with self._lock:
+            # Turns appended meanwhile are kept; only the summarized prefix is dropped
+            if session.turns[:len(old_turns)] == old_turns:
+                session.turns = session.turns[len(old_turns):]
+                session.summary = summary
+                self.compactions += 1
+            session.compacting = False
+            self._maybe_compact(session)
+
+    def context(self, session_id):
+        """Return ``(summary, turns)`` for the prompt, newest turns first to fit the budget"""
+        session = self._session(session_id)
+        with self._lock:
+            summary = session.summary
+            budget = self.token_budget - estimate_tokens(summary)
+            turns = []
+            for turn in reversed(session.turns):
+                cost = turn_tokens(turn)
+                if cost > budget:
+                    break
+                budget -= cost
+                turns.append(turn)
+            if not turns and session.turns:
+                # Always keep the latest exchange so follow-ups resolve, trimmed to fit
+                user_message, bot_response = session.turns[-1]
+                turns.append((truncate_tokens(user_message, max(budget // 2, 50), keep="start"),
+                              truncate_tokens(bot_response, max(budget // 2, 50))))
+        return summary, turns[::-1]
+
+    def append(self, session_id, user_message, bot_response):
+        session = self._session(session_id)
+        with self._lock:
+            session.turns.append((user_message, bot_response))
+            self._maybe_compact(session)
+
+    def retrieval_query(self, user_message, turns):
+        """Follow-ups ("iOS", "what about Mac") are searched together with the previous question"""
+        if turns and is_followup(user_message):
+            return f"{turns[-1][0]} {user_message}"
+        return user_message
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "token_budget": self.token_budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "compactions": self.compactions
+            }
@@ -0,0 +1,164 @@
+# In-process latency histograms, counters and per-request stage timings
+
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(p / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+class LatencyHistogram:
+    """All-time count/sum/max plus the last ``window`` samples for percentiles"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        values = sorted(self.samples)
+        summary = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 2)
+        }
+        for p in PERCENTILES:
+            summary[f"p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+        return summary
+
+
+class StageTimings:
+    """Wall-clock time spent in each stage of one request.
+
+    Stages can overlap (the chat pipeline embeds while it loads memory), so
+    they need not add up to ``total``. A stage timed more than once
+    accumulates.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        # Stages may finish on pipeline or retrieval worker threads
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    async def timed(self, name, awaitable):
+        """Await ``awaitable``, recording how long it took"""
+        t0 = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def seconds(self):
+        """Stage times in seconds, plus the total so far"""
+        with self._lock:
+            return dict(self.stages, total=self.elapsed())
+
+    def as_dict(self):
+        """Stage times in milliseconds, plus the total so far"""
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.seconds().items()}
+
+
+class Metrics:
+    """Registry of named latency histograms and counters.
+
+    Names are dotted (``chat.retrieval``, ``http.user_upload``); ``snapshot``
+    returns everything as JSON-ready dicts and ``prometheus`` renders the
+    same data in the Prometheus text format.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def record(self, prefix, timings):
+        """Fold one request's ``StageTimings`` into the ``prefix.*`` histograms"""
+        for stage, seconds in timings.seconds().items():
+            self.observe(f"{prefix}.{stage}", seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime": round(time.time() - self.started, 1),
+                "latency": {name: histogram.summary() for name, histogram in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items()))
+            }
+
+    def prometheus(self, namespace="helpdesk"):
+        """Prometheus text exposition: a summary per histogram, a counter per counter"""
+        lines = []
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                metric = _metric_name(namespace, name, "seconds")
+                values = sorted(histogram.samples)
+                lines.append(f"# TYPE {metric} summary")
+                for p in PERCENTILES:
+                    lines.append(f'{metric}{{quantile="{p / 100}"}} {percentile(values, p):.6f}')
+                lines.append(f"{metric}_sum {histogram.total:.6f}")
+                lines.append(f"{metric}_count {histogram.count}")
+            for name, value in sorted(self._counters.items()):
+                metric = _metric_name(namespace, name, "total")
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(namespace, name, unit):
+    return f"{namespace}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_{unit}"
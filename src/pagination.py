@@ -0,0 +1,64 @@
+# Keyset (cursor) pagination for the admin list APIs
+
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(cursor, table, columns, sort_column, filters=(), params=(), after=None, limit=DEFAULT_PAGE_SIZE):
+    """Fetch one page ordered by ``sort_column DESC, id DESC``.
+
+    Rows whose ``sort_column`` is NULL sort as '' (after every timestamp)
+    instead of dropping out of the cursor comparison. ``filters`` are SQL conditions joined with AND and bound to ``params``.
+    ``after`` is an opaque cursor from a previous page. Returns the rows
+    (without the trailing sort/id columns) and the cursor for the next page,
+    or None when this is the last page.
+    """
+    sort_key = f"COALESCE({sort_column}, '')"
+    conditions = list(filters)
+    params = list(params)
+    if after:
+        sort_value, row_id = decode_cursor(after)
+        sort_value = "" if sort_value is None else sort_value
+        # The plain bound lets SQLite seek the expression index; the row value breaks ties
+        conditions.append(f"{sort_key} <= ? AND ({sort_key}, id) < (?, ?)")
+        params += [sort_value, sort_value, row_id]
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"""
+        SELECT {', '.join(columns)}, {sort_key}, id
+        FROM {table}
+        {where}
+        ORDER BY {sort_key} DESC, id DESC
+        LIMIT ?
+    """, (*params, limit + 1))
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return [row[:-2] for row in rows], next_cursor
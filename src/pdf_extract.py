@@ -0,0 +1,187 @@
+# Bounded-memory PDF upload handling and page-by-page text extraction
+
+import multiprocessing
+import os
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from PyPDF2 import PdfReader
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "30"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_upload(file, filepath, max_bytes=MAX_UPLOAD_BYTES):
+    """Copy an uploaded file to disk block by block, enforcing ``max_bytes``.
+
+    Only one block is held in memory at a time; a partially written file is
+    removed when the limit is exceeded. Returns the number of bytes written.
+    """
+    written = 0
+    try:
+        with open(filepath, "wb") as out:
+            while True:
+                block = file.stream.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+                out.write(block)
+    except Exception:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+    return written
+
+
+def iter_pdf_pages(filepath, on_page=None, first_index=0):
+    """Yield ``(page_number, text)`` for each page, one page at a time.
+
+    Page numbers are 1-based. Pages that fail to extract are logged and
+    yield empty text so numbering stays aligned. ``on_page(page_number)`` is
+    called after every page for progress reporting. Extraction starts at
+    0-based page ``first_index``; earlier pages are not parsed.
+    """
+    reader = PdfReader(filepath)
+    for index in range(first_index, len(reader.pages)):
+        page_number, page = index + 1, reader.pages[index]
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"Error reading page {page_number}: {e}")
+            text = ""
+        if on_page:
+            on_page(page_number)
+        yield page_number, text
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_range(filepath, start, end, page_timeout):
+    """Extract pages [start, end) in a pool worker; returns a list of texts"""
+    # SIGALRM bounds each page where available (POSIX); pool workers run tasks on their main thread
+    use_alarm = page_timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    reader = PdfReader(filepath)
+    texts = []
+    for index in range(start, end):
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, page_timeout)
+            texts.append(reader.pages[index].extract_text() or "")
+        except PageTimeout:
+            print(f"Page {index + 1} of {filepath} timed out after {page_timeout}s, skipping")
+            texts.append("")
+        except Exception as e:
+            print(f"Error reading page {index + 1}: {e}")
+            texts.append("")
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    return texts
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the app process is multi-threaded, which makes fork unsafe
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(terminate=False):
+    """Drop the shared pool; with ``terminate`` its workers are killed, so a
+    worker stuck on a page stops holding a slot"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            # shutdown() leaves running tasks alone and the pool has no public kill
+            processes = list((getattr(_pool, "_processes", None) or {}).values()) if terminate else []
+            _pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+        _pool = None
+
+
+def iter_pdf_pages_parallel(filepath, on_page=None, pages_per_task=PDF_PAGES_PER_TASK,
+                            page_timeout=PDF_PAGE_TIMEOUT):
+    """Like ``iter_pdf_pages`` but extracts page ranges across a process pool.
+
+    Ranges are submitted a few at a time ahead of the consumer and yielded
+    strictly in page order, so the output is identical to the serial path.
+    A range that overruns its time budget yields empty pages and is skipped.
+    Small documents, or a broken pool, fall back to serial extraction.
+    """
+    filepath = os.path.abspath(filepath)
+    page_count = len(PdfReader(filepath).pages)
+    if PDF_EXTRACT_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from iter_pdf_pages(filepath, on_page)
+        return
+
+    ranges = deque((start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task))
+    pending = deque()
+    max_in_flight = PDF_EXTRACT_WORKERS * 2
+    pool = _get_pool()
+
+    while ranges or pending:
+        try:
+            while ranges and len(pending) < max_in_flight:
+                start, end = ranges.popleft()
+                pending.append((start, end, pool.submit(_extract_range, filepath, start, end, page_timeout)))
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"PDF extraction pool unavailable ({e}), continuing serially")
+            _reset_pool()
+            yield from iter_pdf_pages(filepath, on_page, pending[0][0] if pending else start)
+            return
+
+        start, end, future = pending.popleft()
+        try:
+            # Per-page limit inside the worker; this is the backstop for a stuck worker
+            texts = future.result(timeout=page_timeout * (end - start) + 5)
+        except FutureTimeout:
+            print(f"Pages {start + 1}-{end} of {filepath} timed out, skipping and recycling the pool")
+            texts = [""] * (end - start)
+            # The hung worker would keep its slot; the ranges queued behind it are resubmitted
+            _reset_pool(terminate=True)
+            ranges.extendleft(reversed([(first, last) for first, last, _ in pending]))
+            pending.clear()
+            pool = _get_pool()
+        except BrokenProcessPool as e:
+            print(f"PDF extraction pool crashed ({e}), continuing serially")
+            _reset_pool()
+            yield from iter_pdf_pages(filepath, on_page, start)
+            return
+
+        for offset, text in enumerate(texts):
+            page_number = start + offset + 1
+            if on_page:
+                on_page(page_number)
+            yield page_number, text
@@ -0,0 +1,96 @@
+# Hybrid keyword + vector retrieval with reciprocal-rank fusion
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.vector_store import Match
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() not in ("0", "false", "no")
+RRF_K = int(os.getenv("RRF_K", "60"))
+CANDIDATES_PER_RETRIEVER = int(os.getenv("HYBRID_CANDIDATES", "10"))
+
+# Keyword queries run here while the request thread queries the vector store
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
+def reciprocal_rank_fusion(result_lists, k=RRF_K, top_k=3):
+    """Fuse ranked Match lists: score(d) = sum over lists of 1 / (k + rank)"""
+    scores = {}
+    matches = {}
+    for results in result_lists:
+        for rank, match in enumerate(results, start=1):
+            scores[match.id] = scores.get(match.id, 0.0) + 1.0 / (k + rank)
+            # Prefer the vector store's copy (metadata and values) when both have it
+            if match.id not in matches or not matches[match.id].metadata:
+                matches[match.id] = match
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [Match(chunk_id, scores[chunk_id], matches[chunk_id].metadata, matches[chunk_id].values)
+            for chunk_id in ranked]
+
+
+def text_key(text):
+    """Normalized hash of chunk text, shared by exact and whitespace-only duplicates"""
+    return hashlib.sha1(" ".join((text or "").lower().split()).encode("utf-8")).hexdigest()
+
+
+def dedupe_matches(matches, top_k=3):
+    """Keep the best-ranked match for each distinct chunk text.
+
+    The same passage can be indexed more than once (the same document
+    uploaded by several users, or from before ids were content-addressed);
+    without this the context can repeat one chunk several times.
+    """
+    seen = set()
+    unique = []
+    for match in matches:
+        key = text_key(match.metadata.get("text")) if match.metadata.get("text") else match.id
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(match)
+        if len(unique) >= top_k:
+            break
+    return unique
+
+
+def hybrid_search(embedding, query_text, vector_store, keyword_index=None, top_k=3,
+                  candidates=CANDIDATES_PER_RETRIEVER, hybrid=HYBRID_SEARCH, timings=None,
+                  include_values=False):
+    """Run the vector and BM25 queries concurrently, fuse their rankings and
+    collapse duplicate chunk texts. ``timings`` (a ``StageTimings``) receives
+    the vector and keyword query times. With ``include_values`` the vector
+    hits carry their stored vectors (keyword-only hits do not)."""
+    fetch = max(candidates, top_k)
+    t0 = time.perf_counter()
+    if not hybrid or keyword_index is None:
+        vector_results = vector_store.query(embedding, top_k=fetch, include_metadata=True,
+                                            include_values=include_values)
+        if timings is not None:
+            timings.add("vector_query", time.perf_counter() - t0)
+        return dedupe_matches(vector_results, top_k)
+
+    def keyword_search():
+        started = time.perf_counter()
+        try:
+            return keyword_index.search(query_text, top_k=fetch)
+        finally:
+            if timings is not None:
+                timings.add("keyword_query", time.perf_counter() - started)
+
+    keyword_future = _executor.submit(keyword_search)
+    vector_results = vector_store.query(embedding, top_k=fetch, include_metadata=True,
+                                        include_values=include_values)
+    if timings is not None:
+        timings.add("vector_query", time.perf_counter() - t0)
+
+    try:
+        keyword_results = keyword_future.result()
+    except Exception as e:
+        print(f"Keyword search failed, using vector results only: {e}")
+        keyword_results = []
+
+    fused = reciprocal_rank_fusion([vector_results, keyword_results], top_k=fetch * 2)
+    return dedupe_matches(fused, top_k)
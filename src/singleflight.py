@@ -0,0 +1,94 @@
+# Coalesce concurrent identical calls so only one of them does the work
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "120"))
+
+
+def flight_key(*parts):
+    """Stable key for JSON-serializable parts; strings are case- and whitespace-normalized"""
+    normalized = [" ".join(part.lower().split()) if isinstance(part, str) else part for part in parts]
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its result.
+
+    The first caller for a key becomes the leader and does the work; callers
+    that arrive while it is in flight wait on the same future and get its
+    result (or its exception). Nothing is kept after the leader finishes, so
+    this only merges overlapping requests and never serves stale results.
+    """
+
+    def __init__(self, name, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """Return ``(future, leader)``; the leader must call ``end`` exactly once"""
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            return future, True
+
+    def end(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def wait(self, future):
+        return future.result(timeout=self.timeout)
+
+    def do(self, key, func):
+        future, leader = self.begin(key)
+        if not leader:
+            return self.wait(future)
+        try:
+            result = func()
+        except Exception as e:
+            self.end(key, future, error=e)
+            raise
+        self.end(key, future, result=result)
+        return result
+
+    async def ado(self, key, func):
+        """``do`` for coroutines: ``func()`` returns an awaitable; followers wait without blocking the loop"""
+        future, leader = self.begin(key)
+        if not leader:
+            # shield: a cancelled follower must not cancel the shared future
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        try:
+            result = await func()
+        except BaseException as e:
+            self.end(key, future, error=e if isinstance(e, Exception) else RuntimeError("Request was cancelled"))
+            raise
+        self.end(key, future, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._flights)
+            }
@@ -0,0 +1,89 @@
+# Deferred initialization of heavy resources and startup timing
+
+import threading
+import time
+
+
+class LazyResource:
+    """Builds a resource on first ``get()`` and remembers how long that took.
+
+    Concurrent callers block on the same initialization instead of each
+    building their own copy. A failed build is recorded and retried on the
+    next ``get()``.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.value = None
+        self.ready = False
+        self.error = None
+        self.init_time = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.ready:
+            return self.value
+        with self._lock:
+            if not self.ready:
+                start = time.perf_counter()
+                try:
+                    self.value = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.init_time = time.perf_counter() - start
+                self.error = None
+                self.ready = True
+                print(f"Initialized {self.name} in {self.init_time:.2f}s")
+        return self.value
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "init_time": round(self.init_time, 3) if self.init_time is not None else None,
+            "error": self.error
+        }
+
+
+class Warmup:
+    """Runs the warm-up steps once in a background thread and logs a startup breakdown"""
+
+    def __init__(self, boot_started):
+        self.boot_started = boot_started
+        self.steps = []
+        self.timings = {}
+        self.done = threading.Event()
+        self.error = None
+        self._thread = None
+
+    def add_step(self, name, func):
+        self.steps.append((name, func))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        for name, func in self.steps:
+            start = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                self.error = f"{name}: {e}"
+                print(f"Warm-up step '{name}' failed: {e}")
+                return
+            self.timings[name] = time.perf_counter() - start
+
+        self.timings["total_since_boot"] = time.perf_counter() - self.boot_started
+        breakdown = ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in self.timings.items())
+        print(f"Startup breakdown: {breakdown}")
+        self.done.set()
+
+    def status(self):
+        return {
+            "done": self.done.is_set(),
+            "error": self.error,
+            "timings": {name: round(elapsed, 3) for name, elapsed in self.timings.items()}
+        }
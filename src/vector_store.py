@@ -0,0 +1,408 @@
+# Pluggable vector store: Pinecone or a local memory-mapped index
+
+import json
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+LOCAL_INDEX_QUANTIZE = os.getenv("LOCAL_INDEX_QUANTIZE", "").lower() in ("1", "true", "int8")
+# Compact once superseded log entries and dead rows exceed this fraction of live vectors
+LOCAL_INDEX_COMPACT_RATIO = float(os.getenv("LOCAL_INDEX_COMPACT_RATIO", "0.25"))
+LOCAL_INDEX_COMPACT_MIN = int(os.getenv("LOCAL_INDEX_COMPACT_MIN", "1000"))
+PINECONE_HOST = os.getenv("PINECONE_HOST")
+EMBEDDING_DIMENSION = 384
+
+# ``values`` is only filled in by ``query(..., include_values=True)``
+Match = namedtuple("Match", ["id", "score", "metadata", "values"], defaults=(None,))
+
+
+def match_filter(metadata, filter):
+    """Evaluate a Pinecone-style metadata filter against one metadata dict"""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(match_filter(metadata, f) for f in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(match_filter(metadata, f) for f in condition):
+                return False
+            continue
+
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+    return True
+
+
+class VectorStore:
+    """Interface shared by the vector store backends.
+
+    ``upsert`` takes Pinecone-style ``{"id", "values", "metadata"}`` dicts and
+    ``query`` returns a list of ``Match`` tuples sorted by descending score,
+    carrying the stored vectors when ``include_values`` is set. ``fetch``
+    returns ``{id: vector}`` for the stored ids it finds.
+    ``store_key`` identifies the physical index (for the chunk ledger).
+    """
+
+    store_key = None
+
+    def query(self, vector, top_k=3, filter=None, include_metadata=True, include_values=False):
+        raise NotImplementedError
+
+    def fetch(self, ids):
+        return {}
+
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def delete(self, ids=None, filter=None):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class PineconeStore(VectorStore):
+    """Wraps a single long-lived Pinecone index handle.
+
+    With ``host`` the index is addressed directly by its data-plane URL
+    (Pinecone Local, or the benchmark stand-in) and is not looked up or
+    created through the control plane.
+    """
+
+    def __init__(self, api_key, index_name, dimension=EMBEDDING_DIMENSION, host=None):
+        from pinecone import Pinecone, ServerlessSpec
+
+        self.index_name = index_name
+        self.store_key = f"pinecone:{index_name}"
+        self.pc = Pinecone(api_key=api_key)
+        if host:
+            self.index = self.pc.Index(host=host)
+            return
+        try:
+            if index_name not in self.pc.list_indexes().names():
+                self.pc.create_index(
+                    name=index_name,
+                    dimension=dimension,
+                    metric="cosine",
+                    spec=ServerlessSpec(cloud="aws", region="us-east-1")
+                )
+                print(f"Created new Pinecone index: {index_name}")
+            else:
+                print(f"Using existing Pinecone index: {index_name}")
+        except Exception as e:
+            print(f"Error initializing Pinecone: {e}")
+        self.index = self.pc.Index(index_name)
+
+    def query(self, vector, top_k=3, filter=None, include_metadata=True, include_values=False):
+        kwargs = {"vector": vector, "top_k": top_k, "include_metadata": include_metadata}
+        if filter:
+            kwargs["filter"] = filter
+        if include_values:
+            kwargs["include_values"] = True
+        response = self.index.query(**kwargs)
+        return [Match(m.id, m.score, m.metadata or {},
+                      np.asarray(m.values, dtype=np.float32) if include_values and m.values else None)
+                for m in response.matches]
+
+    def fetch(self, ids):
+        if not ids:
+            return {}
+        response = self.index.fetch(ids=list(ids))
+        return {vector_id: np.asarray(vector.values, dtype=np.float32)
+                for vector_id, vector in response.vectors.items()}
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+
+    def delete(self, ids=None, filter=None):
+        if ids:
+            self.index.delete(ids=list(ids))
+        elif filter:
+            self.index.delete(filter=filter)
+
+    def stats(self):
+        return {"backend": "pinecone", "index": self.index_name}
+
+
+class LocalVectorStore(VectorStore):
+    """Local cosine-similarity index backed by memory-mapped files.
+
+    Vectors are L2-normalized and stored row-wise in ``vectors.dat`` as
+    float32, or as int8 with a per-row scale in ``scales.dat`` when
+    ``quantize`` is set. ``meta.jsonl`` is an append-only log of upserts and
+    deletes that is replayed on load; ``compact`` rewrites both files
+    without deleted rows, and runs by itself once re-upserts and deletes
+    have left more than ``compact_ratio`` of the live count behind.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, path=LOCAL_INDEX_DIR, dimension=EMBEDDING_DIMENSION, quantize=LOCAL_INDEX_QUANTIZE,
+                 compact_ratio=LOCAL_INDEX_COMPACT_RATIO, compact_min=LOCAL_INDEX_COMPACT_MIN):
+        self.path = path
+        self.store_key = f"local:{os.path.abspath(path)}"
+        self.dimension = dimension
+        self.quantize = quantize
+        self.dtype = np.int8 if quantize else np.float32
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        header_path = os.path.join(path, "header.json")
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                header = json.load(f)
+            if header["dimension"] != dimension or header["quantize"] != quantize:
+                raise ValueError(f"Local index at {path} was built with {header}, "
+                                 f"not dimension={dimension} quantize={quantize}")
+        else:
+            with open(header_path, "w") as f:
+                json.dump({"dimension": dimension, "quantize": quantize}, f)
+
+        self.vectors_path = os.path.join(path, "vectors.dat")
+        self.scales_path = os.path.join(path, "scales.dat")
+        self.meta_path = os.path.join(path, "meta.jsonl")
+
+        self.ids = []          # row -> id
+        self.metadata = []     # row -> metadata
+        self.alive = []        # row -> bool
+        self.rows = {}         # id -> row
+        self.log_entries = 0   # lines in meta.jsonl
+        self._load_log()
+
+        self.capacity = 0
+        self.vectors = None
+        self.scales = None
+        self._map(max(len(self.ids), 1024))
+
+    def _load_log(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.log_entries += 1
+                if entry["op"] == "upsert":
+                    row = entry["row"]
+                    while len(self.ids) <= row:
+                        self.ids.append(None)
+                        self.metadata.append(None)
+                        self.alive.append(False)
+                    self.ids[row] = entry["id"]
+                    self.metadata[row] = entry["metadata"]
+                    self.alive[row] = True
+                    self.rows[entry["id"]] = row
+                elif entry["op"] == "delete":
+                    row = self.rows.pop(entry["id"], None)
+                    if row is not None:
+                        self.alive[row] = False
+
+    def _map(self, capacity):
+        # Grow the backing files and re-open the memory maps
+        files = [(self.vectors_path, self.dimension * np.dtype(self.dtype).itemsize)]
+        if self.quantize:
+            files.append((self.scales_path, 4))
+        for path, size in files:
+            with open(path, "ab") as f:
+                if f.tell() < capacity * size:
+                    f.truncate(capacity * size)
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dimension))
+        if self.quantize:
+            self.scales = np.memmap(self.scales_path, dtype=np.float32, mode="r+", shape=(capacity,))
+        self.capacity = capacity
+
+    def _encode(self, values):
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        if not self.quantize:
+            return vector, None
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def upsert(self, vectors):
+        with self._lock:
+            log = []
+            for item in vectors:
+                row = self.rows.get(item["id"])
+                if row is None:
+                    row = len(self.ids)
+                    if row >= self.capacity:
+                        self._map(self.capacity * 2)
+                    self.ids.append(item["id"])
+                    self.metadata.append(None)
+                    self.alive.append(True)
+                    self.rows[item["id"]] = row
+
+                encoded, scale = self._encode(item["values"])
+                self.vectors[row] = encoded
+                if self.quantize:
+                    self.scales[row] = scale
+                metadata = item.get("metadata") or {}
+                self.metadata[row] = metadata
+                self.alive[row] = True
+                log.append(json.dumps({"op": "upsert", "id": item["id"], "row": row, "metadata": metadata}))
+
+            self.vectors.flush()
+            if self.quantize:
+                self.scales.flush()
+            with open(self.meta_path, "a") as f:
+                f.write("\n".join(log) + "\n")
+            self.log_entries += len(log)
+            self._maybe_compact()
+
+    def delete(self, ids=None, filter=None):
+        with self._lock:
+            if ids is None and filter is not None:
+                ids = [self.ids[row] for row in range(len(self.ids))
+                       if self.alive[row] and match_filter(self.metadata[row], filter)]
+            log = []
+            for vector_id in ids or []:
+                row = self.rows.pop(vector_id, None)
+                if row is not None:
+                    self.alive[row] = False
+                    log.append(json.dumps({"op": "delete", "id": vector_id}))
+            if log:
+                with open(self.meta_path, "a") as f:
+                    f.write("\n".join(log) + "\n")
+                self.log_entries += len(log)
+                self._maybe_compact()
+            return len(log)
+
+    def query(self, vector, top_k=3, filter=None, include_metadata=True, include_values=False):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            count = len(self.ids)
+            if count == 0:
+                return []
+            mask = np.fromiter(self.alive, dtype=bool, count=count)
+            if filter:
+                mask &= np.fromiter((alive and match_filter(meta, filter)
+                                     for alive, meta in zip(self.alive, self.metadata)), dtype=bool, count=count)
+
+            # Score in blocks so int8 rows are widened a slice at a time
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, self.BLOCK_ROWS):
+                end = min(start + self.BLOCK_ROWS, count)
+                block = np.asarray(self.vectors[start:end], dtype=np.float32)
+                scores[start:end] = block @ query
+                if self.quantize:
+                    scores[start:end] *= self.scales[start:end]
+            scores[~mask] = -np.inf
+
+            k = min(top_k, int(mask.sum()))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [Match(self.ids[row], float(scores[row]), self.metadata[row] if include_metadata else {},
+                          self._row_vector(row) if include_values else None)
+                    for row in top]
+
+    def _row_vector(self, row):
+        # Stored rows are unit length; int8 rows are scaled back to float
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        return vector * self.scales[row] if self.quantize else vector
+
+    def fetch(self, ids):
+        """Stored (unit-length, dequantized) vectors by id"""
+        with self._lock:
+            return {vector_id: self._row_vector(self.rows[vector_id]) for vector_id in ids if vector_id in self.rows}
+
+    def _maybe_compact(self):
+        # Every log line beyond one per live vector is a superseded upsert or a
+        # delete, and every dead row is still scanned by each query
+        live = len(self.rows)
+        waste = (self.log_entries - live) + (len(self.ids) - live)
+        if waste > max(self.compact_ratio * live, self.compact_min):
+            rows = len(self.ids)
+            self.compact()
+            print(f"Compacted local index {self.path}: {rows} rows -> {live}")
+
+    def compact(self):
+        """Rewrite the index without deleted rows"""
+        with self._lock:
+            live = [row for row in range(len(self.ids)) if self.alive[row]]
+            vectors = np.array(self.vectors[live]) if live else np.empty((0, self.dimension), self.dtype)
+            scales = np.array(self.scales[live]) if self.quantize and live else None
+            ids = [self.ids[row] for row in live]
+            metadata = [self.metadata[row] for row in live]
+
+            self.vectors = self.scales = None
+            for path in (self.vectors_path, self.scales_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(self.meta_path, "w") as f:
+                for row, (vector_id, meta) in enumerate(zip(ids, metadata)):
+                    f.write(json.dumps({"op": "upsert", "id": vector_id, "row": row, "metadata": meta}) + "\n")
+
+            self.ids, self.metadata = ids, metadata
+            self.alive = [True] * len(ids)
+            self.rows = {vector_id: row for row, vector_id in enumerate(ids)}
+            self.log_entries = len(ids)
+            self._map(max(len(ids), 1024))
+            if live:
+                self.vectors[:len(ids)] = vectors
+                if self.quantize:
+                    self.scales[:len(ids)] = scales
+                self.vectors.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "local",
+                "path": self.path,
+                "vectors": len(self.rows),
+                "rows": len(self.ids),
+                "log_entries": self.log_entries,
+                "capacity": self.capacity,
+                "quantize": self.quantize
+            }
+
+
+def get_vector_store(backend=VECTOR_STORE, **kwargs):
+    """Build the vector store selected by the VECTOR_STORE environment variable"""
+    if backend == "local":
+        return LocalVectorStore(**kwargs)
+    if backend == "pinecone":
+        return PineconeStore(
+            api_key=kwargs.get("api_key", os.getenv("PINECONE_API_KEY")),
+            index_name=kwargs.get("index_name", os.getenv("PINECONE_INDEX_NAME", "testbot")),
+            host=kwargs.get("host", PINECONE_HOST)
+        )
+    raise ValueError(f"Unknown VECTOR_STORE backend: {backend}")
@@ -1,36 +1,65 @@
-from src.helper import load_pdf_file, text_split, download_hugging_face_embeddings
-from pinecone.grpc import PineconeGRPC as Pinecone
-from pinecone import ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from dotenv import load_dotenv
+# Incrementally index the PDFs in data/ into the configured vector store
+#
+#   python store_index.py [--data data/] [--batch-size 256] [--processes N] [--dry-run]
+#
+# Only new or changed files are embedded; vectors of deleted files are removed.
+
+import argparse
 import os
+import time
+
+from dotenv import load_dotenv
 
 load_dotenv()
 
-PINECONE_API_KEY= os.environ.get('PINECONE_API_KEY')
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-
-extracted_data= load_pdf_file(data='data/')
-text_chunks= text_split(extracted_data)
-embeddings= download_hugging_face_embeddings()
-
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-
-# Check if index exists, if not create it
-if "my_index" not in pc.list_indexes().names():
-    pc.create_index(
-        name="my_index",
-        dimension=1536,  # Must match your embedding model's dimension
-        metric="cosine",
-        spec=ServerlessSpec(
-            cloud="aws",
-            region="us-west-2"
-        )
+from src.indexer import DirectoryIndexer, PoolEncoder
+from src.keyword_index import KeywordIndex
+from src.ledger import ChunkLedger
+from src.vector_store import EMBEDDING_DIMENSION, get_vector_store
+
+DATABASE = "chat_logs.db"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index a directory of PDFs")
+    parser.add_argument("--data", default="data/", help="directory of PDFs to index")
+    parser.add_argument("--database", default=DATABASE, help="SQLite database holding the manifest and chunk ledger")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per embedding batch")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("INDEX_EMBED_PROCESSES", "1")),
+                        help="embedding worker processes (1 embeds in-process using all torch threads)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    t0 = time.perf_counter()
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    dimension = model.get_sentence_embedding_dimension()
+    if dimension != EMBEDDING_DIMENSION:
+        raise SystemExit(f"Embedding model produces {dimension}-d vectors but the index expects {EMBEDDING_DIMENSION}")
+    vector_store = get_vector_store()
+    print(f"Loaded model and vector store in {time.perf_counter() - t0:.2f}s")
+
+    encoder = PoolEncoder(model, args.processes) if args.processes > 1 and not args.dry_run else model
+    indexer = DirectoryIndexer(
+        args.database, args.data, vector_store, encoder,
+        ledger=ChunkLedger(args.database, vector_store.store_key),
+        keyword_index=KeywordIndex(args.database),
+        embed_batch_size=args.batch_size
     )
+    try:
+        summary = indexer.run(dry_run=args.dry_run)
+    finally:
+        if isinstance(encoder, PoolEncoder):
+            encoder.close()
+
+    print(f"{summary['files']} files: {summary['new']} new, {summary['changed']} changed, "
+          f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, {summary['failed']} failed")
+    print(f"{summary['chunks_embedded']} chunks embedded, {summary['chunks_skipped']} reused, "
+          f"{summary['vectors_removed']} vectors removed in {summary['total_time']:.2f}s "
+          f"({summary['chunks_per_sec']:.1f} chunks/s overall, "
+          f"{summary['chunks_embedded'] / summary['embed_time'] if summary['embed_time'] else 0:.1f} chunks/s embedding)")
+
 
-#embed each chunk and upsert the embeddings into your Pinecone index
-docsearch= PineconeVectorStore.from_documents(
-    documents= text_chunks,
-    embedding= embeddings,
-    index_name= index_name
-)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.cache import SemanticCache
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_question_hits_and_dissimilar_misses():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_size=4)
+    cache.put(unit(1, 0, 0), "reset password", "Use the reset link.")
+    assert cache.get(unit(1, 0.1, 0)) == "Use the reset link."
+    assert cache.get(unit(0, 1, 0)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_near_duplicate_put_is_not_stored_twice():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_size=4)
+    cache.put(unit(1, 0, 0), "reset password", "first")
+    cache.put(unit(1, 0.05, 0), "reset my password", "second")
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["duplicates"] == 1
+    assert cache.get(unit(1, 0, 0)) == "first"
+
+
+def test_least_recently_used_entry_is_evicted_and_its_row_reused():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_size=2)
+    cache.put(unit(1, 0, 0), "a", "A")
+    cache.put(unit(0, 1, 0), "b", "B")
+    assert cache.get(unit(1, 0, 0)) == "A"
+    cache.put(unit(0, 0, 1), "c", "C")
+    assert cache.get(unit(0, 1, 0)) is None
+    assert cache.get(unit(1, 0, 0)) == "A"
+    assert cache.get(unit(0, 0, 1)) == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.cache.time.time", lambda: now[0])
+    cache = SemanticCache(threshold=0.9, ttl=10, max_size=2)
+    cache.put(unit(1, 0), "a", "A")
+    now[0] += 11
+    assert cache.get(unit(1, 0)) is None
+    assert cache.stats()["size"] == 0
+    cache.put(unit(1, 0), "a", "A again")
+    assert cache.get(unit(1, 0)) == "A again"
+
+
+def test_invalidate_clears_everything():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_size=2)
+    cache.put(unit(1, 0), "a", "A")
+    cache.invalidate()
+    assert cache.get(unit(1, 0)) is None
+    cache.put(unit(1, 0), "a", "A")
+    cache.put(unit(0, 1), "b", "B")
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,67 @@
+import numpy as np
+
+from src.context_packer import merge_adjacent, pack_context
+from src.vector_store import Match
+
+
+def match(chunk_id, text, vector=None, **metadata):
+    return Match(chunk_id, 0.0, {"text": text, **metadata}, vector)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_passages_that_do_not_fit_the_budget_are_skipped_not_truncated():
+    query = unit(1, 0, 0)
+    matches = [match("a", "a" * 40), match("b", "b" * 80), match("c", "c" * 20)]
+    vectors = {"a": unit(1, 0.1, 0), "b": unit(1, 0, 0.2), "c": unit(1, 0.3, 0.3)}
+    # 10 + 20 + 5 tokens; only the first and third fit into 16
+    context, stats = pack_context(query, matches, vectors, token_budget=16, duplicate_similarity=1.1)
+    assert context == "a" * 40 + "\n\n" + "c" * 20
+    assert stats["over_budget"] == 1
+    assert stats["chunks"] == 2
+    assert stats["tokens"] <= 16
+
+
+def test_first_passage_longer_than_the_budget_is_truncated_to_it():
+    query = unit(1, 0)
+    context, stats = pack_context(query, [match("a", "x" * 400)], {"a": unit(1, 0)}, token_budget=10)
+    assert context.startswith("x" * 40)
+    assert stats["chunks"] == 1
+    assert stats["over_budget"] == 0
+    assert stats["saved_tokens"] == stats["baseline_tokens"] - stats["tokens"]
+
+
+def test_chunks_below_the_similarity_floor_are_dropped():
+    query = unit(1, 0)
+    matches = [match("near", "near text"), match("far", "far text")]
+    vectors = {"near": unit(1, 0.1), "far": unit(0, 1)}
+    context, stats = pack_context(query, matches, vectors, min_similarity=0.5)
+    assert context == "near text"
+    assert stats["below_floor"] == 1
+
+
+def test_near_duplicates_are_dropped_by_mmr():
+    query = unit(1, 0, 0)
+    matches = [match("a", "first copy"), match("b", "second copy"), match("c", "different")]
+    vectors = {"a": unit(1, 0.2, 0), "b": unit(1, 0.2, 0.001), "c": unit(1, 0, 0.6)}
+    context, stats = pack_context(query, matches, vectors, duplicate_similarity=0.95)
+    assert "second copy" not in context
+    assert stats["redundant"] == 1
+
+
+def test_empty_input_packs_nothing():
+    context, stats = pack_context(unit(1, 0), [match("a", "")], {})
+    assert context == ""
+    assert stats["candidates"] == 0
+
+
+def test_adjacent_chunks_of_one_document_merge_in_rank_order():
+    matches = [
+        match("p2", "two ", source="admin", filename="a.pdf", chunk_index=2, page_start=1),
+        match("w", "web", source="user", url="http://x", chunk_index=0),
+        match("p1", "one ", source="admin", filename="a.pdf", chunk_index=1, page_start=1),
+    ]
+    assert merge_adjacent(matches) == [("one two ", 2), ("web", 1)]
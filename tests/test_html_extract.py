@@ -0,0 +1,36 @@
+from src.html_extract import extract_html, page_text
+
+
+def test_unclosed_li_in_nav_does_not_swallow_the_page():
+    html = """<html><body>
+    <ul>
+      <li class="menu-item"><a href="/">Home</a>
+      <li class="menu-item"><a href="/pricing">Pricing</a>
+    </ul>
+    <h1>Resetting your password</h1>
+    <p>Open the account page and choose Reset password to get a new link by email.</p>
+    </body></html>"""
+    text = page_text(extract_html(html))
+    assert "Resetting your password" in text
+    assert "choose Reset password" in text
+    assert "Pricing" not in text
+
+
+def test_unclosed_boilerplate_paragraph_ends_at_next_block():
+    html = """<body><div>
+    <p class="share">Share this on social media
+    <p>The VPN client needs version 4.2 or later on macOS.</p>
+    </div></body>"""
+    text = page_text(extract_html(html))
+    assert "version 4.2" in text
+    assert "Share this" not in text
+
+
+def test_nested_lists_inside_skipped_nav_stay_skipped():
+    html = """<body>
+    <nav><ul><li>Docs<ul><li>Install<li>Upgrade</ul><li>Support</ul></nav>
+    <p>Install the agent with the package for your platform.</p>
+    <footer><p>Copyright<p>Terms</footer>
+    </body>"""
+    text = page_text(extract_html(html))
+    assert text == "Install the agent with the package for your platform."
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from src.jobs import JobQueue
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_queue_upgrades_a_table_without_lease_columns(tmp_path):
+    database = str(tmp_path / "jobs.db")
+    db = sqlite3.connect(database)
+    db.execute("""CREATE TABLE ingest_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT, status TEXT DEFAULT 'queued',
+        kb_id INTEGER, upload_id INTEGER, created_at TEXT, started_at TEXT, finished_at TEXT,
+        pages_extracted INTEGER DEFAULT 0, chunks_total INTEGER DEFAULT 0, chunks_embedded INTEGER DEFAULT 0,
+        chunks_upserted INTEGER DEFAULT 0, result TEXT, error_message TEXT)""")
+    db.commit()
+    db.close()
+
+    queue = JobQueue(database, workers=1, poll_interval=0.05)
+    queue.register("echo", lambda payload, progress: {"echo": payload["value"]})
+    queue.start()
+    try:
+        job = wait_for(queue, queue.enqueue("echo", {"value": 3}))
+    finally:
+        queue.stop()
+    assert job["status"] == "done"
+    assert job["result"] == {"echo": 3}
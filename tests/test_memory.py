@@ -0,0 +1,24 @@
+from src.memory import is_followup
+
+
+def test_short_standalone_questions_are_not_followups():
+    assert not is_followup("reset password")
+    assert not is_followup("printer offline")
+    assert not is_followup("VPN not connecting")
+
+
+def test_single_word_fragment_is_a_followup():
+    assert is_followup("iOS?")
+    assert is_followup("Android")
+
+
+def test_back_references_and_openers_are_followups():
+    assert is_followup("is it free")
+    assert is_followup("what about Mac?")
+    assert is_followup("and on Android?")
+
+
+def test_empty_and_long_messages_are_not_followups():
+    assert not is_followup("")
+    assert not is_followup("  ?! ")
+    assert not is_followup("how do I connect that printer to the office wifi network")
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from src.pagination import decode_cursor, encode_cursor, keyset_page, page_size
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, added_at TEXT, status TEXT)")
+    yield db
+    db.close()
+
+
+def all_pages(db, limit, **kwargs):
+    names, after, pages = [], None, 0
+    while True:
+        rows, after = keyset_page(db.cursor(), "items", ["name"], "added_at", after=after, limit=limit, **kwargs)
+        names += [row[0] for row in rows]
+        pages += 1
+        if after is None:
+            return names, pages
+
+
+def test_ties_on_the_sort_column_are_broken_by_id(db):
+    db.executemany("INSERT INTO items (name, added_at) VALUES (?, ?)",
+                   [(f"n{i}", "2024-01-01") for i in range(5)] + [("late", "2024-02-01")])
+    names, pages = all_pages(db, limit=2)
+    assert names == ["late", "n4", "n3", "n2", "n1", "n0"]
+    assert pages == 3
+
+
+def test_null_sort_values_come_last_and_are_not_dropped(db):
+    db.executemany("INSERT INTO items (name, added_at) VALUES (?, ?)",
+                   [("a", "2024-01-01"), ("null1", None), ("b", "2024-01-02"), ("null2", None)])
+    names, _ = all_pages(db, limit=1)
+    assert names == ["b", "a", "null2", "null1"]
+
+
+def test_filters_apply_on_every_page(db):
+    db.executemany("INSERT INTO items (name, added_at, status) VALUES (?, ?, ?)",
+                   [(f"n{i}", f"2024-01-0{i}", "done" if i % 2 else "failed") for i in range(1, 8)])
+    names, _ = all_pages(db, limit=2, filters=["status = ?"], params=["done"])
+    assert names == ["n7", "n5", "n3", "n1"]
+
+
+def test_exact_page_multiple_has_no_trailing_empty_page(db):
+    db.executemany("INSERT INTO items (name, added_at) VALUES (?, ?)", [("a", "1"), ("b", "2")])
+    rows, after = keyset_page(db.cursor(), "items", ["name"], "added_at", limit=2)
+    assert [row[0] for row in rows] == ["b", "a"]
+    assert after is None
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor("2024-01-01", 7)) == ("2024-01-01", 7)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_page_size_is_clamped():
+    assert page_size("0") == 1
+    assert page_size("100000") == 200
+    assert page_size(None, default=100) == 100
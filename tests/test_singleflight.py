@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.singleflight import SingleFlight, flight_key
+
+
+def test_followers_get_the_leaders_exception_and_the_key_is_released():
+    flight = SingleFlight("test", timeout=5)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flight.do, "k", work)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "k", work) for _ in range(2)]
+        deadline = time.time() + 5
+        while flight.stats()["shared"] < 2 and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for future in [leader, *followers]:
+            with pytest.raises(ValueError, match="upstream failed"):
+                future.result(5)
+
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 3, "shared": 2, "in_flight": 0}
+    # A failed flight is not remembered: the next call runs again
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_async_followers_share_the_leaders_exception():
+    flight = SingleFlight("test", timeout=5)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("k", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "boom" for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_async_leader_fails_followers_instead_of_hanging():
+    flight = SingleFlight("test", timeout=5)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("k", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("k", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(follower, return_exceptions=True)
+
+    [result] = asyncio.run(main())
+    assert isinstance(result, RuntimeError)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_flight_key_normalizes_case_and_whitespace_only_in_strings():
+    assert flight_key("Reset  Password", 3) == flight_key("reset password", 3)
+    assert flight_key("reset password", 3) != flight_key("reset password", 4)
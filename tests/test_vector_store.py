@@ -0,0 +1,33 @@
+import numpy as np
+
+from src.vector_store import LocalVectorStore
+
+
+def vectors(ids, dimension=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": vector_id, "values": rng.standard_normal(dimension).tolist(), "metadata": {"n": i}}
+            for i, vector_id in enumerate(ids)]
+
+
+def test_deletes_and_reupserts_compact_automatically(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dimension=8, compact_ratio=0.5, compact_min=4)
+    store.upsert(vectors([f"a{i}" for i in range(10)]))
+    store.upsert(vectors([f"a{i}" for i in range(3)], seed=1))
+    assert store.stats()["log_entries"] == 13
+
+    store.delete([f"a{i}" for i in range(4)])
+    stats = store.stats()
+    assert stats["vectors"] == stats["rows"] == stats["log_entries"] == 6
+
+    reopened = LocalVectorStore(str(tmp_path), dimension=8)
+    assert sorted(reopened.rows) == [f"a{i}" for i in range(4, 10)]
+    query = vectors(["a7"])[0]["values"]
+    expected = store.query(query, top_k=1)[0]
+    assert reopened.query(query, top_k=1)[0].id == expected.id
+
+
+def test_small_amount_of_waste_is_left_alone(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dimension=8, compact_ratio=0.5, compact_min=4)
+    store.upsert(vectors([f"a{i}" for i in range(10)]))
+    store.delete(["a0"])
+    assert store.stats()["rows"] == 10